@@ -65,8 +65,17 @@ enum _Laik_Reorder_Mapped {
     LAIK_RO_OFFSET   = 1,
 };
 
+// LAIK_REORDER_FILE contents, little-endian
+// reordering[k] is the new id of location k plus LAIK_RO_OFFSET (or LAIK_RO_UNMAPPED)
+#define LAIK_RO_FILE_MAGIC   "LAIKREOR"
+#define LAIK_RO_FILE_VERSION 1
+
 typedef struct _Laik_Reordering_File {
+    char     magic[8];
+    uint16_t version;
+    uint16_t flags;         // reserved, 0
     uint32_t nodecount;
+    uint32_t checksum;      // crc32 of reordering
     int      reordering[];  // use a VLA
 } __attribute__((packed)) Laik_Reordering_File;
 
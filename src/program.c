@@ -51,6 +51,11 @@ int laik_get_iteration(Laik_Instance* i)
 void laik_set_phase(Laik_Instance* i,
                     int n_phase, const char* name, void* pData)
 {
+    // the matrix is cumulative: the log tools take the difference
+    // to the previous dump as the traffic of the phase that ends here
+    Laik_CommMatrix* cm = laik_world(i)->comm_matrix;
+    if (cm) laik_log_CommMatrix(cm);
+
     laik_log_inc();
     i->control->cur_phase = n_phase;
     i->control->cur_phase_name = name;
@@ -91,6 +91,19 @@ Laik_CommMatrix* laik_top_CommMatrix_add_Transition(Laik_CommMatrix* cm, Laik_Tr
     return cm;
 }
 
+// crc32 (as in zlib) of the location map in a reordering file
+static uint32_t laik_top_reordering_checksum(const int* map, size_t count)
+{
+    const unsigned char* p = (const unsigned char*) map;
+    uint32_t crc = 0xFFFFFFFFu;
+    for (size_t i = 0; i < count * sizeof(int); i++) {
+        crc ^= p[i];
+        for (int b = 0; b < 8; b++)
+            crc = (crc >> 1) ^ (0xEDB88320u & -(crc & 1));
+    }
+    return ~crc;
+}
+
 // get reordered indices or NULL if no reordering is set
 int* laik_top_reordering(Laik_Instance* li)
 {  // this really should return u64*.. but locationid is int so we use that
@@ -139,12 +152,18 @@ int* laik_top_reordering(Laik_Instance* li)
             laik_log(2, "writing map to file %s\n", reorderfile);
             if (!file) laik_panic("Reordering file could not be opened!");
 
-            if (fwrite(li->locationmap, 1, sz, file) != sz) laik_panic("Error writing to reordering file!");
+            Laik_Reordering_File header = {.version = LAIK_RO_FILE_VERSION, .nodecount = li->locations};
+            memcpy(header.magic, LAIK_RO_FILE_MAGIC, sizeof(header.magic));
+            header.checksum = laik_top_reordering_checksum(li->locationmap, li->locations);
+
+            if (fwrite(&header, 1, sizeof(header), file) != sizeof(header) ||
+                fwrite(li->locationmap, 1, sz, file) != sz)
+                laik_panic("Error writing to reordering file!");
 
             fclose(file);
         }
     }
-    else if (reorderfile) {  // TODO: actually read and error detect
+    else if (reorderfile) {  // e.g. written by tools/topology/topology.py
         FILE* file = fopen(reorderfile, "rb");
         if (!file) laik_panic("Reordering file could not be opened!");
 
@@ -153,7 +172,24 @@ int* laik_top_reordering(Laik_Instance* li)
 
         if (!S_ISREG(filestat.st_mode) || filestat.st_size <= 0) laik_panic("Invalid reordering file!");
 
-        // ...
+        Laik_Reordering_File header;
+        if (fread(&header, 1, sizeof(header), file) != sizeof(header)) laik_panic("Reordering file too short!");
+        if (memcmp(header.magic, LAIK_RO_FILE_MAGIC, sizeof(header.magic)) || header.version > LAIK_RO_FILE_VERSION)
+            laik_panic("Unsupported reordering file!");
+
+        const size_t sz = header.nodecount * sizeof(int);
+        if ((size_t) filestat.st_size != sizeof(header) + sz) laik_panic("Invalid reordering file size!");
+        if ((int) header.nodecount != li->locations)
+            laik_panic("Reordering file is for a different number of locations!");
+
+        li->locationmap = malloc(sz);
+        if (!li->locationmap) laik_panic("Reordering map could not be allocated!");
+        if (fread(li->locationmap, 1, sz, file) != sz) laik_panic("Error reading reordering file!");
+        if (laik_top_reordering_checksum(li->locationmap, header.nodecount) != header.checksum)
+            laik_panic("Reordering file checksum mismatch!");
+
+        laik_log(2, "read map of %u locations from file %s", header.nodecount, reorderfile);
+        fclose(file);
     }
     return li->locationmap;
 }
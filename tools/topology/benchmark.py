@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+import argparse
+import csv
+import dataclasses
+import itertools
+import json
+import multiprocessing
+import numpy as np
+import time
+import tracemalloc
+from dataclasses import dataclass
+from metrics import placementMetrics
+from topology import generateHostTopology, optimize
+from workloads import (
+    Workload,
+    allToAllComms,
+    groupedComms,
+    haloComms,
+    mixComms,
+    randomSparseComms,
+    ringComms,
+    shuffled,
+    treeComms,
+)
+
+# reproducible sweep over rank counts, communication patterns, topologies and optimizers
+# every case runs in a fresh process: memory is traced for the optimizer alone and hanging cases are killed
+# results are one record per case, written as json or csv
+RANKS = [64, 256, 1024, 4096, 8192]
+PATTERNS = ["grouped", "alltoall", "halo1d", "halo2d", "halo3d", "ring", "tree", "sparse", "mixed"]
+OPTIMIZERS = ["treeMatch", "tauQAP", "blockAssign", "multilevel", "clustMap", "multiStart"]
+
+# ranks per node, nodes per cabinet, cabinets per rack, racks per island, named in the SuperMUC-NG scheme
+TOPOLOGIES = {
+    "thin": (4, 8, 4, 2),
+    "fat": (32, 8, 4, 2),
+}
+
+
+@dataclass
+class BenchCase:
+    ranks: int
+    pattern: str
+    topology: str
+    optimizer: str
+    seed: int = 0
+    time_limit: float | None = None
+
+
+# outcome of a case, quality as defined in metrics: cost is the QAP objective on the host graph distances,
+# hops the link-weighted volume, volumes the traffic per level and offnode the traffic between different nodes
+# status: ok, timeout or the error; baseline is the identity order, ideal the pattern's reference order if it has one
+@dataclass
+class BenchResult:
+    ranks: int
+    pattern: str
+    topology: str
+    optimizer: str
+    status: str
+    seconds: float | None = None
+    peak_bytes: int | None = None
+    cost: float | None = None
+    offnode: float | None = None
+    hops: float | None = None
+    max_link_load: float | None = None
+    volumes: dict | None = None
+    baseline_cost: float | None = None
+    baseline_offnode: float | None = None
+    ideal_cost: float | None = None
+
+
+# one hostname per rank, ranks are filled up into nodes, nodes into cabinets and so on
+def benchmarkHosts(ranks: int, topology: str) -> list:
+    per_node, per_cabinet, per_rack, per_island = TOPOLOGIES[topology]
+    hosts = []
+    for rank in range(ranks):
+        cabinets, server = divmod(rank // per_node, per_cabinet)
+        racks, cabinet = divmod(cabinets, per_rack)
+        island, rack = divmod(racks, per_island)
+        hosts.append("i{:02d}r{:02d}c{:02d}s{:02d}:{}".format(island, rack, cabinet, server, rank))
+    return hosts
+
+
+# the pattern's processes relabeled randomly, optimizers have to find the structure themselves
+def benchmarkComms(ranks: int, pattern: str, seed: int) -> Workload:
+    rng = np.random.default_rng(seed)
+    if pattern == "grouped":
+        workload = groupedComms(ranks, 4, rng, sparse=True)
+    elif pattern == "alltoall":
+        workload = allToAllComms(ranks, rng, 1000, 100)
+    elif pattern in ("halo1d", "halo2d", "halo3d"):
+        workload = haloComms(int(pattern[4]), ranks)
+    elif pattern == "ring":
+        workload = ringComms(ranks)
+    elif pattern == "tree":
+        workload = treeComms(ranks)
+    elif pattern == "sparse":
+        workload = randomSparseComms(ranks, 8, rng)
+    elif pattern == "mixed":
+        workload = mixComms([haloComms(3, ranks), treeComms(ranks), randomSparseComms(ranks, 2, rng, 64)])
+    else:
+        raise ValueError("unknown pattern {}".format(pattern))
+    return shuffled(workload, rng)
+
+
+def optimizerOptions(case: BenchCase) -> dict:
+    if case.optimizer in ("tauQAP", "multiStart"):
+        return dict(time_limit=case.time_limit, seed=case.seed)
+    if case.optimizer in ("multilevel", "clustMap"):
+        return dict(seed=case.seed)
+    return {}
+
+
+def runCase(case: BenchCase) -> BenchResult:
+    workload = benchmarkComms(case.ranks, case.pattern, case.seed)
+    comm = workload.matrix
+    hosts = benchmarkHosts(case.ranks, case.topology)
+    graph = generateHostTopology(hosts)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    order = optimize(case.optimizer, comm, graph, hosts, **optimizerOptions(case))
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    placed = placementMetrics(comm, order, graph)
+    baseline = placementMetrics(comm, range(case.ranks), graph)
+    ideal = None if workload.ideal is None else placementMetrics(comm, workload.ideal, graph)
+    return BenchResult(
+        case.ranks,
+        case.pattern,
+        case.topology,
+        case.optimizer,
+        "ok",
+        seconds,
+        peak,
+        placed.cost,
+        placed.outside("srv"),
+        placed.hops,
+        placed.max_link_load,
+        placed.volumes,
+        baseline.cost,
+        baseline.outside("srv"),
+        None if ideal is None else ideal.cost,
+    )
+
+
+def caseProcess(case: BenchCase, connection) -> None:
+    try:
+        result = runCase(case)
+    except Exception as error:
+        status = "{}: {}".format(type(error).__name__, error)
+        result = BenchResult(case.ranks, case.pattern, case.topology, case.optimizer, status)
+    connection.send(result)
+    connection.close()
+
+
+# run the case in a child process, killed after timeout seconds
+def runIsolated(case: BenchCase, timeout: float | None) -> BenchResult:
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=caseProcess, args=(case, sender))
+    process.start()
+    sender.close()
+    status = "timeout"
+    try:
+        if receiver.poll(timeout):
+            return receiver.recv()
+    except EOFError:  # the child died without a result, e.g. out of memory
+        process.join()
+        status = "exit code {}".format(process.exitcode)
+    finally:
+        process.kill()
+        process.join()
+    return BenchResult(case.ranks, case.pattern, case.topology, case.optimizer, status)
+
+
+def writeResults(path: str, results: list) -> None:
+    records = [dataclasses.asdict(result) for result in results]
+    with open(path, "w", newline="") as file:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(file, fieldnames=[f.name for f in dataclasses.fields(BenchResult)])
+            writer.writeheader()
+            for record in records:
+                writer.writerow({key: json.dumps(v) if isinstance(v, dict) else v for key, v in record.items()})
+        else:
+            json.dump(records, file, indent=1)
+
+
+def parserSetup() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="LAIK topology benchmark",
+        description="Measure runtime, memory and placement quality of the reordering optimizers.",
+    )
+    parser.add_argument("--ranks", type=int, nargs="+", default=RANKS, help="Rank counts")
+    parser.add_argument("--patterns", nargs="+", choices=PATTERNS, default=PATTERNS, help="Communication patterns")
+    parser.add_argument("--topologies", nargs="+", choices=list(TOPOLOGIES), default=list(TOPOLOGIES))
+    parser.add_argument("--optimizers", nargs="+", choices=OPTIMIZERS, default=OPTIMIZERS, help="Optimizers")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the patterns and randomized optimizers")
+    parser.add_argument("--time-limit", type=float, default=60, help="Budget of the time limited optimizers in seconds")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds after which a case is killed")
+    parser.add_argument("-o", "--out", default="benchmark.json", help="Results file (.json or .csv)")
+    return parser
+
+
+if __name__ == "__main__":
+    args = parserSetup().parse_args()
+    results = []
+    sweep = itertools.product(args.ranks, args.patterns, args.topologies, args.optimizers)
+    for ranks, pattern, topology, optimizer in sweep:
+        if ranks % TOPOLOGIES[topology][0] != 0:
+            continue
+        case = BenchCase(ranks, pattern, topology, optimizer, args.seed, args.time_limit)
+        result = runIsolated(case, args.timeout)
+        results.append(result)
+        line = "{ranks:6d} {pattern:9s} {topology:5s} {optimizer:12s} {status} {seconds} {cost} {offnode}"
+        print(line.format(**dataclasses.asdict(result)))
+        writeResults(args.out, results)  # partial results survive an interrupted sweep
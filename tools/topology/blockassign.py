@@ -0,0 +1,142 @@
+import igraph
+import numpy as np
+import sys
+from grouping import groupVertices, symmetricWeights
+from qap import TauQAP
+from toptypes import CSRMatrix, HostGraph
+
+# placement for topologies made of equal blocks (nodes filled with k ranks each):
+#  1. partition the processes into groups of k by graph partitioning, refined by repeated linear assignments
+#  2. assign groups to blocks by a linear assignment on the Gilmore-Lawler bound, then 2-opt on the small block QAP
+# intra-block distances are all equal, the order of processes within a block does not matter
+REFINE_ROUNDS = 8  # max linear assignment rounds improving the groups
+
+
+# minimum cost assignment of the rows of cost to distinct columns (rows <= columns)
+# Hungarian algorithm with potentials and shortest augmenting paths, O(n^2 m), the inner loop is vectorized
+def linearAssignment(cost) -> np.ndarray:
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = cost.shape
+    if n > m:
+        raise ValueError("cannot assign {} rows to {} columns".format(n, m))
+    # index 0 is a virtual column, row/column i lives at i + 1
+    u, v = np.zeros(n + 1), np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.intp)  # row matched to each column, 0 for free
+    way = np.zeros(m + 1, dtype=np.intp)
+    for i in range(1, n + 1):
+        match[0], j0 = i, 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while match[j0] != 0:
+            used[j0] = True
+            reduced = cost[match[j0] - 1] - u[match[j0]] - v[1:]
+            better = ~used[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            j1 = int(np.argmin(np.where(used[1:], np.inf, minv[1:]))) + 1
+            delta = minv[j1]
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+        while j0 != 0:  # augment along the path
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    assignment = np.empty(n, dtype=np.intp)
+    columns = np.flatnonzero(match[1:])
+    assignment[match[1:][columns] - 1] = columns
+    return assignment
+
+
+# split cores into blocks: cores at the minimum distance form a block, all blocks have the same size and the
+# distance between two cores only depends on their blocks
+# returns (list of core arrays, block distance matrix) or None if dist has no such structure
+def coreBlocks(dist) -> tuple | None:
+    dist = np.asarray(dist)
+    n = len(dist)
+    if n < 2:
+        return None
+    off = np.where(np.eye(n, dtype=bool), np.inf, dist)
+    near = (dist == off.min()) | np.eye(n, dtype=bool)
+    labels = np.unique(np.argmax(near, axis=1), return_inverse=True)[1]
+    sizes = np.bincount(labels)
+    if len(sizes) < 2 or sizes[0] < 2 or (sizes != sizes[0]).any():
+        return None
+    if not (near == (labels[:, None] == labels[None, :])).all():
+        return None
+    first = np.array([np.flatnonzero(labels == b)[0] for b in range(len(sizes))])
+    block_dist = dist[np.ix_(first, first)]
+    np.fill_diagonal(block_dist, 0)
+    outer = block_dist[labels][:, labels]
+    if not (np.where(near, True, dist == outer)).all():
+        return None
+    return [np.flatnonzero(labels == b) for b in range(len(sizes))], block_dist
+
+
+class BlockAssign:
+    def __init__(self, comm_mat, top_graph: HostGraph, hostnames: list[str]) -> None:
+        self.comm_mat = comm_mat
+        self.top_graph = top_graph
+        self.hostnames = hostnames
+
+    def __str__(self) -> str:
+        return (
+            "BlockAssign\n"
+            + "mat     {}\n".format(self.comm_mat)
+            + "graph   {}\n".format(self.top_graph)
+            + "hosts   {}".format(self.hostnames)
+        )
+
+    # falls back to TauQAP for topologies without block structure
+    def solve(self) -> list:
+        structure = coreBlocks(self.top_graph.distances())
+        if structure is None:
+            print("BlockAssign: no block structure in the topology, using TauQAP", file=sys.stderr)
+            return TauQAP(self.comm_mat, self.top_graph, self.hostnames).solve()
+        blocks, block_dist = structure
+
+        weights = symmetricWeights(self.comm_mat)
+        if isinstance(weights, CSRMatrix):  # refinement and assignment score whole groups against each other
+            weights = weights.toDense()
+        groups = self.refineGroups(weights, groupVertices(self.comm_mat, len(blocks[0])))
+        placement = self.assignGroups(weights, groups, block_dist)
+
+        order = np.empty(len(weights), dtype=np.intp)
+        for group, block in zip(placement, blocks):
+            order[block] = groups[group]
+        return order.tolist()
+
+    # move processes between groups while the traffic inside the groups grows
+    # every round is one linear assignment of processes to group slots, scored by the traffic to the group
+    def refineGroups(self, weights: np.ndarray, groups: list) -> list:
+        n, k = len(weights), len(groups[0])
+        labels = np.empty(n, dtype=np.intp)
+        for g, group in enumerate(groups):
+            labels[group] = g
+        inner = np.sum(weights[labels[:, None] == labels[None, :]])
+        for _ in range(REFINE_ROUNDS):
+            affinity = weights @ np.eye(len(groups))[labels]  # traffic of every process to every group
+            slots = linearAssignment(-np.repeat(affinity, k, axis=1))
+            candidate = slots // k
+            candidate_inner = np.sum(weights[candidate[:, None] == candidate[None, :]])
+            if candidate_inner <= inner:
+                break
+            labels, inner = candidate, candidate_inner
+        return [np.flatnonzero(labels == g) for g in range(len(groups))]
+
+    # linear assignment on the Gilmore-Lawler bound: group traffic sorted descending against block distances
+    # sorted ascending, then 2-opt on the block level QAP
+    def assignGroups(self, weights: np.ndarray, groups: list, block_dist: np.ndarray) -> list:
+        labels = np.empty(len(weights), dtype=np.intp)
+        for g, group in enumerate(groups):
+            labels[group] = g
+        onehot = np.eye(len(groups))[labels]
+        traffic = onehot.T @ weights @ onehot
+        np.fill_diagonal(traffic, 0)
+        off = ~np.eye(len(groups), dtype=bool)
+        flows = -np.sort(-traffic[off].reshape(len(groups), -1), axis=1)
+        dists = np.sort(block_dist[off].reshape(len(groups), -1), axis=1)
+        initial = linearAssignment(dists @ flows.T)  # rows: blocks, columns: groups
+        top_graph = HostGraph(igraph.Graph(), block_dist, [], [])
+        return TauQAP(traffic, top_graph, list(range(len(groups))), method="twoOpt").twoOptSearch(initial)[0]
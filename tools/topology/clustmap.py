@@ -1,14 +1,54 @@
-import itertools
-import igraph
-from toptypes import HostGraph, getNodeChildren, UINT64_MAX
+import numpy as np
+from dataclasses import dataclass, field
+from multilevel import MIN_SHRINK, commGraph, contract, matchVertices
+from toptypes import HostGraph
+from treematch import buildTree, checkedOrder
+
+# divide and conquer mapping for very large jobs:
+#  1. cluster the communication graph bottom-up into a hierarchy by repeated heavy edge matching
+#  2. map the hierarchy onto the topology tree top-down: the clusters of a node are packed into its children,
+#     clusters larger than the space left in any child are split into their subclusters
+# every cluster is mapped once per topology level, O(edges * log(n) + n * depth)
+
+
+# processes of a cluster and the clusters merged into it
+@dataclass
+class Cluster:
+    members: np.ndarray
+    children: list = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+
+# merge heavy edges level by level until one cluster is left, without edges the smallest clusters are paired
+def clusterHierarchy(comm_mat, rng: np.random.Generator) -> Cluster:
+    graph = commGraph(comm_mat)
+    clusters = [Cluster(np.array([i])) for i in range(graph.shape[0])]
+    sizes = np.ones(len(clusters))
+    while len(clusters) > 1:
+        labels, count = matchVertices(graph, sizes, np.inf, rng)
+        if count > MIN_SHRINK * len(clusters):
+            labels = np.empty(len(clusters), dtype=np.int64)
+            labels[np.argsort(sizes, kind="stable")] = np.arange(len(clusters)) // 2
+            count = (len(clusters) + 1) // 2
+        merged = [[] for _ in range(count)]
+        for cluster, label in zip(clusters, labels.tolist()):
+            merged[label].append(cluster)
+        clusters = [c[0] if len(c) == 1 else Cluster(np.concatenate([x.members for x in c]), c) for c in merged]
+        graph = contract(graph, labels, count)
+        sizes = np.bincount(labels, weights=sizes, minlength=count)
+    return clusters[0]
+
 
 class ClustMap:
-    def __init__(self, comm_mat: list, top_graph: HostGraph, hostnames: list[str]) -> None:
+    def __init__(self, comm_mat: list, top_graph: HostGraph, hostnames: list[str], seed: int | None = None) -> None:
         self.comm_mat = comm_mat
         self.mod_mat = comm_mat
         self.top_graph = top_graph
         self.hostnames = hostnames
-        self.M = []
+        self.rng = np.random.default_rng(seed)
+        self.M = np.empty(0, dtype=np.int64)  # process on every leaf position
 
     def __str__(self) -> str:
         return (
@@ -18,29 +58,53 @@ class ClustMap:
             + "hosts   {}".format(self.hostnames)
         )
 
-    def doClustMap(self, S, A):
-        if len(S) == len(A):
+    def solve(self) -> list:
+        if len(self.top_graph.layers) == 0:
+            raise ValueError("ClustMap needs the layers of the topology tree")
+        self.tree = buildTree(self.top_graph)
+        n = len(self.comm_mat)
+        if n != len(self.tree[-1].types):
+            raise ValueError("{} processes for {} topology leaves".format(n, len(self.tree[-1].types)))
+        self.M = np.full(n, -1, dtype=np.int64)
+        self.doClustMap([clusterHierarchy(self.comm_mat, self.rng)], list(range(len(self.tree[0].types))), 0)
+        return checkedOrder(self.M, "ClustMap")
+
+    # map clusters S onto the nodes A of layer depth, the clusters hold as many processes as A has leaves
+    def doClustMap(self, S: list, A: list, depth: int) -> None:
+        if len(A) == 1 and depth == len(self.tree) - 1:
             self.MapClusters(S, A)
-        elif len(S) < len(A):
-            self.reMap(S, A)
-        elif len(S) > len(A):
-            for subcluster in S:
-                self.doClustMap(subcluster, A)
-
-    def MapClusters(self, S, A):
-        j = 0
-        for leaf in self.getLeaves(A):
-            self.M[0][j] = S[j]
-            self.M[1][j] = A[j]
-        return
-    
-    def reMap(self, S, A):
-        i = 0
-        j = 0
-        for process, core in zip(A, S):
-            self.M[0][i] = process[i]
-            self.M[1][i] = core[j]
-        return
-
-    def getLeaves(self, A) -> list:
-        return []
+        elif len(A) == 1:
+            self.doClustMap(S, self.tree[depth].children[A[0]], depth + 1)
+        else:
+            for node, clusters in zip(A, self.reMap(S, A, depth)):
+                self.doClustMap(clusters, [node], depth)
+
+    # a single leaf: its process is the only member of S
+    def MapClusters(self, S: list, A: list) -> None:
+        self.M[self.getLeaves(A, len(self.tree) - 1)] = np.concatenate([cluster.members for cluster in S])
+
+    # pack the clusters into the nodes, largest first into the node with the most space left
+    # clusters larger than any space are split, their subclusters prefer the node of the previous part
+    def reMap(self, S: list, A: list, depth: int) -> list:
+        space = np.array([len(self.getLeaves([node], depth)) for node in A])
+        packed = [[] for _ in A]
+        pending = [(cluster, False) for cluster in sorted(S, key=len)]  # stack, largest on top
+        last = None
+        while pending:
+            cluster, part = pending.pop()
+            if part and last is not None and space[last] >= len(cluster):
+                target = last
+            else:
+                target = int(np.argmax(space))
+            if space[target] < len(cluster):
+                last = last if part else None
+                pending += [(child, True) for child in sorted(cluster.children, key=len)]
+                continue
+            packed[target].append(cluster)
+            space[target] -= len(cluster)
+            last = target
+        return packed
+
+    # leaf positions below the nodes A of layer depth
+    def getLeaves(self, A: list, depth: int) -> list:
+        return [slot for node in A for slot in self.tree[depth].slots[node]]
@@ -0,0 +1,201 @@
+import mmap
+import os
+import re
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from toptypes import CommSeries
+
+STR_MARKER = b"Communication Matrix"
+STR_BACKEND = b"backend initialized"
+# backends print the location quoted: MPI backend initialized (at 'host:pid', rank 3/64)
+R_BE = re.compile(rb"backend initialized \(at '?(.+?)'?, rank (\d+)/(\d+)\)")
+# == LAIK-(0000)-L(03) (0006).(01)  (0):(00).(004) | (Communication Matrix:)
+#    logctr   rank  msgctr line  wall time
+R_EX = re.compile(rb"(==|\.\.) LAIK-(\d+)-L(\d+) (\d+)\.(\d+)\s+(\d+):(\d+)\.(\d+) \| ")
+
+
+# matrices (by logctr) and hostnames found in a single LAIK_LOG_FILE
+@dataclass
+class LogPartial:
+    file: str
+    ranks: int = 0
+    phases: dict = field(default_factory=dict)
+    hostnames: dict = field(default_factory=dict)
+    matrices: int = 0
+    size: int = 0
+    seconds: float = 0.0
+
+
+def lineAt(buf, pos: int) -> tuple:
+    start = buf.rfind(b"\n", 0, pos) + 1
+    end = buf.find(b"\n", pos)
+    return start, len(buf) if end < 0 else end
+
+
+# parse one log file: jump from marker to marker instead of running regexes on every line
+# LAIK dumps the cumulative matrix of a location at every phase change (laik_set_phase) and in laik_finalize,
+# the traffic of a logctr is the difference of its dump to the previous dump of that location:
+# matrix rows are added straight into a preallocated int64 matrix of the logctr they were logged in
+# and subtracted from the logctr of the next dump of their location
+# logs with a single dump per location (LAIK without per-phase dumps) have a single phase, the whole run
+def parseLogFile(file: str) -> LogPartial:
+    start_time = time.perf_counter()
+    res = LogPartial(file, size=os.path.getsize(file))
+    if res.size == 0:
+        return res
+
+    with open(file, "rb") as logfile, mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        pos = buf.find(STR_BACKEND)
+        while pos >= 0:  # set number of ranks and hostnames
+            start, end = lineAt(buf, pos)
+            output = R_BE.search(buf, start, end)
+            if output is not None:
+                res.ranks = res.ranks or int(output.group(3))
+                res.hostnames[int(output.group(2))] = output.group(1).decode()
+            pos = buf.find(STR_BACKEND, end)
+
+        heads = []
+        pos = buf.find(STR_MARKER)
+        while pos >= 0:
+            start, end = lineAt(buf, pos)
+            head = R_EX.search(buf, start, end)
+            if head is not None:
+                heads.append((end + 1, head.group(3), head.group(4), int(head.group(2))))
+            pos = buf.find(STR_MARKER, end)
+
+        # logctr of the next dump of the same location
+        latest, nexts = {}, []
+        for _, location, _, phase in reversed(heads):
+            nexts.append(latest.get(location))
+            latest[location] = phase
+        for (start, location, seq, phase), following in zip(heads, reversed(nexts)):
+            res.matrices += 1
+            parseMatrix(buf, start, location, seq, phase, following, res)
+
+    res.seconds = time.perf_counter() - start_time
+    return res
+
+
+# read the rows following a matrix header of given (rank, sequence) into the matrix of phase and subtract them
+# from the matrix of following (if not None), returns the end offset
+# lines of other log messages (interleaved output) are skipped, rows wrapped by the logger are joined
+def parseMatrix(buf, pos: int, rank: bytes, seq: bytes, phase: int, following: int | None, res: LogPartial) -> int:
+    rows, index, pending = 0, -1, []
+    while pos < len(buf) and (res.ranks == 0 or rows < res.ranks):
+        end = buf.find(b"\n", pos)
+        end = len(buf) if end < 0 else end
+        line = R_EX.search(buf, pos, end)
+        if line is None or line.group(3) != rank:
+            pos = end + 1
+            continue
+        if line.group(1) == b"==" or line.group(4) != seq:
+            break  # next message of this rank, matrix ended
+        if int(line.group(5)) > 2:  # matched a matrix row or its continuation
+            head, bar, values = buf[line.end() : end].partition(b"|")
+            if index < 0 and (head.strip() != b"0" or b"|" in values):  # wrapped column header
+                pos = end + 1
+                continue
+            if bar:
+                if pending:
+                    raise IndexError("truncated matrix row {} in {}".format(index, res.file))
+                index = int(head)
+            else:
+                values = head
+            pending.append(np.fromstring(values, dtype=np.int64, sep=" "))
+            count = sum(len(x) for x in pending)
+            if res.ranks == 0:
+                res.ranks = count
+            if count > res.ranks:  # misformed matrix output
+                raise IndexError("misformed matrix row in {}: {}".format(res.file, buf[pos:end].decode()))
+            if count == res.ranks:
+                row = pending[0] if len(pending) == 1 else np.concatenate(pending)
+                for p in (phase, following):
+                    if p is not None and p not in res.phases:
+                        res.phases[p] = np.zeros((res.ranks, res.ranks), dtype=np.int64)
+                res.phases[phase][index] += row
+                if following is not None:
+                    res.phases[following][index] -= row
+                rows, pending = rows + 1, []
+        pos = end + 1
+    return pos
+
+
+# running sum of the matrices of every logctr over all files, partials can be dropped once they are added:
+# memory stays at one matrix per logctr instead of one per file and logctr
+class LogMerge:
+    def __init__(self) -> None:
+        self.ranks = 0
+        self.phases = {}
+        self.hostnames = {}
+        self.files = 0
+        self.size = 0
+
+    def add(self, p: LogPartial) -> None:
+        self.ranks = max(self.ranks, p.ranks)
+        self.files += 1
+        self.size += p.size
+        for phase, matrix in p.phases.items():
+            if phase in self.phases:
+                total = self.phases[phase]
+                if matrix.shape != total.shape:
+                    raise ValueError("{} has a {} matrix, expected {}".format(p.file, matrix.shape, total.shape))
+                total += matrix
+            else:  # taken over, later files are added into the matrix of the partial
+                self.phases[phase] = matrix
+        self.hostnames.update(p.hostnames)
+
+    # (CommSeries, hostnames)
+    def result(self) -> tuple:
+        ranks = self.ranks
+        for phase, matrix in self.phases.items():
+            if matrix.shape != (ranks, ranks):
+                raise ValueError("logctr {} has a {} matrix, expected {}".format(phase, matrix.shape, (ranks, ranks)))
+        phases = self.phases or {0: np.zeros((ranks, ranks), dtype=np.int64)}
+        hostnames = ["" for _ in range(ranks)]
+        for rank, host in self.hostnames.items():
+            hostnames[rank] = host
+        return CommSeries(sorted(phases), [phases[phase] for phase in sorted(phases)]), hostnames
+
+
+# sum the matrices of every logctr over all files, returns (CommSeries, hostnames)
+def mergePartials(partials: list) -> tuple:
+    merged = LogMerge()
+    for p in partials:
+        merged.add(p)
+    return merged.result()
+
+
+# parse LAIK_LOG_FILEs with a process pool, reporting progress and throughput on stderr
+# workers=1 parses in the calling process, returns the matrices per logctr and the hostnames
+def parseLogFiles(logfiles: list, workers: int | None = None, progress: bool = True) -> tuple:
+    start_time = time.perf_counter()
+    merged = LogMerge()
+
+    def report(p: LogPartial) -> None:
+        merged.add(p)
+        if progress:
+            print(
+                "[{}/{}] {}: {} matrices, {:.1f} MiB in {:.2f}s".format(
+                    merged.files, len(logfiles), p.file, p.matrices, p.size / 2**20, p.seconds
+                ),
+                file=sys.stderr,
+            )
+
+    if workers == 1 or len(logfiles) < 2:
+        for file in logfiles:
+            report(parseLogFile(file))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # as_completed drops every future it yields, its matrices are freed once they are added
+            for future in as_completed([pool.submit(parseLogFile, file) for file in logfiles]):
+                report(future.result())
+
+    if progress:
+        seconds = time.perf_counter() - start_time
+        total = merged.size / 2**20
+        rate = total / max(seconds, 1e-9)
+        print("parsed {:.1f} MiB in {:.2f}s ({:.1f} MiB/s)".format(total, seconds, rate), file=sys.stderr)
+    return merged.result()
@@ -0,0 +1,150 @@
+import numpy as np
+from toptypes import CSRMatrix
+
+# partition the vertices of a communication graph into groups with heavy intra-group traffic
+# polynomial replacement for enumerating all combinations and their independent sets:
+#  k = 2: greedy heavy-edge matching, O(n^2) on dense weights, O(n log n + nnz) on CSRMatrix weights
+#  k > 2: recursive bisection by greedy graph growing with Kernighan-Lin swap refinement
+# groups of different sizes and vertex types (subtrees of unbalanced trees) are split by recursive bisection,
+# swaps only exchange vertices of the same type
+KL_SWAPS = 64  # max refinement swaps per bisection
+
+
+# C + C^T as float matrix without self communication, CSRMatrix stays sparse
+def symmetricWeights(matrix):
+    if isinstance(matrix, CSRMatrix):
+        weights = matrix.symmetric()
+        rows = weights.rowIndices()
+        keep = rows != weights.indices
+        data = weights.data[keep].astype(np.float64)
+        return CSRMatrix.fromEdges(rows[keep], weights.indices[keep], data, weights.shape)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    weights = matrix + matrix.T
+    np.fill_diagonal(weights, 0)
+    return weights
+
+
+# returns lists of vertex indices, len(matrix) must be a multiple of k
+def groupVertices(matrix, k: int) -> list:
+    n = len(matrix)
+    if k < 1 or n % k != 0:
+        raise ValueError("cannot split {} vertices into groups of {}".format(n, k))
+    if k == 1:
+        return [[i] for i in range(n)]
+    weights = symmetricWeights(matrix)
+    if k == 2:
+        return heavyEdgeMatching(weights)
+    return recursiveBisection(weights, np.arange(n), np.zeros(n, dtype=np.int64), np.full((n // k, 1), k))
+
+
+# returns a list of vertex indices per group, demands[g][t] is the number of vertices of type t in group g
+def groupVerticesByDemand(matrix, types, demands) -> list:
+    types = np.asarray(types, dtype=np.int64)
+    demands = np.asarray(demands, dtype=np.int64).reshape(len(demands), -1)
+    available = np.bincount(types, minlength=demands.shape[1])
+    if len(available) != demands.shape[1] or (demands.sum(axis=0) != available).any():
+        raise ValueError("cannot split vertices of types {} into groups of {}".format(available, demands.tolist()))
+    if demands.shape[1] == 1 and (demands == demands[0]).all():
+        return groupVertices(matrix, int(demands[0, 0]))
+    return recursiveBisection(symmetricWeights(matrix), np.arange(len(types)), types, demands)
+
+
+# match every vertex with its heaviest unmatched neighbour
+# vertices with the heaviest edges go first, which approximates a globally sorted greedy matching
+# vertices without a free neighbour take the lowest free vertex, dense and CSRMatrix weights give the same pairs
+def heavyEdgeMatching(weights) -> list:
+    if isinstance(weights, CSRMatrix):
+        return sparseHeavyEdgeMatching(weights)
+    n = len(weights)
+    free = np.ones(n, dtype=bool)
+    pairs = []
+    for u in np.argsort(-weights.max(axis=1, initial=0), kind="stable"):
+        if not free[u]:
+            continue
+        free[u] = False
+        candidates = np.where(free, weights[u], -np.inf)
+        v = int(np.argmax(candidates))
+        free[v] = False
+        pairs.append([int(u), v])
+    return pairs
+
+
+# heavyEdgeMatching on the stored edges of every row, as multilevel.matchVertices
+def sparseHeavyEdgeMatching(weights: CSRMatrix) -> list:
+    n = len(weights)
+    heaviest = np.zeros(n)
+    rows = np.flatnonzero(np.diff(weights.indptr))
+    heaviest[rows] = np.maximum(np.maximum.reduceat(weights.data, weights.indptr[rows]), 0)
+    free = np.ones(n, dtype=bool)
+    lowest = 0  # all vertices below are matched
+    pairs = []
+    for u in np.argsort(-heaviest, kind="stable"):
+        if not free[u]:
+            continue
+        free[u] = False
+        cols, vals = weights.row(u)
+        available = free[cols]
+        if available.any() and vals[available].max() > 0:
+            v = int(cols[available][np.argmax(vals[available])])
+        else:
+            while not free[lowest]:
+                lowest += 1
+            v = lowest
+        free[v] = False
+        pairs.append([int(u), v])
+    return pairs
+
+
+def recursiveBisection(weights, vertices: np.ndarray, types: np.ndarray, demands: np.ndarray) -> list:
+    groups = len(demands)
+    if groups == 1:
+        return [vertices.tolist()]
+    left, right = bisect(weights, vertices, types[vertices], demands[: groups // 2].sum(axis=0))
+    return recursiveBisection(weights, left, types, demands[: groups // 2]) + recursiveBisection(
+        weights, right, types, demands[groups // 2 :]
+    )
+
+
+# weights among vertices as dense matrix
+def subWeights(weights, vertices: np.ndarray) -> np.ndarray:
+    if not isinstance(weights, CSRMatrix):
+        return weights[np.ix_(vertices, vertices)]
+    position = np.full(len(weights), -1, dtype=np.int64)
+    position[vertices] = np.arange(len(vertices))
+    rows, cols = position[weights.rowIndices()], position[weights.indices]
+    keep = (rows >= 0) & (cols >= 0)
+    sub = np.zeros((len(vertices), len(vertices)))
+    sub[rows[keep], cols[keep]] = weights.data[keep]
+    return sub
+
+
+# split vertices into a part with need[t] vertices of type t and the rest with a small cut
+# the swap gains of every pair are dense, so is the block being split
+def bisect(weights, vertices: np.ndarray, types: np.ndarray, need: np.ndarray) -> tuple:
+    sub = subWeights(weights, vertices)
+    need = need.copy()
+
+    # grow the part from the heaviest vertex, always adding the vertex most connected to it
+    part = np.zeros(len(vertices), dtype=bool)
+    conn = np.zeros(len(vertices))
+    v = int(np.argmax(np.where(need[types] > 0, sub.sum(axis=1), -np.inf)))
+    for _ in range(need.sum()):
+        part[v] = True
+        need[types[v]] -= 1
+        conn += sub[v]
+        v = int(np.argmax(np.where(~part & (need[types] > 0), conn, -np.inf)))
+
+    # Kernighan-Lin: swap the pair of equal type with the best positive cut reduction
+    for _ in range(KL_SWAPS):
+        ext = sub @ ~part - sub @ part  # weight to the rest - weight to the part, per vertex
+        a, b = np.flatnonzero(part), np.flatnonzero(~part)
+        if len(a) == 0 or len(b) == 0:
+            break
+        gains = (ext[a][:, None] - ext[b][None, :]) - 2 * sub[np.ix_(a, b)]
+        gains[types[a][:, None] != types[b][None, :]] = -np.inf
+        i, j = np.unravel_index(np.argmax(gains), gains.shape)
+        if gains[i, j] <= 0:
+            break
+        part[a[i]], part[b[j]] = False, True
+
+    return vertices[part], vertices[~part]
@@ -0,0 +1,255 @@
+import hashlib
+import igraph
+import itertools
+import json
+import numpy as np
+import os
+import pickle
+import re
+import tempfile
+from dataclasses import asdict, dataclass, field
+from toptypes import HostGraph, hostDistances
+from xml.etree import ElementTree
+
+
+# hierarchy below every host, equal on all hosts
+#  levels: level names top-down, e.g. socket, numa, core
+#  weights: link weights from the cpus upwards, the last one links the top level to the host (len(levels) + 1 entries)
+#  cpus: per cpu in placement order the ids of its ancestors on every level, top-down
+# the k-th rank on a host runs on the k-th cpu (fill-up pinning), wrapping around when oversubscribed
+@dataclass
+class NodeTopology:
+    levels: list
+    weights: list
+    cpus: list
+
+    def __post_init__(self) -> None:
+        if len(self.weights) != len(self.levels) + 1:
+            raise ValueError(
+                "node topology: {} levels need {} weights, got {}".format(
+                    len(self.levels), len(self.levels) + 1, len(self.weights)
+                )
+            )
+        if len(self.cpus) == 0 or any(len(cpu) != len(self.levels) for cpu in self.cpus):
+            raise ValueError("node topology: every cpu needs an id on each of the levels {}".format(self.levels))
+
+    # append the intra-node ancestors of every rank to the ancestors of its host
+    def extend(self, paths: list) -> list:
+        ranks = {}
+        extended = []
+        for path in paths:
+            host = path[-1] if path else ""
+            k = ranks.get(host, 0)
+            ranks[host] = k + 1
+            cpu = self.cpus[k % len(self.cpus)]
+            names = ["{}{}".format(level, i) for level, i in zip(self.levels, cpu)]
+            extended.append(path + ["/".join([host] + names[: l + 1]) for l in range(len(names))])
+        return extended
+
+
+# socket, numa node and core of a single cpu: the levels pay off as soon as a node has more than one socket
+NODE_LEVELS = ["socket", "numa", "core"]
+NODE_WEIGHTS = [0, 0.5, 1, 2]  # intra numa 1, intra socket 3, cross socket 7
+
+
+# cpus of a list like 0-3,8,10-11
+def parseCpuList(text: str) -> list:
+    cpus = []
+    for part in text.strip().split(","):
+        if part:
+            first, _, last = part.partition("-")
+            cpus += range(int(first), int(last or first) + 1)
+    return cpus
+
+
+# local node from sysfs: numa nodes from node/node*/cpulist, sockets and cores from cpu/cpu*/topology
+def readSysNodeTopology(root: str = "/sys/devices/system") -> NodeTopology:
+    numa = {}
+    node_dir = os.path.join(root, "node")
+    for entry in sorted(os.listdir(node_dir)) if os.path.isdir(node_dir) else []:
+        if re.fullmatch(r"node\d+", entry):
+            with open(os.path.join(node_dir, entry, "cpulist")) as file:
+                numa.update((cpu, int(entry[4:])) for cpu in parseCpuList(file.read()))
+    if len(numa) == 0:
+        with open(os.path.join(root, "cpu", "online")) as file:
+            numa = dict.fromkeys(parseCpuList(file.read()), None)
+
+    cpus = []
+    for cpu in sorted(numa):
+        topology = os.path.join(root, "cpu", "cpu{}".format(cpu), "topology")
+        if not os.path.isdir(topology):  # offline
+            continue
+        with open(os.path.join(topology, "physical_package_id")) as file:
+            socket = int(file.read())
+        with open(os.path.join(topology, "core_id")) as file:
+            core = int(file.read())
+        cpus.append([socket, socket if numa[cpu] is None else numa[cpu], core])
+    return NodeTopology(NODE_LEVELS, NODE_WEIGHTS, cpus)
+
+
+# local node from an lstopo XML export (hwloc 1.x and 2.x): objects are matched to PUs by their cpusets
+# levels without objects fall back to the level above
+def readLstopoXML(path: str) -> NodeTopology:
+    objects = list(ElementTree.parse(path).getroot().iter("object"))
+    masks = {kind: [] for kind in ("Package", "NUMANode", "Core")}
+    for obj in objects:
+        if obj.get("type") in masks and obj.get("cpuset") is not None:
+            masks[obj.get("type")].append(int(obj.get("cpuset").replace(",", "").replace("0x", ""), 16))
+
+    def owner(kind: str, pu: int, default: int) -> int:
+        return next((i for i, mask in enumerate(masks[kind]) if mask >> pu & 1), default)
+
+    cpus = []
+    for pu in sorted(int(obj.get("os_index")) for obj in objects if obj.get("type") == "PU"):
+        socket = owner("Package", pu, 0)
+        cpus.append([socket, owner("NUMANode", pu, socket), owner("Core", pu, pu)])
+    return NodeTopology(NODE_LEVELS, NODE_WEIGHTS, cpus)
+
+
+# sysfs directory, lstopo XML file or the fields of NodeTopology
+def loadNodeTopology(source) -> NodeTopology:
+    if isinstance(source, dict):
+        return NodeTopology(**source)
+    if os.path.isdir(source):
+        return readSysNodeTopology(source)
+    return readLstopoXML(source)
+
+
+# description of a cluster's host hierarchy and link weights
+#  levels: level names top-down (e.g. island, rack, cabinet, server)
+#  weights: link weights from the hosts upwards, then the links between top level nodes (len(levels) + 1 entries)
+#  pattern: regex matched at the start of a hostname with one group per level,
+#    the name of a level is the hostname up to the end of its group
+#  hosts: explicit ancestors per host, top-down, as found in topology dumps; takes precedence over pattern
+#  node: levels below the last level (the host), its weights replace weights[0]
+# hosts are LAIK locations (host:pid), the pid is ignored when matching
+# hosts matched by neither are their own server (last level) on a branch of their own on every level above
+@dataclass
+class TopologySpec:
+    name: str
+    levels: list
+    weights: list
+    pattern: str | None = None
+    hosts: dict = field(default_factory=dict)
+    node: NodeTopology | None = None
+
+    def __post_init__(self) -> None:
+        if len(self.weights) != len(self.levels) + 1:
+            raise ValueError(
+                "topology {}: {} levels need {} weights, got {}".format(
+                    self.name, len(self.levels), len(self.levels) + 1, len(self.weights)
+                )
+            )
+        self.regex = re.compile(self.pattern) if self.pattern is not None else None
+        if self.node is not None and not isinstance(self.node, NodeTopology):
+            self.node = loadNodeTopology(self.node)
+
+    # unique names of the ancestors of a host, top-down
+    def ancestors(self, host: str) -> list:
+        node = host.partition(":")[0]
+        if host in self.hosts or node in self.hosts:
+            path = self.hosts.get(host, self.hosts.get(node))
+            return ["/".join(path[: l + 1]) for l in range(len(self.levels))]
+        match = self.regex.match(node) if self.regex is not None else None
+        if match is None or (match.lastindex or 0) < len(self.levels):
+            return ["{}/{}".format(node, level) for level in self.levels[:-1]] + [node]
+        return [node[: match.end(l + 1)] for l in range(len(self.levels))]
+
+    def digest(self) -> str:
+        spec = asdict(self)
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+# weights: (https://doku.lrz.de/hoechstleistungsrechner-10333235.html)
+# intra node: set to 1
+# inter node, on island: full omnipath
+# intra island: 3.75:1 compared to intra island
+SUPERMUC_NG = TopologySpec("supermuc-ng", ["isl", "rack", "cab", "srv"], [0.5, 5, 0, 0, 15], r"(i\d+)(r\d+)(c\d+)(s\d+)")
+
+
+# json with the fields of TopologySpec, e.g.
+# {"name": "cluster", "levels": ["rack", "node"], "weights": [0.5, 5, 10], "pattern": "(r\\d+)(n\\d+)"}
+# {"name": "dump", "levels": ["switch", "node"], "weights": [0.5, 5, 10], "hosts": {"host1": ["sw1", "host1"], ...}}
+# "node" is a sysfs directory, an lstopo XML file or an object with the fields of NodeTopology
+def loadTopologySpec(path: str) -> TopologySpec:
+    with open(path, "r") as file:
+        return TopologySpec(**json.load(file))
+
+
+HOST_GRAPH_FORMAT = 3  # version of pickled host graphs, bump when HostGraph changes
+
+
+# build the tree of the used topology in O(n) from the ancestors of every host
+# distances follow from the lowest common ancestor, see toptypes.TreeDistances
+def buildHostGraph(hostnames: list[str], spec: TopologySpec = SUPERMUC_NG) -> HostGraph:
+    topGraph = igraph.Graph()
+    paths = [spec.ancestors(host) for host in hostnames]
+    weights = spec.weights
+    if spec.node is not None:
+        paths = spec.node.extend(paths)
+        weights = spec.node.weights + spec.weights[1:]
+    depth = len(spec.levels) + (len(spec.node.levels) if spec.node is not None else 0)
+
+    # names of every level in order of appearance, mapped to their index in the level
+    levels = [{name: i for i, name in enumerate(dict.fromkeys(path[l] for path in paths))} for l in range(depth)]
+    # index of the ancestor on every level of every host
+    ids = np.array([[level[name] for level, name in zip(levels, path)] for path in paths], dtype=np.int64)
+    ids = ids.reshape(len(hostnames), depth)
+
+    # filter root nodes with only one leaf to minimize tree
+    top = 0
+    while top < depth - 1 and len(levels[top]) < 2 and len(levels[top + 1]) < 2:
+        top += 1
+    layers = [list(level) for level in levels[top:]] + [hostnames]
+
+    # vertices: hosts, then the kept levels top-down; edges from parent to child
+    offsets = dict(zip(range(top, depth), np.cumsum([len(hostnames)] + [len(x) for x in layers[:-1]]).tolist()))
+    topGraph.add_vertices(len(hostnames) + sum(len(x) for x in layers[:-1]))
+    topGraph.vs["name"] = hostnames + [name for layer in layers[:-1] for name in layer]
+    edges = [(offsets[depth - 1] + node, host) for host, node in enumerate(ids[:, depth - 1].tolist())]
+    edge_weights = [weights[0]] * len(hostnames)
+    for l in range(depth - 1, top, -1):
+        parents = np.zeros(len(levels[l]), dtype=np.int64)
+        parents[ids[:, l]] = ids[:, l - 1]
+        edges += [(offsets[l - 1] + parent, offsets[l] + i) for i, parent in enumerate(parents.tolist())]
+        edge_weights += [weights[depth - l]] * len(levels[l])
+    if top == 0:
+        edges += [(offsets[0] + a, offsets[0] + b) for a, b in itertools.combinations(range(len(levels[0])), r=2)]
+        edge_weights += [weights[depth]] * (len(edges) - len(edge_weights))
+    topGraph.add_edges(edges, dict(weight=edge_weights))
+
+    # distances by lowest common ancestor instead of all-pairs shortest paths, implicit for many hosts
+    names = spec.levels + (spec.node.levels if spec.node is not None else [])
+    return HostGraph(topGraph, hostDistances(ids, weights), layers, weights, names[top:])
+
+
+# host graphs are pickled to cache_dir, keyed by a hash of the format, the topology spec and the ordered hostnames
+# a cache_dir that cannot be written (read-only or shared home directories) only costs the rebuild,
+# entries that cannot be read (truncated, corrupt) are rebuilt and replaced
+def cachedHostGraph(hostnames: list[str], spec: TopologySpec, cache_dir: str) -> HostGraph:
+    key = "{}\n{}\n{}".format(HOST_GRAPH_FORMAT, spec.digest(), "\n".join(hostnames))
+    key = hashlib.sha256(key.encode()).hexdigest()
+    path = os.path.join(cache_dir, "{}-{}.pickle".format(spec.name, key[:32]))
+    try:
+        with open(path, "rb") as file:
+            graph = pickle.load(file)
+        if isinstance(graph, HostGraph):
+            return graph
+    except Exception:  # missing, or damaged: unpickling fails with about any exception type
+        pass
+
+    graph = buildHostGraph(hostnames, spec)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # every writer has a file of its own, concurrent runs never see or replace partial files
+        fd, temp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(graph, file)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+    except OSError:
+        pass
+    return graph
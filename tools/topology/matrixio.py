@@ -0,0 +1,94 @@
+import numpy as np
+import struct
+from toptypes import CommStats, CSRMatrix, buildCommGraph
+
+# binary communication matrix container, all fields little-endian
+#  header (64 bytes): magic, version, flags, reserved, value dtype, index dtype, ranks, nnz, names length, data offset
+#  hostnames: utf-8, separated by newlines
+#  data at data offset (aligned): dense ranks*ranks values, or CSR indptr (int64), indices, values
+MAGIC = b"LAIKCOMM"
+VERSION = 1
+FLAG_CSR = 0x1
+HEADER = struct.Struct("<8sHHI8s8sQQQQ")
+ALIGN = 64
+
+
+def align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+# write matrix (dense or CSRMatrix) with hostnames, sparse=True stores a dense matrix as CSR
+def writeMatrix(path: str, matrix, hostnames: list | None = None, sparse: bool = False) -> None:
+    if sparse and not isinstance(matrix, CSRMatrix):
+        matrix = CSRMatrix.fromDense(matrix)
+    if isinstance(matrix, CSRMatrix):
+        arrays = [matrix.indptr.astype("<i8"), matrix.indices.astype(matrix.indices.dtype.newbyteorder("<"))]
+        arrays.append(matrix.data.astype(matrix.data.dtype.newbyteorder("<")))
+        flags, nnz, index_type = FLAG_CSR, matrix.nnz, arrays[1].dtype.str
+    else:
+        arrays = [np.ascontiguousarray(matrix, dtype=np.asarray(matrix).dtype.newbyteorder("<"))]
+        flags, nnz, index_type = 0, arrays[0].size, ""
+    ranks = matrix.shape[0]
+    names = "\n".join(hostnames or []).encode()
+    offset = align(HEADER.size + len(names))
+    value_type = arrays[-1].dtype.str
+
+    with open(path, "wb") as file:
+        file.write(
+            HEADER.pack(MAGIC, VERSION, flags, 0, value_type.encode(), index_type.encode(), ranks, nnz, len(names), offset)
+        )
+        file.write(names)
+        for array in arrays:
+            file.write(b"\0" * (offset - file.tell()))
+            file.write(array.tobytes())
+            offset = align(file.tell())
+
+
+def isBinaryMatrix(path: str) -> bool:
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+# load a matrix file without reading the data: values are np.memmap views, pages are shared between processes
+# returns (matrix, hostnames), matrix is a read-only memmap or a CSRMatrix of memmaps
+def loadMatrix(path: str) -> tuple:
+    if not isBinaryMatrix(path):
+        try:
+            return loadTextMatrix(path), []
+        except UnicodeDecodeError:
+            raise ValueError("{}: neither a text matrix nor a {} file".format(path, MAGIC.decode())) from None
+
+    with open(path, "rb") as file:
+        magic, version, flags, _, value_type, index_type, ranks, nnz, names_len, offset = HEADER.unpack(
+            file.read(HEADER.size)
+        )
+        if version > VERSION:
+            raise ValueError("{}: unsupported matrix format version {}".format(path, version))
+        names = file.read(names_len).decode()
+    hostnames = names.split("\n") if names_len > 0 else []
+    value_type = np.dtype(value_type.rstrip(b"\0").decode())
+
+    if not flags & FLAG_CSR:
+        return np.memmap(path, dtype=value_type, mode="r", offset=offset, shape=(ranks, ranks)), hostnames
+
+    index_type = np.dtype(index_type.rstrip(b"\0").decode())
+    indptr = np.memmap(path, dtype="<i8", mode="r", offset=offset, shape=(ranks + 1,))
+    offset = align(offset + indptr.nbytes)
+    indices = np.memmap(path, dtype=index_type, mode="r", offset=offset, shape=(nnz,))
+    offset = align(offset + indices.nbytes)
+    data = np.memmap(path, dtype=value_type, mode="r", offset=offset, shape=(nnz,))
+    return CSRMatrix(indptr, indices, data, (ranks, ranks)), hostnames
+
+
+# text matrices as written by np.savetxt (-o) or laik_print_CommMatrix_to_file (leading rank count)
+def loadTextMatrix(path: str) -> np.ndarray:
+    with open(path, "r") as file:
+        lines = [line for line in file if line.strip()]
+    first = lines[0].split() if lines else []
+    skip = 1 if len(first) == 1 and len(lines) == int(first[0]) + 1 else 0
+    return np.loadtxt(lines[skip:], dtype=np.int64, ndmin=2)
+
+
+def loadCommStats(path: str) -> CommStats:
+    matrix, hostnames = loadMatrix(path)
+    return CommStats(buildCommGraph(matrix), matrix, hostnames)
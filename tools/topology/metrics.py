@@ -0,0 +1,106 @@
+import numpy as np
+from dataclasses import dataclass
+from toptypes import CSRMatrix, HostGraph, PermutedMatrix
+from treematch import buildTree
+
+# placement quality of a reordering on a topology tree, the same definitions for all optimizers and benchmarks
+# every communicating pair is classified once by the number of tree layers its two cores share from the top
+
+
+# ancestor of every leaf on every layer above it, columns top-down (leaves x layers - 1)
+def leafAncestors(top_graph: HostGraph) -> np.ndarray:
+    tree = buildTree(top_graph)
+    ancestors = np.zeros((len(tree[-1].types), len(tree) - 1), dtype=np.int64)
+    for l, layer in enumerate(tree[:-1]):
+        sizes = [len(slots) for slots in layer.slots]
+        ancestors[np.concatenate(layer.slots).astype(np.int64), l] = np.repeat(np.arange(len(sizes)), sizes)
+    return ancestors
+
+
+# (source core, destination core, volume) of every communicating pair of distinct processes, order[core] = process
+def commPairs(comm_mat, order) -> tuple:
+    order = np.asarray(order)
+    if isinstance(comm_mat, PermutedMatrix):  # the pairs of the base matrix under the composed order
+        return commPairs(comm_mat.base, comm_mat.order[order])
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+    if isinstance(comm_mat, CSRMatrix):
+        rows, cols, volumes = comm_mat.rowIndices(), comm_mat.indices, comm_mat.data
+    else:
+        matrix = np.asarray(comm_mat)
+        rows, cols = np.nonzero(matrix)
+        volumes = matrix[rows, cols]
+    keep = rows != cols
+    return position[rows[keep]], position[cols[keep]], volumes[keep]
+
+
+# number of leading ancestor columns two cores share
+def commonLevels(ancestors: np.ndarray, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    return np.cumprod(ancestors[src] == ancestors[dst], axis=1).sum(axis=1)
+
+
+# traffic by the number of shared ancestor columns: volumes[0] crosses the top layer, volumes[k] stays below
+# a common node of column k - 1 (but not column k)
+def levelVolumes(comm_mat, order, ancestors: np.ndarray) -> np.ndarray:
+    src, dst, volumes = commPairs(comm_mat, order)
+    common = commonLevels(ancestors, src, dst)
+    return np.bincount(common, weights=volumes, minlength=ancestors.shape[1] + 1).astype(volumes.dtype)
+
+
+#  volumes: traffic per level, "inter-<top>" between top layer nodes, "intra-<level>" within one node of the level
+#    but between different nodes of the level below
+#  hops: volume times the number of tree links between the cores
+#  cost: volume times the topology distance, the QAP objective
+#  max_link_load: highest traffic in one direction of a single link, max_link the layer and node below that link
+#    (the top layer has links between its nodes, max_link is then the pair of nodes)
+@dataclass
+class PlacementMetrics:
+    volumes: dict
+    hops: float
+    cost: float
+    max_link_load: float
+    max_link: tuple
+
+    # traffic leaving the nodes of level, e.g. outside("srv") for the off-node volume
+    def outside(self, level: str) -> float:
+        names = list(self.volumes)
+        return sum(self.volumes[name] for name in names[: names.index("intra-" + level)])
+
+
+def placementMetrics(comm_mat, order, top_graph: HostGraph) -> PlacementMetrics:
+    if len(top_graph.layers) == 0:
+        raise ValueError("placement metrics need the layers of the topology tree")
+    ancestors = leafAncestors(top_graph)
+    depth = ancestors.shape[1]
+    names = top_graph.levels or ["layer{}".format(l) for l in range(depth)]
+    src, dst, volumes = commPairs(comm_mat, order)
+    common = commonLevels(ancestors, src, dst)
+
+    per_level = np.bincount(common, weights=volumes, minlength=depth + 1)
+    labels = ["inter-" + names[0]] + ["intra-" + name for name in names]
+    hops = np.where(common == 0, 2 * depth + 1, 2 * (depth - common + 1))
+    cost = np.asarray(top_graph.distances()[src, dst])
+
+    # a pair uses the links above its cores' differing ancestors on every column from the one they first differ
+    path = np.column_stack((ancestors, np.arange(len(ancestors))))
+    max_load, max_link = 0.0, ()
+    for l in range(1, depth + 1):
+        crossing = common <= l
+        for ends in (src, dst):  # upwards from the source, downwards to the destination
+            load = np.bincount(path[ends[crossing], l], weights=volumes[crossing])
+            if len(load) > 0 and load.max() > max_load:
+                max_load, max_link = float(load.max()), (l, int(np.argmax(load)))
+    top = common == 0
+    if top.any():
+        nodes = int(ancestors[:, 0].max()) + 1
+        load = np.bincount(ancestors[src[top], 0] * nodes + ancestors[dst[top], 0], weights=volumes[top])
+        if load.max() > max_load:
+            max_load, max_link = float(load.max()), (0,) + divmod(int(np.argmax(load)), nodes)
+
+    return PlacementMetrics(
+        dict(zip(labels, per_level.tolist())),
+        float(np.dot(hops, volumes)),
+        float(np.dot(cost, volumes)),
+        max_load,
+        max_link,
+    )
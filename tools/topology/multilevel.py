@@ -0,0 +1,169 @@
+import numpy as np
+from toptypes import CSRMatrix, HostGraph
+from treematch import buildTree, checkedOrder
+
+# multilevel graph partitioning of the communication graph along the topology tree (METIS style):
+#  the children of a topology node are split into two halves by leaf count, the processes are bisected to match:
+#  coarsen by heavy edge matching, grow a bisection on the coarsest graph, project it back and refine on every level
+# all steps work on the sparse graph, one bisection is O(edges) per level, the recursion O(edges * log(leaves))
+COARSE_SIZE = 64  # stop coarsening at this many vertices
+MIN_SHRINK = 0.9  # stop coarsening when a level keeps more than this fraction of the vertices
+REFINE_PASSES = 8  # max refinement passes per level
+
+
+# symmetric communication graph without self loops: w(u, v) = c(u, v) + c(v, u)
+def commGraph(comm_mat) -> CSRMatrix:
+    matrix = comm_mat if isinstance(comm_mat, CSRMatrix) else CSRMatrix.fromDense(comm_mat)
+    graph = matrix.symmetric()
+    rows = graph.rowIndices()
+    keep = (rows != graph.indices) & (graph.data != 0)
+    return CSRMatrix.fromEdges(rows[keep], graph.indices[keep], graph.data[keep].astype(np.float64), graph.shape)
+
+
+# pair every vertex with its unmatched neighbour of the heaviest edge, coarse vertices weigh at most cap
+# returns the coarse vertex of every vertex and the number of coarse vertices
+def matchVertices(graph: CSRMatrix, vertex_weights: np.ndarray, cap: float, rng: np.random.Generator) -> tuple:
+    labels = np.full(len(vertex_weights), -1, dtype=np.int64)
+    count = 0
+    for v in rng.permutation(len(vertex_weights)):
+        if labels[v] >= 0:
+            continue
+        labels[v] = count
+        cols, vals = graph.row(v)
+        free = (labels[cols] < 0) & (vertex_weights[cols] + vertex_weights[v] <= cap)
+        if free.any():
+            labels[cols[free][np.argmax(vals[free])]] = count
+        count += 1
+    return labels, count
+
+
+# merge the vertices of every label, edges between them are dropped and parallel edges summed
+def contract(graph: CSRMatrix, labels: np.ndarray, count: int) -> CSRMatrix:
+    rows, cols = labels[graph.rowIndices()], labels[graph.indices]
+    keep = rows != cols
+    return CSRMatrix.fromEdges(rows[keep], cols[keep], graph.data[keep], (count, count))
+
+
+# greedy graph growing: starting at the heaviest vertex, add the vertex most connected to the part until it
+# weighs target, returns True for the vertices of the part
+def growBisection(graph: CSRMatrix, vertex_weights: np.ndarray, target: float) -> np.ndarray:
+    part = np.zeros(len(vertex_weights), dtype=bool)
+    connection = np.zeros(len(vertex_weights))
+    weight = 0.0
+    v = int(np.argmax(graph.rowSums())) if graph.nnz > 0 else 0
+    while weight < target:
+        part[v] = True
+        weight += vertex_weights[v]
+        cols, vals = graph.row(v)
+        connection[cols] += vals
+        if weight < target:
+            v = int(np.argmax(np.where(part, -np.inf, connection)))
+    return part
+
+
+# gain of moving each vertex to the other side: connection to the other side minus connection to its own
+def moveGains(graph: CSRMatrix, part: np.ndarray, degrees: np.ndarray) -> np.ndarray:
+    inside = graph.dot(part.astype(np.float64))
+    return np.where(part, degrees - 2 * inside, 2 * inside - degrees)
+
+
+# Fiduccia-Mattheyses style passes: positive gain moves in gain order while the part stays within tolerance of target
+# the neighbours of a moved vertex wait for the next pass, so the gains of a pass stay exact
+def refineBisection(
+    graph: CSRMatrix, vertex_weights: np.ndarray, part: np.ndarray, target: float, tolerance: float
+) -> np.ndarray:
+    part = part.copy()
+    degrees = graph.rowSums()
+    weight = vertex_weights[part].sum()
+    for _ in range(REFINE_PASSES):
+        gains = moveGains(graph, part, degrees)
+        candidates = np.flatnonzero(gains > 0)
+        locked = np.zeros(len(part), dtype=bool)
+        moved = False
+        for v in candidates[np.argsort(-gains[candidates], kind="stable")]:
+            change = -vertex_weights[v] if part[v] else vertex_weights[v]
+            if locked[v] or abs(weight + change - target) > tolerance:
+                continue
+            part[v] = not part[v]
+            weight += change
+            locked[graph.row(v)[0]] = True
+            moved = True
+        if not moved:
+            break
+    return part
+
+
+# move the vertices with the best gains from the heavier side until the part holds exactly target unit vertices
+def balanceBisection(graph: CSRMatrix, part: np.ndarray, target: int) -> np.ndarray:
+    part = part.copy()
+    excess = int(part.sum()) - target
+    if excess != 0:
+        side = np.flatnonzero(part if excess > 0 else ~part)
+        gains = moveGains(graph, part, graph.rowSums())[side]
+        part[side[np.argsort(-gains, kind="stable")[: abs(excess)]]] = excess < 0
+    return part
+
+
+# split the vertices of graph into a part of exactly target vertices (True) and the rest
+def multilevelBisection(graph: CSRMatrix, target: int, rng: np.random.Generator) -> np.ndarray:
+    n = graph.shape[0]
+    if target <= 0 or target >= n:
+        return np.full(n, target > 0)
+    levels = []
+    coarse, vertex_weights = graph, np.ones(n)
+    cap = max(1.0, np.ceil(1.5 * n / COARSE_SIZE))
+    while len(vertex_weights) > COARSE_SIZE and coarse.nnz > 0:
+        labels, count = matchVertices(coarse, vertex_weights, cap, rng)
+        if count > MIN_SHRINK * len(vertex_weights):
+            break
+        levels.append((coarse, vertex_weights, labels))
+        coarse = contract(coarse, labels, count)
+        vertex_weights = np.bincount(labels, weights=vertex_weights, minlength=count)
+
+    part = growBisection(coarse, vertex_weights, target)
+    part = refineBisection(coarse, vertex_weights, part, target, vertex_weights.max())
+    for fine, fine_weights, labels in reversed(levels):
+        part = part[labels]
+        part = refineBisection(fine, fine_weights, part, target, fine_weights.max())
+    return balanceBisection(graph, part, target)
+
+
+class Multilevel:
+    def __init__(self, comm_mat, top_graph: HostGraph, hostnames: list[str], seed: int | None = None) -> None:
+        self.comm_mat = comm_mat
+        self.top_graph = top_graph
+        self.hostnames = hostnames
+        self.rng = np.random.default_rng(seed)
+
+    def __str__(self) -> str:
+        return (
+            "Multilevel\n"
+            + "mat     {}\n".format(self.comm_mat)
+            + "graph   {}\n".format(self.top_graph)
+            + "hosts   {}".format(self.hostnames)
+        )
+
+    def solve(self) -> list:
+        if len(self.top_graph.layers) == 0:
+            raise ValueError("Multilevel needs the layers of the topology tree")
+        self.tree = buildTree(self.top_graph)
+        n = len(self.comm_mat)
+        if n != len(self.tree[-1].types):
+            raise ValueError("{} processes for {} topology leaves".format(n, len(self.tree[-1].types)))
+        self.order = np.full(n, -1, dtype=np.int64)
+        self.place(commGraph(self.comm_mat), np.arange(n), 0, list(range(len(self.tree[0].types))))
+        return checkedOrder(self.order, "Multilevel")
+
+    # distribute processes (the vertices of graph) over the leaves below nodes of layer depth
+    def place(self, graph: CSRMatrix, processes: np.ndarray, depth: int, nodes: list) -> None:
+        layer = self.tree[depth]
+        if len(nodes) == 1 and depth == len(self.tree) - 1:
+            self.order[layer.slots[nodes[0]]] = processes
+        elif len(nodes) == 1:
+            self.place(graph, processes, depth + 1, layer.children[nodes[0]])
+        else:
+            half = len(nodes) // 2
+            part = multilevelBisection(graph, sum(len(layer.slots[node]) for node in nodes[:half]), self.rng)
+            for side, side_nodes in ((part, nodes[:half]), (~part, nodes[half:])):
+                vertices = np.flatnonzero(side)
+                self.place(graph.induced(vertices), processes[vertices], depth, side_nodes)
@@ -0,0 +1,190 @@
+import itertools
+import math
+import numpy as np
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from multiprocessing.shared_memory import SharedMemory
+from qap import TauQAP
+from toptypes import CSRMatrix, HostGraph, PermutedMatrix, TreeDistances
+from treematch import TreeMatch
+
+# independent optimizer runs in a process pool, the best reordering wins
+# communication matrix and distances are placed in shared memory once, workers map them instead of unpickling copies
+GRACE = 5.0  # seconds granted after the budget for runs to return their result
+
+
+# one run: optimizer is "tauQAP" or "treeMatch", options are passed to TauQAP
+@dataclass
+class Start:
+    optimizer: str
+    options: dict = field(default_factory=dict)
+
+
+# outcome of one run, cost is the QAP objective for every optimizer
+@dataclass
+class StartResult:
+    start: Start
+    order: list
+    cost: float
+    seconds: float
+    worker: int
+
+
+@dataclass
+class MultiStartResult:
+    order: list
+    cost: float
+    results: list
+    seconds: float
+
+    # per worker process: runs, best, mean and worst cost, busy seconds
+    def workers(self) -> dict:
+        stats = {}
+        for pid, runs in itertools.groupby(sorted(self.results, key=lambda r: r.worker), key=lambda r: r.worker):
+            runs = list(runs)
+            costs = [r.cost for r in runs]
+            stats[pid] = dict(
+                runs=len(runs),
+                best=min(costs),
+                mean=sum(costs) / len(costs),
+                worst=max(costs),
+                seconds=sum(r.seconds for r in runs),
+            )
+        return stats
+
+
+# TreeMatch once (it is deterministic), then TauQAP with varying strategies, constructions and seeds
+# tree=False leaves out everything based on TreeMatch, for host graphs without layers
+def defaultStarts(count: int, seed: int | None = None, tree: bool = True) -> list:
+    starts = [Start("treeMatch")] if tree else []
+    constructions = ["greedy", "treeMatch", "random"] if tree else ["greedy", "random"]
+    combos = itertools.cycle(itertools.product(constructions, ["annealing", "tabu", "twoOpt"]))
+    for i, (construction, method) in zip(range(count - len(starts)), combos):
+        run_seed = None if seed is None else seed + i
+        starts.append(Start("tauQAP", dict(method=method, construction=construction, seed=run_seed)))
+    return starts
+
+
+# (name, shape, dtype) descriptors of arrays copied to shared memory
+def shareArrays(arrays: dict, blocks: list) -> dict:
+    shared = {}
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = SharedMemory(create=True, size=max(array.nbytes, 1))
+        blocks.append(block)
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        shared[key] = (block.name, array.shape, array.dtype.str)
+    return shared
+
+
+def attachArrays(shared: dict, blocks: list) -> dict:
+    arrays = {}
+    for key, (name, shape, dtype) in shared.items():
+        try:
+            block = SharedMemory(name=name, track=False)
+        except TypeError:  # python < 3.13 always tracks
+            block = SharedMemory(name=name)
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    return arrays
+
+
+def shareProblem(comm_mat, top_graph: HostGraph, blocks: list) -> tuple:
+    if isinstance(comm_mat, CSRMatrix):
+        comm = ("csr", shareArrays(dict(indptr=comm_mat.indptr, indices=comm_mat.indices, data=comm_mat.data), blocks))
+    else:
+        comm = ("dense", shareArrays(dict(matrix=np.asarray(comm_mat)), blocks))
+    dist = top_graph.distances()
+    if isinstance(dist, TreeDistances):
+        shared_dist = ("tree", shareArrays(dict(ids=dist.ids), blocks), dist.weights)
+    else:
+        shared_dist = ("dense", shareArrays(dict(matrix=dist), blocks), None)
+    # the graph and layers are small, only the matrices go to shared memory
+    return comm, shared_dist, replace(top_graph, topMatrix=[])
+
+
+def attachProblem(problem: tuple, blocks: list) -> tuple:
+    (comm_kind, comm), (dist_kind, dist, weights), top_graph = problem
+    comm = attachArrays(comm, blocks)
+    dist = attachArrays(dist, blocks)
+    if comm_kind == "csr":
+        n = len(comm["indptr"]) - 1
+        comm_mat = CSRMatrix(comm["indptr"], comm["indices"], comm["data"], (n, n))
+    else:
+        comm_mat = comm["matrix"]
+    top_matrix = TreeDistances(dist["ids"], weights) if dist_kind == "tree" else dist["matrix"]
+    return comm_mat, replace(top_graph, topMatrix=top_matrix)
+
+
+# deadline is wall-clock time (time.time()), runs starting late get the remaining budget
+def runStart(problem: tuple, hostnames: list, start: Start, deadline: float) -> StartResult:
+    start_time = time.perf_counter()
+    time_limit = None if deadline == math.inf else max(deadline - time.time(), 0.0)
+    blocks = []
+    try:
+        comm_mat, top_graph = attachProblem(problem, blocks)
+        if start.optimizer == "treeMatch":
+            order = TreeMatch(comm_mat, top_graph, hostnames).solve()
+        else:
+            order = TauQAP(comm_mat, top_graph, hostnames, time_limit=time_limit, **start.options).solve()
+        cost = PermutedMatrix(comm_mat, order).cost(top_graph.distances())
+        comm_mat = top_graph = None  # views into the blocks
+    finally:
+        for block in blocks:
+            block.close()
+    return StartResult(start, list(order), cost, time.perf_counter() - start_time, os.getpid())
+
+
+# stop the processes of runs that exceeded the grace period, python < 3.14 has no terminate_workers
+def terminateWorkers(pool: ProcessPoolExecutor) -> None:
+    if hasattr(pool, "terminate_workers"):
+        pool.terminate_workers()
+        return
+    processes = list((pool._processes or {}).values())
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+# run starts (default: defaultStarts(workers)) on workers processes within time_limit seconds
+# runs still pending when the budget is used up are cancelled, runs exceeding the grace period are terminated,
+# the best finished run is returned
+def multiStart(
+    comm_mat,
+    top_graph: HostGraph,
+    hostnames: list,
+    starts: list | None = None,
+    workers: int | None = None,
+    time_limit: float | None = None,
+    seed: int | None = None,
+) -> MultiStartResult:
+    workers = workers or os.cpu_count() or 1
+    starts = defaultStarts(workers, seed, len(top_graph.layers) > 0) if starts is None else starts
+    start_time = time.perf_counter()
+    deadline = math.inf if time_limit is None else time.time() + time_limit
+    blocks, results, pending = [], [], set()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        problem = shareProblem(comm_mat, top_graph, blocks)
+        pending = {pool.submit(runStart, problem, hostnames, start, deadline) for start in starts}
+        while pending and time.time() < deadline + GRACE:
+            timeout = None if deadline == math.inf else max(deadline + GRACE - time.time(), 0.0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            results += [future.result() for future in done]
+    finally:
+        if pending:
+            terminateWorkers(pool)
+        else:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    if len(results) == 0:
+        raise TimeoutError("no optimizer run finished within {}s".format(time_limit))
+    best = min(results, key=lambda r: r.cost)
+    return MultiStartResult(best.order, best.cost, results, time.perf_counter() - start_time)
@@ -0,0 +1,103 @@
+import numpy as np
+from dataclasses import dataclass
+from toptypes import CommSeries, CSRMatrix, HostGraph, PermutedMatrix
+
+# phase-aware reordering on the per-logctr matrices of a LAIK run
+# consecutive logctrs with a similar communication pattern form a segment, every segment gets its own reordering
+# and is compared to the reordering of the whole run: a large gap suggests reordering between the segments
+# (the "reordering after init" path of laik_allow_reordering)
+PHASE_THRESHOLD = 0.3  # pattern distance above which a logctr starts a new segment
+
+
+# distance of two communication patterns: half the L1 distance of their normalized matrices, 0 (same distribution
+# of traffic over the pairs) to 1 (no pair in common), empty matrices are 0 from each other and 1 from the rest
+def patternDistance(a, b) -> float:
+    if isinstance(a, CSRMatrix) or isinstance(b, CSRMatrix):
+        a = a if isinstance(a, CSRMatrix) else CSRMatrix.fromDense(a)
+        b = b if isinstance(b, CSRMatrix) else CSRMatrix.fromDense(b)
+        sums = float(a.data.sum()), float(b.data.sum())
+        if 0 in sums:
+            return float(sums[0] != sums[1])
+        diff = CSRMatrix.fromEdges(
+            np.concatenate((a.rowIndices(), b.rowIndices())),
+            np.concatenate((a.indices, b.indices)),
+            np.concatenate((a.data / sums[0], -b.data / sums[1])),
+            a.shape,
+        )
+        return float(np.abs(diff.data).sum()) / 2
+    a, b = np.asarray(a), np.asarray(b)
+    sums = float(a.sum()), float(b.sum())
+    if 0 in sums:
+        return float(sums[0] != sums[1])
+    return float(np.abs(a / sums[0] - b / sums[1]).sum()) / 2
+
+
+def isEmpty(matrix) -> bool:
+    return (matrix.data if isinstance(matrix, CSRMatrix) else np.asarray(matrix)).sum() == 0
+
+
+# traffic of the phases in segment, weighted like CommSeries.total
+def segmentMatrix(series: CommSeries, segment: list, weights: list | None = None):
+    segment_weights = None if weights is None else [weights[k] for k in segment]
+    return CommSeries([series.phases[k] for k in segment], [series.matrices[k] for k in segment]).total(segment_weights)
+
+
+# group consecutive phases into segments of a similar pattern, returns lists of phase indices
+# a phase joins the current segment when its distance to the segment's (weighted) summed matrix is below threshold,
+# phases without traffic always join; the segment's matrix is a running sum, O(phases) matrix additions
+def phaseSegments(series: CommSeries, threshold: float = PHASE_THRESHOLD, weights: list | None = None) -> list:
+    if weights is not None and len(weights) != len(series):
+        raise ValueError("{} phase weights for {} phases".format(len(weights), len(series)))
+    segments = []
+    current = None
+    for k in range(len(series)):
+        matrix = segmentMatrix(series, [k], weights)
+        if current is not None and (isEmpty(matrix) or patternDistance(current, matrix) < threshold):
+            segments[-1].append(k)
+            current = CommSeries([0, 1], [current, matrix]).total()
+        else:
+            segments.append([k])
+            current = matrix
+    return segments
+
+
+# reordering of a segment of logctrs (first to last), cost is the QAP cost of the segment's traffic on it,
+# shared_cost the cost of the same traffic on the reordering of the whole run
+@dataclass
+class PhasePlan:
+    first: int
+    last: int
+    reordering: list
+    cost: float
+    shared_cost: float
+
+    # fraction of the segment's cost saved by switching to its own reordering
+    @property
+    def gain(self) -> float:
+        return 1 - self.cost / self.shared_cost if self.shared_cost > 0 else 0.0
+
+
+# solve(matrix) -> reordering runs the optimizer, the whole run is optimized on the weighted sum of its phases
+# and the segments are formed and scored on the same weighted matrices
+# returns the reordering of the whole run and a PhasePlan per segment
+def phaseReorderings(
+    series: CommSeries,
+    top_graph: HostGraph,
+    solve,
+    weights: list | None = None,
+    threshold: float = PHASE_THRESHOLD,
+) -> tuple:
+    shared = solve(series.total(weights))
+    dist = top_graph.distances()
+    segments = phaseSegments(series, threshold, weights)
+    plans = []
+    for segment in segments:
+        matrix = segmentMatrix(series, segment, weights)
+        shared_cost = PermutedMatrix(matrix, shared).cost(dist)
+        reordering = solve(matrix) if len(segments) > 1 else shared
+        cost = PermutedMatrix(matrix, reordering).cost(dist)
+        if cost > shared_cost:  # the optimizers are heuristics, never suggest a worse placement
+            reordering, cost = shared, shared_cost
+        first, last = series.phases[segment[0]], series.phases[segment[-1]]
+        plans.append(PhasePlan(first, last, list(reordering), cost, shared_cost))
+    return shared, plans
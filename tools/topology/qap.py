@@ -1,22 +1,284 @@
 import itertools
 import igraph
+import math
 import numpy as np
-from toptypes import HostGraph, getNodeChildren, UINT64_MAX
+import time
+from toptypes import CSRMatrix, HostGraph, PermutedMatrix, TreeDistances, asDistances, getNodeChildren, UINT64_MAX
+from treematch import TreeMatch
 from typing import Iterable
 
 
+# incremental evaluation of the QAP objective sum_ij C[p[i]][p[j]] * D[i][j]
+# p maps cores (positions) to processes, like the reorderings returned by the optimizers
+# the full objective is computed once, swaps of two positions are scored with the
+# O(n) delta formula (Taillard) or for a whole row of swap partners at once
+class CostEngine:
+    def __init__(self, comm_mat, dist_mat, order: Iterable[int]) -> None:
+        comm = np.asarray(comm_mat)
+        dist = np.asarray(dist_mat)
+        # float64 uses BLAS for the row products, it is exact as long as every partial sum fits the mantissa
+        self.integral = np.issubdtype(comm.dtype, np.integer) and np.issubdtype(dist.dtype, np.integer)
+        exact = float(np.abs(comm).sum()) * float(np.abs(dist).max(initial=0)) < 2**53
+        dtype = np.float64 if exact or not self.integral else np.int64
+        self.comm = comm.astype(dtype, copy=False)
+        self.dist = dist.astype(dtype, copy=False)
+        self.order = np.array(order, dtype=np.intp)
+        self.flow = self.comm[np.ix_(self.order, self.order)]
+        self.rowdot = None
+        self.coldot = None
+        self.deltas = None
+        self.cost = self.totalCost()
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def scalar(self, value):
+        return int(round(value)) if self.integral else float(value)
+
+    def totalCost(self, order=None):
+        if order is None:
+            return self.scalar(np.sum(self.flow * self.dist))
+        return self.scalar(PermutedMatrix(self.comm, order).cost(self.dist))
+
+    # cost change when exchanging the processes on positions r and s, O(n)
+    def delta(self, r: int, s: int):
+        if r == s:
+            return self.scalar(0)
+        F, D = self.flow, self.dist
+        mask = np.ones(len(self.order), dtype=bool)
+        mask[[r, s]] = False
+        acc = np.dot(F[s, mask] - F[r, mask], D[r, mask] - D[s, mask])
+        acc += np.dot(F[mask, s] - F[mask, r], D[mask, r] - D[mask, s])
+        acc += (F[s, s] - F[r, r]) * (D[r, r] - D[s, s]) + (F[s, r] - F[r, s]) * (D[r, s] - D[s, r])
+        return self.scalar(acc)
+
+    # cost changes for exchanging position r with every position s, O(n^2) but vectorized
+    def deltaRow(self, r: int) -> np.ndarray:
+        deltas = self.rawDeltaRow(r)
+        return np.rint(deltas).astype(np.int64) if self.integral else deltas
+
+    def rawDeltaRow(self, r: int) -> np.ndarray:
+        F, D = self.flow, self.dist
+        if self.rowdot is None:
+            prod = F * D
+            self.rowdot, self.coldot = prod.sum(axis=1), prod.sum(axis=0)
+        fR, fC, dR, dC = F[r, :], F[:, r], D[r, :], D[:, r]
+        fD, dD = np.diagonal(F), np.diagonal(D)
+        frr, drr = F[r, r], D[r, r]
+
+        # sums over all k, minus the k in {r, s} terms, plus the exact terms for r and s
+        rows = F @ dR + D @ fR - self.rowdot - self.rowdot[r]
+        cols = F.T @ dC + D.T @ fC - self.coldot - self.coldot[r]
+        rows -= (fC - frr) * (drr - dC) + (fD - fR) * (dR - dD)
+        cols -= (fR - frr) * (drr - dR) + (fD - fC) * (dC - dD)
+        deltas = rows + cols + (fD - frr) * (drr - dD) + (fC - fR) * (dR - dC)
+        deltas[r] = 0
+        return deltas
+
+    # cost changes of all n^2 swaps, the matrix is kept up to date by swap() from then on
+    def deltaMatrix(self) -> np.ndarray:
+        if self.deltas is not None:
+            return self.deltas
+        F, D = self.flow, self.dist
+        prod = F * D
+        rowdot, coldot = prod.sum(axis=1), prod.sum(axis=0)
+        fD, dD = np.diagonal(F), np.diagonal(D)
+        frr, drr = fD[:, None], dD[:, None]
+
+        # same terms as rawDeltaRow, with r running down the rows
+        rows = D @ F.T + F @ D.T - rowdot[None, :] - rowdot[:, None]
+        cols = D.T @ F + F.T @ D - coldot[None, :] - coldot[:, None]
+        rows -= (F.T - frr) * (drr - D.T) + (fD - F) * (D - dD)
+        cols -= (F - frr) * (drr - D) + (fD - F.T) * (D.T - dD)
+        self.deltas = rows + cols + (fD - frr) * (drr - dD) + (F.T - F) * (D - D.T)
+        np.fill_diagonal(self.deltas, 0)
+        return self.deltas
+
+    # exchange the processes on positions r and s and update the objective, O(n)
+    # a maintained delta matrix costs another O(n^2) update
+    def swap(self, r: int, s: int, delta=None) -> None:
+        if r == s:
+            return
+        if delta is None:
+            delta = self.delta(r, s)
+        if self.deltas is not None:
+            # swaps (u, v) disjoint from (r, s) only change by two rank-one terms
+            a = self.flow[:, s] - self.flow[:, r]
+            b = self.dist[:, r] - self.dist[:, s]
+            c = self.flow[s, :] - self.flow[r, :]
+            e = self.dist[r, :] - self.dist[s, :]
+            self.deltas -= np.subtract.outer(a, a) * np.subtract.outer(b, b)
+            self.deltas -= np.subtract.outer(c, c) * np.subtract.outer(e, e)
+        self.order[[r, s]] = self.order[[s, r]]
+        self.flow[[r, s], :] = self.flow[[s, r], :]
+        self.flow[:, [r, s]] = self.flow[:, [s, r]]
+        self.rowdot = None
+        self.coldot = None
+        self.cost += delta
+        if self.deltas is not None:
+            for x in (r, s):
+                self.deltas[x, :] = self.deltas[:, x] = self.rawDeltaRow(x)
+
+    def reorder(self, order: Iterable[int]) -> None:
+        self.order = np.array(order, dtype=np.intp)
+        self.flow = self.comm[np.ix_(self.order, self.order)]
+        self.rowdot = None
+        self.coldot = None
+        self.deltas = None
+        self.cost = self.totalCost()
+
+
+# CostEngine for CSRMatrix communication: only the edges of the swapped processes are visited
+# delta(r, s) is O(deg), deltaRow(r) is O(nnz + n * deg) instead of O(n^2)
+class SparseCostEngine:
+    def __init__(self, comm_mat: CSRMatrix, dist_mat, order: Iterable[int]) -> None:
+        dist = asDistances(dist_mat)  # only queried in batches, implicit distances stay implicit
+        self.integral = np.issubdtype(comm_mat.data.dtype, np.integer) and np.issubdtype(dist.dtype, np.integer)
+        exact = float(np.abs(comm_mat.data).sum()) * float(abs(dist).max(initial=0)) < 2**53
+        dtype = np.float64 if exact or not self.integral else np.int64
+        self.out = CSRMatrix(comm_mat.indptr, comm_mat.indices, comm_mat.data.astype(dtype), comm_mat.shape)
+        self.inc = self.out.transpose()
+        self.rows = self.out.rowIndices()
+        self.selfcomm = self.out.diagonal()
+        self.dist = dist.astype(dtype, copy=False)
+        self.reorder(order)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def scalar(self, value):
+        return int(round(value)) if self.integral else float(value)
+
+    def totalCost(self, order=None):
+        pos = self.pos
+        if order is not None:
+            pos = np.empty(len(self.order), dtype=np.intp)
+            pos[np.asarray(order, dtype=np.intp)] = np.arange(len(self.order))
+        return self.scalar(np.dot(self.out.data, self.dist[pos[self.rows], pos[self.out.indices]]))
+
+    # X sums of the delta formula: edges of a and b with their other end on its current position
+    def pairTerms(self, a: int, b, r: int, s) -> tuple:
+        D, pos = self.dist, self.pos
+        cab = self.out.denseRow(a)[b]
+        cba = self.inc.denseRow(a)[b]
+        caa, cbb = self.selfcomm[a], self.selfcomm[b]
+        drr, dss, drs, dsr = D[r, r], D[s, s], D[r, s], D[s, r]
+        # the four pairs within {a, b} are counted twice in X, replace them with their true change
+        wrong = caa * (dsr + drs - 2 * drr) + cab * (dss + drr - 2 * drs) + cba * (drr + dss - 2 * dsr)
+        wrong += cbb * (drs + dsr - 2 * dss)
+        true = caa * (dss - drr) + cbb * (drr - dss) + cab * (dsr - drs) + cba * (drs - dsr)
+        return true - wrong
+
+    def delta(self, r: int, s: int):
+        if r == s:
+            return self.scalar(0)
+        D, pos = self.dist, self.pos
+        a, b = self.order[r], self.order[s]
+        acc = 0
+        for p, here, there in ((a, r, s), (b, s, r)):
+            cols, vals = self.out.row(p)
+            acc += np.dot(vals, D[there, pos[cols]] - D[here, pos[cols]])
+            cols, vals = self.inc.row(p)
+            acc += np.dot(vals, D[pos[cols], there] - D[pos[cols], here])
+        return self.scalar(acc + self.pairTerms(a, b, r, s))
+
+    def deltaRow(self, r: int) -> np.ndarray:
+        deltas = self.rawDeltaRow(r)
+        return np.rint(deltas).astype(np.int64) if self.integral else deltas
+
+    def rawDeltaRow(self, r: int) -> np.ndarray:
+        D, pos, n = self.dist, self.pos, len(self.order)
+        a = self.order[r]
+        if self.outcost is None:
+            # per process: cost of its outgoing and incoming edges at the current placement
+            costs = self.out.data * D[pos[self.rows], pos[self.out.indices]]
+            self.outcost = np.bincount(self.rows, weights=costs, minlength=n)
+            self.incost = np.bincount(self.out.indices, weights=costs, minlength=n)
+
+        # a moves from r to every s
+        cols, vals = self.out.row(a)
+        deltas = D[:, pos[cols]] @ vals - np.dot(vals, D[r, pos[cols]])
+        cols, vals = self.inc.row(a)
+        deltas += vals @ D[pos[cols], :] - np.dot(vals, D[pos[cols], r])
+        # every b = order[s] moves from s to r
+        moved = np.bincount(self.rows, weights=self.out.data * D[r, pos[self.out.indices]], minlength=n)
+        moved += np.bincount(self.out.indices, weights=self.out.data * D[pos[self.rows], r], minlength=n)
+        deltas += (moved - self.outcost - self.incost)[self.order]
+        deltas += self.pairTerms(a, self.order, r, np.arange(n))
+        deltas[r] = 0
+        return deltas
+
+    def swap(self, r: int, s: int, delta=None) -> None:
+        if r == s:
+            return
+        if delta is None:
+            delta = self.delta(r, s)
+        self.order[[r, s]] = self.order[[s, r]]
+        self.pos[self.order[[r, s]]] = [r, s]
+        self.outcost = None
+        self.incost = None
+        self.cost += delta
+
+    def reorder(self, order: Iterable[int]) -> None:
+        self.order = np.array(order, dtype=np.intp)
+        self.pos = np.empty(len(self.order), dtype=np.intp)
+        self.pos[self.order] = np.arange(len(self.order))
+        self.outcost = None
+        self.incost = None
+        self.cost = self.totalCost()
+
+
+# sparse engine for CSRMatrix input, the dense one otherwise or when the full delta matrix is needed
+def costEngine(comm_mat, dist_mat, order: Iterable[int], dense: bool = False):
+    if isinstance(comm_mat, CSRMatrix):
+        if not dense:
+            return SparseCostEngine(comm_mat, dist_mat, order)
+        comm_mat = comm_mat.toDense()
+    return CostEngine(comm_mat, dist_mat, order)
+
+
 class TauQAP:
-    def __init__(self, comm_mat: list, top_graph: HostGraph, hostnames: list[str]) -> None:
+    # improvement strategies selectable via method, see doImprovementMethod
+    methods = ["cyclic", "twoOpt", "tabu", "annealing"]
+    # initial reorderings selectable via construction, see initialOrder
+    constructions = ["greedy", "identity", "random", "treeMatch"]
+
+    # time_limit in seconds, max_iter counts sweeps (cyclic, twoOpt), moves (tabu) or proposals (annealing)
+    # initial: a previous reordering to improve instead of constructing one (warm start, see warmstart)
+    def __init__(
+        self,
+        comm_mat: list,
+        top_graph: HostGraph,
+        hostnames: list[str],
+        method: str = "twoOpt",
+        time_limit: float | None = None,
+        max_iter: int | None = None,
+        seed: int | None = None,
+        construction: str = "greedy",
+        initial: list | None = None,
+    ) -> None:
+        if method not in self.methods:
+            raise ValueError("unknown QAP improvement method {}".format(method))
+        if construction not in self.constructions:
+            raise ValueError("unknown QAP construction {}".format(construction))
         self.comm_mat = comm_mat
         self.top_graph = top_graph
         self.hostnames = hostnames
+        self.method = method
+        self.construction = construction
+        self.time_limit = time_limit
+        self.max_iter = max_iter
+        self.initial = initial
+        self.rng = np.random.default_rng(seed)
 
     def __str__(self) -> str:
         return (
             "TauQAP\n"
             + "mat     {}\n".format(self.comm_mat)
             + "graph   {}\n".format(self.top_graph)
-            + "hosts   {}".format(self.hostnames)
+            + "hosts   {}\n".format(self.hostnames)
+            + "method  {}\n".format(self.method)
+            + "start   {}".format(self.construction)
         )
 
     def solve(self):
@@ -28,121 +290,184 @@ class TauQAP:
         return self.doImprovementMethod()
 
     # construct a reordering based on communication load and distances
+    # greedy: the unassigned process with the highest load towards the already assigned processes
+    # goes to the free core with the lowest distance to the already assigned cores
+    # loads and distances are kept as running sums with a rank-1 update per assignment, O(n^2) total
     def doConstructionMethod(self):
-        reordering = [0 for _ in range(len(self.hostnames))]
-        initial_loads = [self.calcCommLoad(x, list(range(len(self.hostnames)))) for x in range(len(self.hostnames))]
-        initial_dists = [self.calcCoreDist(x, list(range(len(self.hostnames)))) for x in range(len(self.hostnames))]
-
-        # print("initial process loads:  ", initial_loads)
-        # print("initial core distances: ", initial_dists)
-
-        max_load = initial_loads.index(max(initial_loads))
-        min_dist = initial_dists.index(min(initial_dists))
-
-        # the core with the lowest total distance receives the rank with highest comm load
-        # print("assigned {} to {}".format(max_load, min_dist))
+        n = len(self.hostnames)
+        dist = self.top_graph.distances()
+        if not isinstance(dist, TreeDistances):
+            # transposed so that the per-assignment updates read contiguous rows
+            dist = np.array(np.transpose(dist), dtype=np.float64, order="C")
+            np.fill_diagonal(dist, 0)
+        if isinstance(self.comm_mat, CSRMatrix):
+            load = self.comm_mat.symmetric()
+            load.data = load.data.astype(np.float64)
+            total_load = load.rowSums() - load.diagonal()
+        else:
+            comm = np.asarray(self.comm_mat, dtype=np.float64)
+            load = comm + comm.T
+            np.fill_diagonal(load, 0)
+            total_load = load.sum(axis=1)
+        reordering = np.zeros(n, dtype=np.intp)
 
-        reordering[min_dist] = max_load
-        unassigned_procs = list(range(len(self.hostnames)))
-        unassigned_procs.remove(max_load)
-        assigned_procs = [max_load]
-        unassigned_cores = list(range(len(self.hostnames)))
-        unassigned_cores.remove(min_dist)
-        assigned_cores = [min_dist]
+        # the core with the lowest total distance receives the rank with highest total comm load
+        max_load = int(np.argmax(total_load))
+        min_dist = int(np.argmin(dist.sum(axis=0)))
 
-        for n in range(1, len(self.hostnames)):
-            # calculate all loads and dists for every still unassigned process
-            # print("unassigned procs for n {}: ".format(n), unassigned_procs)
-            # print("unassigned cores for n {}: ".format(n), unassigned_cores)
-
-            loads = [self.calcCommLoad(proc, assigned_procs) for proc in unassigned_procs]
-            dists = [self.calcCoreDist(core, assigned_cores) for core in unassigned_cores]
-
-            # print("loads for n {}: loads, assigned".format(n), loads, assigned_procs)
-            # print("dists for n {}: dists, assigned".format(n), dists, assigned_cores)
-            # print("index of max load: ", loads[::-1].index(max(loads)), "-> proc", unassigned_procs[loads.index(max(loads))])
-            # print("index of min dist: ", dists[::-1].index(min(dists)), "-> core", unassigned_cores[dists.index(min(dists))])
-
-
-            # get element from unassigned list which matches minmax load/dist
-            max_load = unassigned_procs[loads.index(max(loads))]
-            min_dist = unassigned_cores[dists.index(min(dists))]
-            # print(max_load, min_dist)            
+        # assigned entries are masked with -inf/inf so they never win again
+        loads = np.zeros(n)
+        dists = np.zeros(n)
+        for _ in range(n):
             reordering[min_dist] = max_load
-            # print("assigned {} to {}".format(max_load, min_dist))
-
-            unassigned_procs.remove(max_load)
-            assigned_procs.append(max_load)
-            unassigned_cores.remove(min_dist)
-            assigned_cores.append(min_dist)
+            if isinstance(load, CSRMatrix):
+                cols, vals = load.row(max_load)
+                loads[cols] += vals
+            else:
+                loads += load[max_load]
+            dists += dist[min_dist]
+            loads[max_load] = -np.inf
+            dists[min_dist] = np.inf
+            # first index wins on ties, like the list based search did
+            max_load = int(np.argmax(loads))
+            min_dist = int(np.argmin(dists))
 
         # print("QAP Construction: ", reordering, self.totalCost(reordering))
-        return reordering
+        return reordering.tolist()
 
-    # iteratively improve initial reordering (identity)
+    # reordering the improvement strategy starts from
+    def initialOrder(self) -> list:
+        if self.initial is not None:
+            return list(self.initial)
+        if self.construction == "identity":
+            return list(range(len(self.hostnames)))
+        if self.construction == "random":
+            return self.rng.permutation(len(self.hostnames)).tolist()
+        if self.construction == "treeMatch":
+            return TreeMatch(self.comm_mat, self.top_graph, self.hostnames).solve()
+        return self.doConstructionMethod()
+
+    # iteratively improve the constructed reordering with the selected strategy
     def doImprovementMethod(self):
         # return self.cyclicSearch(list(range(len(self.hostnames))))[0]
-        res = self.cyclicSearch(self.doConstructionMethod())
+        res = getattr(self, self.method + "Search")(self.initialOrder())
         # print("total QAP cost: ", res[1])
         return res[0]
 
-    # calculate total communication load between process and already assigned processes
-    # initial process: treat every process as assigned
-    def calcCommLoad(self, process: int, assigned: Iterable[int]) -> int:
-        load = 0
-        for i in range(len(self.hostnames)):
-            if i == process or i not in assigned:
-                continue
-            load += self.comm_mat[process][i]
-            load += self.comm_mat[i][process]
-        return load
-
-    # calculate total distance between node and already assigned nodes
-    def calcCoreDist(self, node: int, assigned: Iterable[int]):
-        dist = 0
-        for i in range(len(self.hostnames)):
-            if i == node or i not in assigned:
-                continue
-            dist += self.top_graph.topMatrix[node][i]
-            # dist += self.top_graph.topMatrix[i][node]
-        return dist
+    def deadline(self) -> float:
+        return math.inf if self.time_limit is None else time.perf_counter() + self.time_limit
 
+    # one sweep of pairwise exchanges, every improving swap is applied right away
     def cyclicSearch(self, initial: Iterable):
-        # if self.totalCost(initial) > self.totalCost(range(len(self.hostnames))):
-            # best_sol, best_cost = list(range(len(self.hostnames))), self.totalCost(range(len(self.hostnames)))
-        # else:
-        best_sol, best_cost = initial, self.totalCost(initial)
-        current_sol, current_cost = best_sol, best_cost
-
-        i, j, n = 0, 1, len(self.hostnames)
-        for _ in range(n ** 2): # for i, for j
-            current_sol = self.pairExchange(best_sol, i, j)
-            current_cost = self.totalCost(current_sol)
-            if current_cost < best_cost:
-                best_sol = current_sol
-                best_cost = current_cost
-            if j < n - 1:
-                j += 1
-            elif j == n and i < n - 2:
-                i += 1
-                j = i + 2
+        engine = costEngine(self.comm_mat, self.top_graph.distances(), initial)
+        self.sweep(engine, self.deadline())
+        return engine.order.tolist(), engine.cost
+
+    # returns whether any swap improved the objective
+    def sweep(self, engine, deadline: float) -> bool:
+        improved = False
+        for i in range(len(engine) - 1):
+            if time.perf_counter() > deadline:
+                break
+            deltas = engine.deltaRow(i)[i + 1 :]
+            j = int(np.argmin(deltas))
+            if deltas[j] < 0:
+                engine.swap(i, i + 1 + j, deltas[j].item())
+                improved = True
+        return improved
+
+    # 2-opt: repeat pairwise exchange sweeps until no swap improves (local optimum)
+    def twoOptSearch(self, initial: Iterable):
+        engine = costEngine(self.comm_mat, self.top_graph.distances(), initial)
+        deadline = self.deadline()
+        sweeps = math.inf if self.max_iter is None else self.max_iter
+        while sweeps > 0 and time.perf_counter() < deadline and self.sweep(engine, deadline):
+            sweeps -= 1
+        return engine.order.tolist(), engine.cost
+
+    # robust tabu search (Taillard 1991): always take the best admissible swap, forbid moving
+    # processes back to recently left positions for a randomized tenure around n iterations
+    def tabuSearch(self, initial: Iterable):
+        engine = costEngine(self.comm_mat, self.top_graph.distances(), initial, dense=True)
+        n = len(engine)
+        if n < 2:
+            return engine.order.tolist(), engine.cost
+        deadline = self.deadline()
+        max_iter = 20 * n if self.max_iter is None else self.max_iter
+        aspiration = 5 * n * n  # force moves not seen for this many iterations (diversification)
+
+        best_order, best_cost = engine.order.copy(), engine.cost
+        left = np.zeros((n, n), dtype=np.int64)  # left[process][position]: iteration the process left it
+        lower = np.tril(np.ones((n, n), dtype=bool))
+        tenure = n
+        for it in range(1, max_iter + 1):
+            if time.perf_counter() > deadline:
+                break
+            if it % (2 * n) == 1:
+                tenure = int(self.rng.integers(max(1, int(0.9 * n)), int(1.1 * n) + 2))
+
+            deltas = engine.deltaMatrix()
+            since = it - left[engine.order, :]  # since[r][s]: process on r left position s that long ago
+            tabu = (since < tenure) & (since.T < tenure)
+            forced = (since > aspiration) & (since.T > aspiration) & ~lower
+            if forced.any():
+                candidates = np.where(forced, deltas, np.inf)
             else:
-                i = 1
-                j = 2
+                improving = engine.cost + deltas < best_cost
+                candidates = np.where((tabu & ~improving) | lower, np.inf, deltas)
+                if np.isinf(candidates).all():
+                    candidates = np.where(lower, np.inf, deltas)
+            r, s = np.unravel_index(np.argmin(candidates), candidates.shape)
+
+            left[engine.order[r], r] = left[engine.order[s], s] = it
+            engine.swap(r, s, engine.scalar(deltas[r, s]))
+            if engine.cost < best_cost:
+                best_order, best_cost = engine.order.copy(), engine.cost
+
+        return best_order.tolist(), best_cost
+
+    # simulated annealing over random pair swaps with a geometric cooling schedule
+    # the schedule is stretched over the iteration budget or the time budget, whichever is used up first
+    def annealingSearch(self, initial: Iterable):
+        engine = costEngine(self.comm_mat, self.top_graph.distances(), initial)
+        n = len(engine)
+        if n < 2 or self.max_iter == 0 or self.time_limit == 0:
+            return engine.order.tolist(), engine.cost
+        start, deadline = time.perf_counter(), self.deadline()
+        max_iter = 500 * n if self.max_iter is None and self.time_limit is None else self.max_iter
+
+        # start at the mean cost change of random swaps, cool down to a thousandth of it
+        samples = self.rng.integers(0, n, size=(min(1000, n * n), 2))
+        t_start = np.mean([abs(engine.delta(r, s)) for r, s in samples]) or 1.0
+        t_end = t_start * 1e-3
+
+        best_order, best_cost = engine.order.copy(), engine.cost
+        it, batch = 0, 1024
+        while True:
+            pairs = self.rng.integers(0, n, size=(batch, 2))
+            chance = self.rng.random(batch)
+            for (r, s), p in zip(pairs, chance):
+                progress = 0.0 if max_iter is None else it / max_iter
+                if self.time_limit is not None:
+                    progress = max(progress, (time.perf_counter() - start) / self.time_limit)
+                if progress >= 1.0 or time.perf_counter() > deadline:
+                    return best_order.tolist(), best_cost
+                it += 1
+
+                delta = engine.delta(r, s)
+                temperature = t_start * (t_end / t_start) ** progress
+                if delta <= 0 or p < math.exp(-delta / temperature):
+                    engine.swap(r, s, delta)
+                    if engine.cost < best_cost:
+                        best_order, best_cost = engine.order.copy(), engine.cost
 
-        return best_sol, best_cost
-    
     def pairExchange(self, order, i, j) -> list:
         reorder = order.copy()
         reorder[i], reorder[j] = reorder[j], reorder[i]
         return reorder
 
     def totalCost(self, order) -> int:
-        cost = 0
-        for i in range(len(self.hostnames)):
-            for j in range(len(self.hostnames)):
-                cost += self.comm_mat[order[i]][order[j]] * self.top_graph.topMatrix[i][j]
-        return cost
+        return PermutedMatrix(self.comm_mat, order).cost(self.top_graph.distances())
 
 if __name__ == "__main__":
     qap = TauQAP([[1,0,0,2],[2,0,0,0],[2,0,0,0],[2,0,0,0]], HostGraph(igraph.Graph(), [[1,10,10,1],[10,1,1,1],[10,1,1,1],[1,1,1,1]], [], []), ["0","1","2","3"])
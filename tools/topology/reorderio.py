@@ -0,0 +1,73 @@
+import numpy as np
+import os
+import struct
+import tempfile
+import zlib
+
+# binary LAIK_REORDER_FILE, read by laik_top_reordering (Laik_Reordering_File in include/laik/topology.h)
+#  header (20 bytes, little-endian): magic, version, flags (reserved), nodecount, crc32 of the map
+#  map: nodecount int32, map[k] is the new id of location k plus RO_OFFSET, RO_UNMAPPED for unmapped locations
+# the library reads it with a single fread instead of parsing a LAIK_REORDERING string of every location
+MAGIC = b"LAIKREOR"
+VERSION = 1
+HEADER = struct.Struct("<8sHHII")
+RO_UNMAPPED = 0  # LAIK_RO_UNMAPPED
+RO_OFFSET = 1  # LAIK_RO_OFFSET
+ENV_LIMIT = 64 * 1024  # longest LAIK_REORDERING string to pass in the environment (Linux allows 128 KiB per string)
+
+
+def reorderMap(reordering: list) -> np.ndarray:
+    return np.asarray(reordering, dtype="<i4") + RO_OFFSET
+
+
+# written to a temporary file of its own next to path and renamed: a starting job never sees a partial file,
+# concurrent writers never mix their data
+def writeReorderFile(path: str, reordering: list) -> None:
+    data = reorderMap(reordering).tobytes()
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, 0, len(reordering), zlib.crc32(data)))
+            file.write(data)
+        os.chmod(temp, 0o644)  # mkstemp files are private (0600), keep the permissions of a plain write
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+# reordering (location -> new id) of a LAIK_REORDER_FILE, the header, checksum and permutation are validated
+# RO_UNMAPPED locations keep their id, as in laik_allow_reordering; the library dumps such maps for partial
+# LAIK_REORDERING strings, they are accepted as long as the resulting ids are still a permutation
+def readReorderFile(path: str) -> list:
+    with open(path, "rb") as file:
+        header = file.read(HEADER.size)
+        data = file.read()
+    if len(header) < HEADER.size:
+        raise ValueError("{}: too short for a reordering file".format(path))
+    magic, version, _, count, checksum = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError("{}: not a reordering file".format(path))
+    if version > VERSION:
+        raise ValueError("{}: unsupported reordering file version {}".format(path, version))
+    if len(data) != count * 4:
+        raise ValueError("{}: {} bytes for a map of {} locations".format(path, len(data), count))
+    if zlib.crc32(data) != checksum:
+        raise ValueError("{}: checksum mismatch".format(path))
+    entries = np.frombuffer(data, dtype="<i4")
+    reordering = np.where(entries == RO_UNMAPPED, np.arange(count), entries - RO_OFFSET)
+    if not np.array_equal(np.sort(reordering), np.arange(count)):
+        raise ValueError("{}: map is not a permutation of {} locations".format(path, count))
+    return reordering.tolist()
+
+
+def isReorderFile(path: str) -> bool:
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+# whether the LAIK_REORDERING string of a reordering would exceed ENV_LIMIT, without building it:
+# every "location.id," pair holds the digits of one location and one id, both run over the same numbers
+def needsReorderFile(reordering: list) -> bool:
+    digits = sum(len(str(location)) for location in range(len(reordering)))
+    return len("LAIK_REORDERING=") + 2 * digits + 2 * len(reordering) - 1 > ENV_LIMIT
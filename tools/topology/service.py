@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import json
+import numpy as np
+import os
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from matrixio import loadMatrix
+from toptypes import CSRMatrix
+
+# long-running optimizer for repeated launches of the same jobs (LAIK_REORDER_LIVE workflows)
+# clients send one json request per line over a unix socket and get one json response line back:
+#  request:  {"matrix": [[...]] or "matrix_file": path, "hostnames": [...], "optimizer": name, "options": {...}}
+#            hostnames may be left out when the matrix file stores them, optimizer and options default to the service's
+#  response: the payload of solve (e.g. {"reordering": [...], "LAIK_REORDERING": "..."}) with "cached", "seconds"
+#            and "fingerprint", or {"error": message}
+# payloads are kept in an LRU cache keyed by a fingerprint of the matrix, hostnames, topology and optimizer
+CACHE_SIZE = 256  # cached reorderings
+MAX_REQUEST = 1 << 30  # bytes of a request line (inline matrices)
+
+
+# sha256 of a matrix (dense or CSRMatrix) and the strings that select its reordering
+def fingerprint(matrix, *keys: str) -> str:
+    digest = hashlib.sha256()
+    for key in keys:
+        digest.update(key.encode() + b"\0")
+    if isinstance(matrix, CSRMatrix):
+        arrays = [np.asarray(matrix.indptr), np.asarray(matrix.indices), np.asarray(matrix.data)]
+    else:
+        arrays = [np.asarray(matrix)]
+    for array in arrays:
+        digest.update("{}{}".format(array.dtype.str, array.shape).encode())
+        digest.update(np.ascontiguousarray(array).data)
+    return digest.hexdigest()
+
+
+# least recently used entries are dropped first
+class ReorderingCache:
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key: str, value) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+# solve(matrix, hostnames, optimizer, options) -> payload runs in a pool of workers threads, the event loop
+# keeps answering cached requests meanwhile; concurrent requests of the same fingerprint are solved once
+# topology: key of the topology description, part of every fingerprint
+class OptimizerService:
+    def __init__(
+        self,
+        solve,
+        topology: str,
+        optimizer: str,
+        options: dict | None = None,
+        cache_size: int = CACHE_SIZE,
+        workers: int = 1,
+    ) -> None:
+        self.solve = solve
+        self.topology = topology
+        self.optimizer = optimizer
+        self.options = options or {}
+        self.cache = ReorderingCache(cache_size)
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    # matrix and hostnames of a request
+    def load(self, request: dict) -> tuple:
+        if "matrix_file" in request:
+            matrix, hostnames = loadMatrix(request["matrix_file"])
+        elif "matrix" in request:
+            matrix, hostnames = np.asarray(request["matrix"]), []
+        else:
+            raise ValueError("request without matrix or matrix_file")
+        hostnames = request.get("hostnames") or hostnames
+        if len(hostnames) != len(matrix):
+            raise ValueError("{} hostnames for {} processes".format(len(hostnames), len(matrix)))
+        return matrix, [host.strip("'") for host in hostnames]
+
+    async def reorder(self, request: dict) -> dict:
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        matrix, hostnames = await loop.run_in_executor(None, self.load, request)
+        optimizer = request.get("optimizer", self.optimizer)
+        options = request.get("options", self.options if optimizer == self.optimizer else {})
+        keys = self.topology, optimizer, json.dumps(options, sort_keys=True, default=repr), "\n".join(hostnames)
+        key = await loop.run_in_executor(None, fingerprint, matrix, *keys)
+        payload = self.cache.get(key)
+        cached = payload is not None
+        if not cached:
+            if key not in self.pending:
+                solving = loop.run_in_executor(self.executor, self.solve, matrix, hostnames, optimizer, options)
+                self.pending[key] = solving
+            try:
+                payload = await self.pending[key]
+                self.cache.put(key, payload)
+            finally:
+                self.pending.pop(key, None)
+        return dict(payload, cached=cached, seconds=time.perf_counter() - start, fingerprint=key[:16])
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.reorder(json.loads(line))
+                    status = "cached" if response["cached"] else "solved"
+                    print("{} {} in {:.3f}s".format(status, response["fingerprint"], response["seconds"]))
+                except Exception as error:
+                    response = dict(error="{}: {}".format(type(error).__name__, error))
+                    print(response["error"])
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path)  # left over by a service that did not shut down
+        server = await asyncio.start_unix_server(self.handle, path, limit=MAX_REQUEST)
+        print("optimizer service listening on {}".format(path))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            os.unlink(path)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# send one request to the service at path and wait for the response
+def requestReordering(path: str, request: dict) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as responses:
+            response = json.loads(responses.readline())
+    if "error" in response:
+        raise RuntimeError("optimizer service: {}".format(response["error"]))
+    return response
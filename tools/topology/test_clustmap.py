@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from clustmap import ClustMap
+from hosttopology import TopologySpec, buildHostGraph
+from toptypes import PermutedMatrix
+from workloads import groupedComms
+
+
+# servers are closer within a cabinet than across cabinets
+CABINETS = TopologySpec("cabinets", ["cab", "srv"], [0.5, 5, 10], r"(c\d+)(s\d+)")
+
+
+# one rank per server, servers[c] servers in cabinet c
+def cabinetHosts(servers: list) -> list:
+    return ["c{:02d}s{:02d}".format(c, s) for c, count in enumerate(servers) for s in range(count)]
+
+
+def cabinetGraph(hosts: list):
+    return buildHostGraph(hosts, CABINETS)
+
+
+def cost(matrix, order, hostgraph) -> float:
+    return PermutedMatrix(matrix, order).cost(hostgraph.distances())
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_permutation(seed):
+    hosts = cabinetHosts([4] * 16)
+    workload = groupedComms(len(hosts), 4, np.random.default_rng(seed), sparse=seed % 2 == 1)
+    order = ClustMap(workload.matrix, cabinetGraph(hosts), hosts, seed=seed).solve()
+    assert sorted(order) == list(range(len(hosts)))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_grouped_ideal_cost(seed):
+    hosts = cabinetHosts([4] * 16)
+    hostgraph = cabinetGraph(hosts)
+    workload = groupedComms(len(hosts), 4, np.random.default_rng(seed))
+    ideal = cost(workload.matrix, workload.ideal, hostgraph)
+    assert ideal < cost(workload.matrix, range(len(hosts)), hostgraph)
+    order = ClustMap(workload.matrix, hostgraph, hosts, seed=seed).solve()
+    assert cost(workload.matrix, order, hostgraph) == ideal
+
+
+def test_uneven_tree():
+    hosts = cabinetHosts([6, 2, 4, 8, 2, 2])
+    hostgraph = cabinetGraph(hosts)
+    workload = groupedComms(len(hosts), 2, np.random.default_rng(1))
+    ideal = cost(workload.matrix, workload.ideal, hostgraph)
+    assert ideal < cost(workload.matrix, range(len(hosts)), hostgraph)
+    order = ClustMap(workload.matrix, hostgraph, hosts, seed=1).solve()
+    assert sorted(order) == list(range(len(hosts)))
+    assert cost(workload.matrix, order, hostgraph) == ideal
+
+
+def test_rank_count_mismatch():
+    hosts = cabinetHosts([4] * 4)
+    workload = groupedComms(len(hosts) + 4, 4, np.random.default_rng(0))
+    with pytest.raises(ValueError):
+        ClustMap(workload.matrix, cabinetGraph(hosts), hosts).solve()
+
+
+@pytest.mark.parametrize("hosts", [["i01r01c01s01"] * 4 + ["i01r01c01s02"] * 4, ["n0"] * 4 + ["n1"] * 4])
+def test_shared_names(hosts):
+    workload = groupedComms(len(hosts), 4, np.random.default_rng(0))
+    order = ClustMap(workload.matrix, buildHostGraph(hosts), hosts, seed=0).solve()
+    assert sorted(order) == list(range(len(hosts)))
+
+
+def test_unfilled_leaves(monkeypatch):
+    hosts = cabinetHosts([4] * 4)
+    workload = groupedComms(len(hosts), 4, np.random.default_rng(0))
+    monkeypatch.setattr(ClustMap, "MapClusters", lambda self, S, A: None)
+    with pytest.raises(RuntimeError):
+        ClustMap(workload.matrix, cabinetGraph(hosts), hosts).solve()
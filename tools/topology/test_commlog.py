@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from commlog import parseLogFile, parseLogFiles
+
+
+# log lines as LAIK's log_flush prefixes them (LAIK_LOG=2, default prefix)
+def logLines(logctr: int, location: int, counter: int, message: str) -> list:
+    return [
+        "{} LAIK-{:04d}-L{:02d} {:04d}.{:02d} {:2d}:{:06.3f} | {}".format(
+            "==" if i == 0 else "..", logctr, location, counter, i + 1, 0, 1.25, line
+        )
+        for i, line in enumerate(message.rstrip("\n").split("\n"))
+    ]
+
+
+# a matrix as laik_log_CommMatrix prints it
+def matrixMessage(matrix: np.ndarray) -> str:
+    n = len(matrix)
+    message = "Communication Matrix:\n   "
+    message += "".join("| {:10d}{}".format(i, "\n" if i == n - 1 else " ") for i in range(n))
+    for i in range(n):
+        message += "{:2d} |".format(i)
+        message += "".join(" {:10d} {}".format(matrix[i, j], "\n" if j == n - 1 else " ") for j in range(n))
+    return message
+
+
+# the log of one location: the cumulative matrix (only its own row is counted) is dumped at every phase
+# change and in laik_finalize, traffic[k] is the location's traffic in phase k
+def locationLog(location: int, host: str, traffic: np.ndarray) -> list:
+    n = traffic.shape[1]
+    lines = logLines(0, location, 1, "MPI backend initialized (at '{}', rank {}/{})\n".format(host, location, n))
+    cumulative = np.zeros((n, n), dtype=np.int64)
+    for logctr, row in enumerate(traffic):
+        cumulative[location] += row
+        lines += logLines(logctr, location, 2, "Enter phase 'phase{}'".format(logctr))
+        lines += logLines(logctr, location, 3, matrixMessage(cumulative))
+    return lines
+
+
+RANKS = 6
+PHASES = 3
+TRAFFIC = np.random.default_rng(0).integers(0, 1000, (RANKS, PHASES, RANKS))
+HOSTS = ["i01r01c01s{:02d}:{}".format(rank // 2, 4000 + rank) for rank in range(RANKS)]
+
+
+def writeLogs(tmp_path, phases: int) -> list:
+    files = []
+    for rank in range(RANKS):
+        files.append(tmp_path / "laik.log_{:03d}".format(rank))
+        files[-1].write_text("\n".join(locationLog(rank, HOSTS[rank], TRAFFIC[rank, :phases])) + "\n")
+    return [str(file) for file in files]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_finalize_dump(tmp_path, workers):
+    # LAIK without per-phase dumps: one matrix per location, logged in laik_finalize
+    series, hostnames = parseLogFiles(writeLogs(tmp_path, 1), workers, progress=False)
+    assert hostnames == HOSTS
+    assert series.phases == [0]
+    assert np.array_equal(series.matrices[0], TRAFFIC[:, 0])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_phase_dumps(tmp_path, workers):
+    series, hostnames = parseLogFiles(writeLogs(tmp_path, PHASES), workers, progress=False)
+    assert hostnames == HOSTS
+    assert series.phases == list(range(PHASES))
+    for phase, matrix in zip(series.phases, series.matrices):
+        assert np.array_equal(matrix, TRAFFIC[:, phase])
+
+
+def test_interleaved_locations(tmp_path):
+    # all locations writing to one stderr: the lines of every location stay in order, the locations interleave
+    logs = [locationLog(rank, HOSTS[rank], TRAFFIC[rank]) for rank in range(RANKS)]
+    lines = [log[i] for i in range(len(logs[0])) for log in logs]
+    path = tmp_path / "laik.log"
+    path.write_text("\n".join(lines) + "\n")
+    res = parseLogFile(str(path))
+    assert res.matrices == RANKS * PHASES
+    assert [res.hostnames[rank] for rank in range(RANKS)] == HOSTS
+    for phase in range(PHASES):
+        assert np.array_equal(res.phases[phase], TRAFFIC[:, phase])
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from grouping import groupVertices, heavyEdgeMatching, symmetricWeights
+from toptypes import CSRMatrix
+
+
+@pytest.mark.parametrize("n", [8, 64, 200])
+def test_sparse_equals_dense(n):
+    rng = np.random.default_rng(n)
+    matrix = rng.integers(0, 5, (n, n)) * (rng.random((n, n)) < 0.1)
+    sparse = CSRMatrix.fromDense(matrix)
+    assert np.array_equal(symmetricWeights(sparse).toDense(), symmetricWeights(matrix))
+    assert heavyEdgeMatching(symmetricWeights(sparse)) == heavyEdgeMatching(symmetricWeights(matrix))
+    for k in (2, 4, 8):
+        assert groupVertices(sparse, k) == groupVertices(matrix, k)
+
+
+def test_sparse_matching_pairs_neighbours():
+    # a ring far too large for a dense matrix: every vertex is matched with a neighbour
+    n = 100000
+    rows = np.arange(n)
+    ring = CSRMatrix.fromEdges(rows, (rows + 1) % n, np.ones(n), (n, n))
+    pairs = groupVertices(ring, 2)
+    assert sorted(v for pair in pairs for v in pair) == list(range(n))
+    assert all((u - v) % n in (1, n - 1) for u, v in pairs)
@@ -0,0 +1,65 @@
+import dataclasses
+import numpy as np
+from hosttopology import SUPERMUC_NG, NodeTopology, buildHostGraph, cachedHostGraph
+from treematch import TreeMatch
+from workloads import groupedComms
+
+
+# hostnames without a pid suffix are equal to the name of their server vertex
+def test_host_named_like_server():
+    hosts = ["i01r01c01s01"] * 4 + ["i01r01c01s02"] * 4
+    hostgraph = buildHostGraph(hosts)
+    assert hostgraph.graph.vcount() == len(hosts) + 2 + 1
+    servers = hostgraph.layerVertices(-2)
+    for host in hostgraph.layerVertices(-1):
+        parents = [v for v in hostgraph.graph.neighbors(host) if v in servers]
+        assert len(parents) == 1
+        assert hostgraph.graph.vs[parents[0]]["name"] == hosts[host]
+    dist = np.asarray(hostgraph.distances())
+    assert dist[0, 1] < dist[0, 4]
+    assert (dist[:4, :4] == dist[0, 1])[~np.eye(4, dtype=bool)].all()
+
+    workload = groupedComms(len(hosts), 4, np.random.default_rng(0))
+    assert sorted(TreeMatch(workload.matrix, hostgraph, hosts).solve()) == list(range(len(hosts)))
+
+
+# LAIK locations (host:pid) of a cluster outside the naming scheme
+UNMATCHED = ["node{}:{}".format(node, 100 + rank) for node in range(2) for rank in range(4)]
+
+
+def test_unmatched_hosts_share_their_node():
+    assert SUPERMUC_NG.ancestors("node0:100") == ["node0/isl", "node0/rack", "node0/cab", "node0"]
+    assert SUPERMUC_NG.ancestors("i01r02c03s04:100")[-1] == "i01r02c03s04"
+    hostgraph = buildHostGraph(UNMATCHED)
+    assert hostgraph.layers[-2] == ["node0", "node1"]
+    dist = np.asarray(hostgraph.distances())
+    assert dist[0, 1] < dist[0, 4]
+    assert (dist[:4, :4] == dist[0, 1])[~np.eye(4, dtype=bool)].all()
+
+
+def test_unmatched_ranks_fill_the_node():
+    node = NodeTopology(["socket", "core"], [0, 1, 3], [[0, 0], [0, 1], [1, 2], [1, 3]])
+    hostgraph = buildHostGraph(UNMATCHED, dataclasses.replace(SUPERMUC_NG, node=node))
+    cores = hostgraph.layers[-2]
+    assert cores[:4] == ["node0/socket0/core0", "node0/socket0/core1", "node0/socket1/core2", "node0/socket1/core3"]
+    dist = np.asarray(hostgraph.distances())
+    assert dist[0, 1] < dist[0, 2] < dist[0, 4]
+
+
+def test_cache(tmp_path):
+    hosts = UNMATCHED
+    graph = cachedHostGraph(hosts, SUPERMUC_NG, str(tmp_path))
+    (entry,) = tmp_path.iterdir()
+    assert cachedHostGraph(hosts, SUPERMUC_NG, str(tmp_path)).layers == graph.layers
+
+    # a truncated entry is a miss and gets replaced
+    entry.write_bytes(entry.read_bytes()[:100])
+    assert cachedHostGraph(hosts, SUPERMUC_NG, str(tmp_path)).layers == graph.layers
+    assert [path.name for path in tmp_path.iterdir()] == [entry.name]
+    assert cachedHostGraph(hosts, SUPERMUC_NG, str(tmp_path)).layers == graph.layers
+
+
+def test_cache_not_writable(tmp_path):
+    blocked = tmp_path / "file"
+    blocked.write_text("")
+    assert cachedHostGraph(UNMATCHED, SUPERMUC_NG, str(blocked / "cache")).layers[-2] == ["node0", "node1"]
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from matrixio import ALIGN, FLAG_CSR, HEADER, MAGIC, VERSION, loadMatrix, writeMatrix
+from toptypes import CSRMatrix
+
+RNG = np.random.default_rng(0)
+MATRIX = RNG.integers(0, 2**40, (12, 12)) * (RNG.random((12, 12)) < 0.3)
+HOSTS = ["i01r01c01s{:02d}:{}".format(rank // 4, 100 + rank) for rank in range(12)]
+
+
+def header(path) -> tuple:
+    with open(path, "rb") as file:
+        return HEADER.unpack(file.read(HEADER.size))
+
+
+@pytest.mark.parametrize("dtype", [np.int64, np.uint32, np.float32])
+def test_dense_round_trip(tmp_path, dtype):
+    path = str(tmp_path / "matrix.bin")
+    writeMatrix(path, MATRIX.astype(dtype), HOSTS)
+    magic, version, flags, _, value_type, index_type, ranks, nnz, names_len, offset = header(path)
+    assert (magic, version, flags, ranks, nnz) == (MAGIC, VERSION, 0, 12, 144)
+    assert np.dtype(value_type.rstrip(b"\0").decode()) == dtype
+    assert index_type.rstrip(b"\0") == b""
+    assert offset % ALIGN == 0 and offset >= HEADER.size + names_len
+
+    matrix, hostnames = loadMatrix(path)
+    assert isinstance(matrix, np.memmap) and not matrix.flags.writeable
+    assert matrix.dtype == dtype
+    assert np.array_equal(matrix, MATRIX.astype(dtype))
+    assert hostnames == HOSTS
+
+
+@pytest.mark.parametrize("stored", ["csr", "sparse"])
+def test_csr_round_trip(tmp_path, stored):
+    path = str(tmp_path / "matrix.bin")
+    if stored == "csr":
+        writeMatrix(path, CSRMatrix.fromDense(MATRIX), HOSTS)
+    else:
+        writeMatrix(path, MATRIX, HOSTS, sparse=True)
+    _, _, flags, _, _, index_type, ranks, nnz, _, _ = header(path)
+    assert flags & FLAG_CSR
+    assert (ranks, nnz) == (12, np.count_nonzero(MATRIX))
+    assert np.dtype(index_type.rstrip(b"\0").decode()) == np.int32
+
+    matrix, hostnames = loadMatrix(path)
+    assert isinstance(matrix, CSRMatrix)
+    assert all(isinstance(array, np.memmap) for array in (matrix.indptr, matrix.indices, matrix.data))
+    assert matrix.data.dtype == MATRIX.dtype
+    assert np.array_equal(matrix.toDense(), MATRIX)
+    assert hostnames == HOSTS
+
+
+def test_without_hostnames(tmp_path):
+    path = str(tmp_path / "matrix.bin")
+    writeMatrix(path, MATRIX)
+    matrix, hostnames = loadMatrix(path)
+    assert hostnames == []
+    assert np.array_equal(matrix, MATRIX)
+
+
+def test_newer_version(tmp_path):
+    path = tmp_path / "matrix.bin"
+    writeMatrix(str(path), MATRIX, HOSTS)
+    data = bytearray(path.read_bytes())
+    data[: HEADER.size] = HEADER.pack(*((MAGIC, VERSION + 1) + header(path)[2:]))
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="version"):
+        loadMatrix(str(path))
+
+
+def test_bad_magic(tmp_path):
+    path = tmp_path / "matrix.bin"
+    writeMatrix(str(path), MATRIX, HOSTS)
+    path.write_bytes(b"LAIKCOMX" + path.read_bytes()[len(MAGIC) :])
+    with pytest.raises(ValueError):
+        loadMatrix(str(path))
+
+
+def test_text_matrices(tmp_path):
+    # np.savetxt (-o) and laik_print_CommMatrix_to_file with its leading rank count
+    saved = tmp_path / "saved.txt"
+    np.savetxt(saved, MATRIX, fmt="%d")
+    laik = tmp_path / "laik.txt"
+    laik.write_text("12\n" + "".join("".join(" {:10d}  ".format(v) for v in row) + "\n" for row in MATRIX))
+    for path in (saved, laik):
+        matrix, hostnames = loadMatrix(str(path))
+        assert np.array_equal(matrix, MATRIX)
+        assert hostnames == []
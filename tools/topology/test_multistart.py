@@ -0,0 +1,28 @@
+import time
+from benchmark import benchmarkComms, benchmarkHosts
+from concurrent.futures import ProcessPoolExecutor
+from multistart import terminateWorkers
+from topology import generateHostTopology, multiStart
+
+
+def test_terminate_workers():
+    pool = ProcessPoolExecutor(max_workers=2)
+    futures = [pool.submit(time.sleep, 60) for _ in range(2)]
+    while len(pool._processes or {}) < 2:
+        time.sleep(0.01)
+    processes = list(pool._processes.values())
+    start = time.perf_counter()
+    terminateWorkers(pool)
+    assert time.perf_counter() - start < 10
+    assert not any(process.is_alive() for process in processes)
+    assert all(future.done() for future in futures)
+
+
+def test_report_on_stderr(capsys):
+    hosts = benchmarkHosts(32, "thin")
+    workload = benchmarkComms(32, "grouped", 0)
+    order = multiStart(workload.matrix, generateHostTopology(hosts), hosts, workers=2, time_limit=1, seed=0)
+    assert sorted(order) == list(range(32))
+    out, err = capsys.readouterr()
+    assert "worker" not in out
+    assert "worker" in err
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from benchmark import benchmarkHosts
+from phases import phaseReorderings, phaseSegments, segmentMatrix
+from topology import generateHostTopology, tauQAP
+from toptypes import CommSeries, PermutedMatrix
+from workloads import groupedComms, ringComms
+
+RANKS = 32
+
+
+# two phases of a grouped pattern, then three of a ring
+def series(sparse: bool) -> CommSeries:
+    grouped = [groupedComms(RANKS, 4, np.random.default_rng(seed), sparse).matrix for seed in (0, 0)]
+    ring = [ringComms(RANKS, volume, sparse=sparse).matrix for volume in (100, 200, 300)]
+    return CommSeries(list(range(5)), grouped + ring)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_segments(sparse):
+    assert phaseSegments(series(sparse)) == [[0, 1], [2, 3, 4]]
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_zero_weight_joins(sparse):
+    assert phaseSegments(series(sparse), weights=[1, 1, 0, 1, 1]) == [[0, 1, 2], [3, 4]]
+
+
+def test_weighted_segment_matrix():
+    comms = series(False)
+    weights = [1, 2, 0.5, 1, 3]
+    expected = sum(w * np.asarray(m) for w, m in zip(weights[2:], comms.matrices[2:]))
+    assert np.allclose(segmentMatrix(comms, [2, 3, 4], weights), expected)
+
+
+def test_plans_use_weights():
+    comms = series(True)
+    hosts = benchmarkHosts(RANKS, "thin")
+    hostgraph = generateHostTopology(hosts)
+    weights = [1, 2, 0.5, 1, 3]
+    solve = lambda matrix: tauQAP(matrix, hostgraph, hosts, seed=0)
+    shared, plans = phaseReorderings(comms, hostgraph, solve, weights)
+    dist = hostgraph.distances()
+    for plan, segment in zip(plans, [[0, 1], [2, 3, 4]]):
+        matrix = segmentMatrix(comms, segment, weights)
+        assert plan.shared_cost == PermutedMatrix(matrix, shared).cost(dist)
+        assert plan.cost <= plan.shared_cost
@@ -0,0 +1,90 @@
+import itertools
+import numpy as np
+import pytest
+from hosttopology import buildHostGraph
+from qap import CostEngine, SparseCostEngine, TauQAP
+from toptypes import CSRMatrix
+from workloads import groupedComms
+
+N = 10
+RNG = np.random.default_rng(0)
+# general QAP instance: asymmetric, with self communication, non-zero distances on the diagonal and empty rows
+COMM = RNG.integers(0, 50, (N, N)) * (RNG.random((N, N)) < 0.4)
+COMM[3] = 0
+DIST = RNG.integers(0, 20, (N, N))
+ORDER = RNG.permutation(N)
+
+
+# sum_ij C[p[i]][p[j]] * D[i][j] spelled out
+def bruteCost(comm, dist, order) -> int:
+    return sum(int(comm[order[i], order[j]]) * int(dist[i, j]) for i in range(len(order)) for j in range(len(order)))
+
+
+def swapped(order, r: int, s: int) -> np.ndarray:
+    order = np.array(order)
+    order[[r, s]] = order[[s, r]]
+    return order
+
+
+def engines(order=ORDER) -> list:
+    return [CostEngine(COMM, DIST, order), SparseCostEngine(CSRMatrix.fromDense(COMM), DIST, order)]
+
+
+@pytest.mark.parametrize("engine", [0, 1], ids=["dense", "sparse"])
+def test_swap_deltas(engine):
+    cost = engines()[engine]
+    base = bruteCost(COMM, DIST, ORDER)
+    assert cost.cost == base
+    for r in range(N):
+        expected = [bruteCost(COMM, DIST, swapped(ORDER, r, s)) - base for s in range(N)]
+        assert [cost.delta(r, s) for s in range(N)] == expected
+        assert cost.deltaRow(r).tolist() == expected
+
+
+@pytest.mark.parametrize("engine", [0, 1], ids=["dense", "sparse"])
+def test_swaps_track_the_cost(engine):
+    cost = engines()[engine]
+    order = ORDER.copy()
+    for r, s in [(0, 1), (2, 9), (9, 0), (4, 4), (3, 7)]:
+        cost.swap(r, s)
+        order = swapped(order, r, s)
+        assert cost.order.tolist() == order.tolist()
+        assert cost.cost == bruteCost(COMM, DIST, order)
+        assert cost.delta(5, 6) == bruteCost(COMM, DIST, swapped(order, 5, 6)) - cost.cost
+
+
+def test_delta_matrix():
+    cost = CostEngine(COMM, DIST, ORDER)
+    base = bruteCost(COMM, DIST, ORDER)
+    expected = [[bruteCost(COMM, DIST, swapped(ORDER, r, s)) - base for s in range(N)] for r in range(N)]
+    assert np.rint(cost.deltaMatrix()).astype(np.int64).tolist() == expected
+
+    # kept up to date by swap
+    for r, s in [(1, 8), (0, 3)]:
+        cost.swap(r, s)
+    assert np.allclose(cost.deltaMatrix(), CostEngine(COMM, DIST, cost.order).deltaMatrix())
+
+
+def test_dense_and_sparse_costs_equal():
+    for order in itertools.islice(itertools.permutations(range(N)), 0, 5000, 997):
+        dense, sparse = engines(order)
+        assert dense.cost == sparse.cost == bruteCost(COMM, DIST, order)
+        assert dense.totalCost(ORDER) == sparse.totalCost(ORDER) == bruteCost(COMM, DIST, ORDER)
+
+
+HOSTS = ["i01r{:02d}c01s{:02d}".format(rank // 8, rank // 4) for rank in range(16)]
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("method", TauQAP.methods)
+def test_methods_return_permutations(method, sparse):
+    hostgraph = buildHostGraph(HOSTS)
+    workload = groupedComms(len(HOSTS), 4, np.random.default_rng(1), sparse)
+    for construction in TauQAP.constructions:
+        solver = TauQAP(workload.matrix, hostgraph, HOSTS, method, max_iter=50, seed=0, construction=construction)
+        assert sorted(solver.solve()) == list(range(len(HOSTS)))
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError, match="method"):
+        TauQAP(COMM, buildHostGraph(HOSTS), HOSTS, "steepest")
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import zlib
+from reorderio import (
+    ENV_LIMIT,
+    HEADER,
+    MAGIC,
+    RO_OFFSET,
+    RO_UNMAPPED,
+    VERSION,
+    isReorderFile,
+    needsReorderFile,
+    readReorderFile,
+    writeReorderFile,
+)
+from topology import generate_LAIK_REORDERING, loadReordering
+
+
+# a file as laik_top_reordering dumps it, entries are the raw map values
+def dumpMap(path, entries: list, version: int = VERSION) -> None:
+    data = np.asarray(entries, dtype="<i4").tobytes()
+    path.write_bytes(HEADER.pack(MAGIC, version, 0, len(entries), zlib.crc32(data)) + data)
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "reorder.bin"
+    reordering = np.random.default_rng(0).permutation(1000).tolist()
+    writeReorderFile(str(path), reordering)
+    assert isReorderFile(str(path))
+    assert readReorderFile(str(path)) == reordering
+    assert loadReordering(str(path)) == reordering
+    assert [p.name for p in tmp_path.iterdir()] == ["reorder.bin"]
+
+
+def test_string_file(tmp_path):
+    path = tmp_path / "reorder.txt"
+    path.write_text(generate_LAIK_REORDERING([2, 0, 1]))
+    assert not isReorderFile(str(path))
+    assert loadReordering(str(path)) == [2, 0, 1]
+
+
+def test_checksum_mismatch(tmp_path):
+    path = tmp_path / "reorder.bin"
+    writeReorderFile(str(path), [1, 0, 2, 3])
+    data = bytearray(path.read_bytes())
+    data[HEADER.size] ^= 1
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="checksum"):
+        readReorderFile(str(path))
+
+
+@pytest.mark.parametrize(
+    "damage, message",
+    [
+        (lambda data: b"NOTLAIK!" + data[8:], "not a reordering file"),
+        (lambda data: data[:HEADER.size - 2], "too short"),
+        (lambda data: data[:-4], "bytes for a map"),
+    ],
+)
+def test_rejected(tmp_path, damage, message):
+    path = tmp_path / "reorder.bin"
+    writeReorderFile(str(path), [1, 0, 2, 3])
+    path.write_bytes(damage(path.read_bytes()))
+    with pytest.raises(ValueError, match=message):
+        readReorderFile(str(path))
+
+
+def test_newer_version(tmp_path):
+    path = tmp_path / "reorder.bin"
+    dumpMap(path, [1 + RO_OFFSET, 0 + RO_OFFSET], VERSION + 1)
+    with pytest.raises(ValueError, match="version"):
+        readReorderFile(str(path))
+
+
+def test_unmapped_locations_keep_their_id(tmp_path):
+    path = tmp_path / "reorder.bin"
+    dumpMap(path, [2 + RO_OFFSET, RO_UNMAPPED, 0 + RO_OFFSET, RO_UNMAPPED])
+    assert readReorderFile(str(path)) == [2, 1, 0, 3]
+
+
+def test_unmapped_not_a_permutation(tmp_path):
+    path = tmp_path / "reorder.bin"
+    dumpMap(path, [1 + RO_OFFSET, RO_UNMAPPED, RO_UNMAPPED])  # location 1 keeps id 1, taken by location 0
+    with pytest.raises(ValueError, match="permutation"):
+        readReorderFile(str(path))
+
+
+@pytest.mark.parametrize("ranks", [10, 6000, 7000, 12000])
+def test_needs_reorder_file(ranks):
+    reordering = list(range(ranks))
+    assert needsReorderFile(reordering) == (len(generate_LAIK_REORDERING(reordering)) > ENV_LIMIT)
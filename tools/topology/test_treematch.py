@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from multilevel import Multilevel
+from topology import generateHostTopology
+from treematch import TreeMatch, buildTree, checkedOrder
+from workloads import groupedComms
+
+# several ranks per host without a pid suffix: hosts are named like their server vertex, and hosts that match
+# no level of the naming scheme are named alike on every level
+SHARED_NAMES = [["i01r01c01s01"] * 4 + ["i01r01c01s02"] * 4, ["n0"] * 4 + ["n1"] * 4]
+
+
+@pytest.mark.parametrize("hosts", SHARED_NAMES)
+def test_tree_of_shared_names(hosts):
+    tree = buildTree(generateHostTopology(hosts))
+    assert sorted(len(slots) for slots in tree[-2].slots) == [4, 4]
+    assert sorted(slot for slots in tree[0].slots for slot in slots) == list(range(len(hosts)))
+
+
+@pytest.mark.parametrize("hosts", SHARED_NAMES)
+@pytest.mark.parametrize("optimizer", [TreeMatch, Multilevel])
+def test_shared_names(hosts, optimizer):
+    hostgraph = generateHostTopology(hosts)
+    workload = groupedComms(len(hosts), 4, np.random.default_rng(0))
+    order = optimizer(workload.matrix, hostgraph, hosts).solve()
+    assert sorted(order) == list(range(len(hosts)))
+    # every cluster of 4 communicating ranks ends up on one host
+    clusters = {frozenset(order[:4]), frozenset(order[4:])}
+    assert clusters == {frozenset(workload.ideal[:4]), frozenset(workload.ideal[4:])}
+
+
+def test_unfilled_leaves(monkeypatch):
+    hosts = ["n0"] * 4 + ["n1"] * 4
+    workload = groupedComms(len(hosts), 4, np.random.default_rng(0))
+    monkeypatch.setattr(Multilevel, "place", lambda self, graph, processes, depth, nodes: None)
+    with pytest.raises(RuntimeError):
+        Multilevel(workload.matrix, generateHostTopology(hosts), hosts).solve()
+
+
+def test_checked_order():
+    assert checkedOrder(np.array([2, 0, 1]), "test") == [2, 0, 1]
+    for order in ([0, 0, 1], [0, -1, 1]):
+        with pytest.raises(RuntimeError):
+            checkedOrder(np.array(order), "test")
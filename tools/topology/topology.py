@@ -1,152 +1,111 @@
 #!/usr/bin/python3
 import argparse
+import asyncio
+import dataclasses
 from functools import reduce
-import random
-from toptypes import CommStats, HostGraph, getNodeChildren
+from toptypes import CommStats, CSRMatrix, HostGraph, PermutedMatrix, buildCommGraph, getNodeChildren
 from treematch import TreeMatch
+from blockassign import BlockAssign
+from clustmap import ClustMap
+from multilevel import Multilevel
 from qap import TauQAP
+from commlog import parseLogFiles
+from hosttopology import SUPERMUC_NG, TopologySpec, buildHostGraph, cachedHostGraph, loadNodeTopology, loadTopologySpec
+from matrixio import loadCommStats, loadMatrix, writeMatrix
+from reorderio import isReorderFile, needsReorderFile, readReorderFile, writeReorderFile
+from metrics import levelVolumes, placementMetrics
+from multistart import defaultStarts, multiStart as runMultiStart
+from phases import PHASE_THRESHOLD, phaseReorderings
+from service import CACHE_SIZE, OptimizerService, requestReordering
+from warmstart import warmStart
+from workloads import allToAllComms, groupedComms
 import igraph
 import itertools
 import more_itertools
 import math
 import numpy as np
+import os
 import re
+import sys
 
 import matplotlib as mpl
 
 # mpl.use('pgf')
 import matplotlib.pyplot as plt
+
 # this needs some in-module modifications with some matplotlib versions!
-# import tikzplotlib as tpl
-
-
-# LAIK_LOG_FILE -> commGraph, commMatrix, hostnames
-def parseCommStats(logfiles: list) -> CommStats:
-    commMatrix = list
-
-    str_marker = "Communication Matrix"
-    str_backend = "MPI backend initialized"
-    R_BE = re.compile(r"MPI backend initialized \(at (.+), rank (\d+)/(\d+)\).*$")
-    # == LAIK-(0000)-L(03) (0006).(01)  (0):(00).(004) | (Communication Matrix:) (\n)
-    R_EX = re.compile(r".+LAIK-(\d+)-L(\d+) (\d+).(\d+)\s+(\d+):(\d+).(\d+) \| (.+)")
-
-    ranks = 0
-    matrices = []
-    hostnames = list
-
-    for file in logfiles:
-        with open(file, "r") as logfile:
-            for line in logfile:
-                if str_backend in line:  # set number of ranks
-                    output = R_BE.search(line)
-                    if output is None:
-                        continue
-                    if ranks == 0:
-                        ranks = int(output.group(3))
-                        commMatrix = [[0 for _ in range(ranks)] for _ in range(ranks)]
-                        hostnames = ["" for _ in range(ranks)]
-                    hostnames[int(output.group(2))] = output.group(1)  # type: ignore
-                    continue
-                rex = R_EX.search(line)
-                if rex is not None:
-                    if str_marker in line:
-                        matrices.append((rex.group(2), rex.group(3)))  # (rank, sequence)
-                    elif (rex.group(2), rex.group(3)) in matrices and int(rex.group(4)) > 2:
-                        # matched a matrix row
-                        content = R_EX.split(line)[-2].split()
-                        if content is None:
-                            raise ValueError
-                        if len(content) != ranks + 2:  # misformed matrix output
-                            raise IndexError
-                        values = [int(x) for x in content[2:]]
-                        commMatrix[int(content[0])] = [sum(x) for x in zip(commMatrix[int(content[0])], values)]  # type: ignore
+# optional, without it generateTikzPlot saves png images instead of tikz
+try:
+    import tikzplotlib as tpl
+except ImportError:
+    tpl = None
+
+
+# LAIK_LOG_FILE -> commGraph, commMatrix, hostnames, commSeries
+# files are memory-mapped and parsed in a process pool, see commlog
+# sparse=True keeps the matrices as CSRMatrix, the optimizers then scale with the communicating pairs
+# commMatrix is the sum of the per-logctr matrices, weights (one per logctr) scale them, see phases
+def parseCommStats(
+    logfiles: list, workers: int | None = None, sparse: bool = False, weights: list | None = None
+) -> CommStats:
+    commSeries, hostnames = parseLogFiles(logfiles, workers)
+    if sparse:
+        commSeries = commSeries.sparse()
+    commMatrix = commSeries.total(weights)
 
     # undirected: double transfer values!
     # commGraph = igraph.Graph.Weighted_Adjacency(commMatrix, mode="undirected")
     print(f"Parsed matrices from {len(logfiles)} files.")
-    commGraph = igraph.Graph.Weighted_Adjacency(commMatrix)
-    return CommStats(commGraph, commMatrix, hostnames)  # type: ignore
+    commGraph = buildCommGraph(commMatrix)
+    return CommStats(commGraph, commMatrix, hostnames, commSeries)
 
 
 # generate a host graph based on the supermuc-ng node naming scheme
 # i01r01c01s01
-def generateHostTopology(hostnames: list[str]) -> HostGraph:
-    topGraph = igraph.Graph()
-    R_LRZ = re.compile(r"(i\d+)(r\d+)(c\d+)(s\d+):(\d+)")  # too complicated
-
-    isls = []
-    racks = []
-    cabs = []
-    srvs = []
-
-    topGraph.add_vertices(hostnames)
-    # we want to build a "tree" of the used topology
-    # need to insert nodes from the top down
-    for host in hostnames:
-        if host[0:3] not in isls:
-            isls.append(host[0:3])
-        if host[0:6] not in racks:
-            racks.append(host[0:6])
-        if host[0:9] not in cabs:
-            cabs.append(host[0:9])
-        if host[0:12] not in srvs:
-            srvs.append(host[0:12])
-
-    topGraph.add_vertices(isls)
-    topGraph.add_vertices(racks)
-    topGraph.add_vertices(cabs)
-    topGraph.add_vertices(srvs)
-
-    isls_edges = list(itertools.combinations(isls, r=2))
-    racks_edges = list(filter(lambda xs: xs[0] == xs[1][:3], itertools.combinations(isls + racks, r=2)))
-    cabs_edges = list(filter(lambda xs: xs[0] == xs[1][:6], itertools.combinations(isls + racks + cabs, r=2)))
-    srvs_edges = list(filter(lambda xs: xs[0] == xs[1][:9], itertools.combinations(isls + racks + cabs + srvs, r=2)))
-    node_edges = list(
-        filter(lambda xs: xs[0] == xs[1][:12], itertools.combinations(isls + racks + cabs + srvs + hostnames, r=2))
-    )
-
-    # weights: (https://doku.lrz.de/hoechstleistungsrechner-10333235.html)
-    # intra node: set to 1
-    # inter node, on island: full omnipath
-    # intra island: 3.75:1 compared to intra island
-    weights = [0.5, 5, 0, 0, 15]
-    topGraph.add_edges(node_edges, dict(weight=[weights[0] for _ in range(len(node_edges))]))
-    topGraph.add_edges(srvs_edges, dict(weight=[weights[1] for _ in range(len(srvs_edges))]))
-    topGraph.add_edges(cabs_edges, dict(weight=[weights[2] for _ in range(len(cabs_edges))]))
-    topGraph.add_edges(racks_edges, dict(weight=[weights[3] for _ in range(len(racks_edges))]))
-    topGraph.add_edges(isls_edges, dict(weight=[weights[4] for _ in range(len(isls_edges))]))
-
-    layers = []
-    # filter root nodes with only one leaf to minimize tree
-    if len(isls) < 2 and len(racks) < 2:
-        topGraph.delete_vertices(isls)
-    else:
-        layers.append(isls)
-    if len(racks) < 2 and len(cabs) < 2:
-        topGraph.delete_vertices(racks)
-    else:
-        layers.append(racks)
-    if len(cabs) < 2 and len(srvs) < 2:
-        topGraph.delete_vertices(cabs)
-    else:
-        layers.append(cabs)
-
-    layers.append(srvs)
-    layers.append(hostnames)
-
-    topArray = np.array(topGraph.distances(weights="weight"), dtype=int)
-    return HostGraph(topGraph, topArray[0 : len(hostnames), 0 : len(hostnames)].tolist(), layers, weights)
+# other naming schemes and topology dumps are described by a TopologySpec, see hosttopology
+# with cache_dir, host graphs are built once per spec and host list
+def generateHostTopology(
+    hostnames: list[str], spec: TopologySpec = SUPERMUC_NG, cache_dir: str | None = None
+) -> HostGraph:
+    if cache_dir is None:
+        return buildHostGraph(hostnames, spec)
+    return cachedHostGraph(hostnames, spec, cache_dir)
 
 
 # solve the embedding problem for given graphs and return acceptable reordering
 # todo we probably need the hostnames sooner or later
 #   for now on test we always get successive hosts
 def generate_LAIK_REORDERING(reordering: list) -> str:
-    reorderstr = "LAIK_REORDERING="
-    for index, node in enumerate(reordering):
-        reorderstr += "{}.{},".format(index, node)
+    return "LAIK_REORDERING=" + ",".join("{}.{}".format(index, node) for index, node in enumerate(reordering))
+
+
+# reordering from a LAIK_REORDERING string (with or without the variable name)
+def parse_LAIK_REORDERING(reorderstr: str) -> list:
+    pairs = [pair.split(".") for pair in reorderstr.strip().split("=")[-1].split(",")]
+    reordering = [0] * len(pairs)
+    for index, node in pairs:
+        reordering[int(index)] = int(node)
+    return reordering
 
-    return reorderstr[:-1]
+
+# the environment setting that passes reordering to LAIK: LAIK_REORDERING, or LAIK_REORDER_FILE written to path when
+# the string would be too long for the environment (file_format "auto") or file_format is "binary"
+# written files are read back and compared before they are handed out
+def reorderingSetting(reordering: list, path: str, file_format: str = "auto") -> str:
+    if file_format == "string" or (file_format == "auto" and not needsReorderFile(reordering)):
+        return generate_LAIK_REORDERING(reordering)
+    writeReorderFile(path, reordering)
+    if readReorderFile(path) != list(reordering):
+        raise ValueError("{}: reordering file does not read back".format(path))
+    return "LAIK_REORDER_FILE={}".format(os.path.abspath(path))
+
+
+# reordering from a LAIK_REORDER_FILE or a file with a LAIK_REORDERING string
+def loadReordering(path: str) -> list:
+    if isReorderFile(path):
+        return readReorderFile(path)
+    with open(path) as file:
+        return parse_LAIK_REORDERING(file.read())
 
 
 def treeMatch(comm_mat, top_graph, hostnames) -> list:
@@ -154,38 +113,106 @@ def treeMatch(comm_mat, top_graph, hostnames) -> list:
     return solver.solve()
 
 
-def tauQAP(comm_mat, top_graph, hostnames) -> list:
-    solver = TauQAP(comm_mat, top_graph, hostnames)
+# topologies of equal blocks: graph partitioning and linear assignments, TauQAP otherwise
+def blockAssign(comm_mat, top_graph, hostnames) -> list:
+    solver = BlockAssign(comm_mat, top_graph, hostnames)
+    return solver.solve()
+
+
+# kwargs: method, time_limit, max_iter, seed, construction, initial (see TauQAP)
+def tauQAP(comm_mat, top_graph, hostnames, **kwargs) -> list:
+    solver = TauQAP(comm_mat, top_graph, hostnames, **kwargs)
     return solver.solve()
 
 
-def optimize(optimizer, *args) -> list:
-    return globals()[optimizer](*args)
+# hierarchical clustering of the communication graph mapped onto the topology tree, kwargs: seed
+def clustMap(comm_mat, top_graph, hostnames, **kwargs) -> list:
+    solver = ClustMap(comm_mat, top_graph, hostnames, **kwargs)
+    return solver.solve()
+
+
+# recursive multilevel bisection of the communication graph along the topology tree, kwargs: seed
+def multilevel(comm_mat, top_graph, hostnames, **kwargs) -> list:
+    solver = Multilevel(comm_mat, top_graph, hostnames, **kwargs)
+    return solver.solve()
+
+
+# independent TreeMatch and TauQAP runs in a process pool, kwargs: starts, workers, time_limit, seed (see multistart)
+# the per-worker report goes to stderr, stdout only carries the reordering
+def multiStart(comm_mat, top_graph, hostnames, **kwargs) -> list:
+    result = runMultiStart(comm_mat, top_graph, hostnames, **kwargs)
+    for pid, stats in result.workers().items():
+        report = "worker {}: {runs} runs, cost best {best} mean {mean:.1f} worst {worst}, {seconds:.2f}s"
+        print(report.format(pid, **stats), file=sys.stderr)
+    return result.order
+
+
+def optimize(optimizer, *args, **kwargs) -> list:
+    return globals()[optimizer](*args, **kwargs)
+
+
+# optimizers selectable with -r, qap is short for tauQAP
+OPTIMIZERS = ["treeMatch", "tauQAP", "qap", "blockAssign", "multilevel", "clustMap", "multiStart"]
+
+
+# topology description from the command line
+def topologySpec(args) -> TopologySpec:
+    spec = loadTopologySpec(args.topology) if args.topology is not None else SUPERMUC_NG
+    if args.node_topology is not None:
+        spec = dataclasses.replace(spec, node=loadNodeTopology(args.node_topology))
+    return spec
+
+
+# run the optimizer service on a unix socket until interrupted, -r and the optimizer options are its defaults
+def serve(args) -> None:
+    spec = topologySpec(args)
+
+    def solve(matrix, hostnames: list, optimizer: str, options: dict) -> dict:
+        if optimizer not in OPTIMIZERS:
+            raise ValueError("unknown optimizer {}".format(optimizer))
+        optimizer = "tauQAP" if optimizer == "qap" else optimizer
+        hostgraph = generateHostTopology(hostnames, spec, args.topology_cache)
+        reordering = list(optimize(optimizer, matrix, hostgraph, hostnames, **options))
+        return dict(reordering=reordering, LAIK_REORDERING=generate_LAIK_REORDERING(reordering))
+
+    optimizer = "tauQAP" if args.r in (None, "qap") else args.r
+    options = optimizerOptions(args, optimizer)
+    service = OptimizerService(solve, spec.digest(), optimizer, options, args.cache_size, args.jobs or 1)
+    try:
+        asyncio.run(service.serve(args.serve))
+    except KeyboardInterrupt:
+        pass
+
+
+# keyword arguments of an optimizer from the command line
+def optimizerOptions(args, optimizer: str) -> dict:
+    if optimizer == "tauQAP":
+        return dict(
+            method=args.qap_method,
+            time_limit=args.time_limit,
+            max_iter=args.max_iter,
+            seed=args.seed,
+            construction=args.qap_construction,
+        )
+    if optimizer == "multiStart":
+        starts = None if args.starts is None else defaultStarts(args.starts, args.seed)
+        return dict(starts=starts, workers=args.jobs, time_limit=args.time_limit, seed=args.seed)
+    if optimizer in ("multilevel", "clustMap"):
+        return dict(seed=args.seed)
+    return {}
 
 
 # reorder a communication matrix with given reordering
-# aka permute rows and colums
-def reorderMatrix(matrix, reordering):
-    npmat = np.array(matrix)
-    npmat[list(range(len(matrix))), :] = npmat[reordering, :]
-    npmat[:, list(range(len(matrix)))] = npmat[:, reordering]
-    return npmat
+# aka permute rows and colums, as a view: nothing is copied until elements are read
+def reorderMatrix(matrix, reordering) -> PermutedMatrix:
+    return PermutedMatrix(matrix, reordering)
 
 
 # create artificial communication matrix with known ideal reordering
+# see workloads for halo, collective, random sparse and mixed patterns
 def generateGroupedComms(num_procs: int, procs_per_cluster: int) -> tuple:
-    # ideal_order = list(itertools.permutations(range(num_procs)))[random.randrange(math.factorial(num_procs))]
-    ideal_order = list(range(num_procs))
-    random.shuffle(ideal_order)
-
-    synth_matrix = [[0 for _ in range(num_procs)] for _ in range(num_procs)]
-    for chunk in np.array_split(ideal_order, len(ideal_order) // procs_per_cluster):
-        comm_weight = random.randrange(2**14)
-        for n1 in chunk:
-            for n2 in chunk:
-                if n1 != n2:
-                    synth_matrix[n1][n2] = comm_weight
-    return np.array(synth_matrix, dtype=int), ideal_order
+    workload = groupedComms(num_procs, procs_per_cluster, np.random.default_rng())
+    return workload.matrix, workload.ideal
 
 
 # generate a host matrix with given clusters
@@ -202,16 +229,8 @@ def generateHostMatrix(num_procs: int, procs_per_node: int):
 
 # generate all to all matrix with distribution below max
 def generateAlltoAll(num_procs: int, symmetry: int, max: int):
-    if symmetry < max / 20:
-        synth_matrix = np.full((num_procs, num_procs), max, dtype=int)
-        np.fill_diagonal(synth_matrix, 0)
-        return synth_matrix
-
-    synth_matrix = np.random.randint(max - symmetry, max + 1, size=(num_procs, num_procs))
-    synth_matrix = np.tril(synth_matrix) + np.tril(synth_matrix, -1).T
-    np.fill_diagonal(synth_matrix, 0)
-
-    return synth_matrix
+    jitter = symmetry if symmetry >= max / 20 else 0
+    return allToAllComms(num_procs, np.random.default_rng(), max, jitter).matrix
 
 
 def matchedReorderGroups(order1: list, order2: list, num_procs: int, procs_per_cluster: int):
@@ -224,15 +243,10 @@ def matchedReorderGroups(order1: list, order2: list, num_procs: int, procs_per_c
 
 
 # calculate communication between nodes with given communication matrix
-# assume fill up process assignment
+# assume fill up process assignment, the last node may be smaller; see metrics for arbitrary topologies
 def measureOffNodeCommunication(matrix: list, num_procs: int, procs_per_node: int):
-    npmat = np.array(matrix)
-
-    blocks = [np.hsplit(col, len(matrix) // procs_per_node) for col in np.vsplit(npmat, len(matrix) // procs_per_node)]
-    merged = np.block([[np.sum(mat) for mat in list] for list in blocks])
-    # we don't care about intra-node communication here
-    np.fill_diagonal(merged, 0)
-    return merged.sum()
+    nodes = (np.arange(num_procs) // procs_per_node)[:, None]
+    return levelVolumes(matrix, range(num_procs), nodes)[0]
 
 
 def printMatrixAsTex(matrix: list) -> None:
@@ -249,6 +263,24 @@ def printMatrixAsTex(matrix: list) -> None:
 # output plot file
 # then calculate reordering and volume for every group size
 # then add point to (bar)plot
+# the current figure as tikz if tikzplotlib is available, as png otherwise
+def savePlot(filename: str) -> None:
+    if tpl is not None:
+        tpl.save(filename + ".tex")
+    else:
+        plt.savefig(filename + ".png")
+
+
+# heatmap of a matrix or reordered view, elements below 1 are left white
+def plotHeatmap(matrix, filename: str) -> None:
+    heatmap = np.ma.masked_less(np.asarray(matrix), 1)
+    cmap = mpl.colormaps["hot"].copy()
+    cmap.set_bad("white")
+    plt.imshow(heatmap, cmap=cmap, interpolation="nearest")
+    savePlot(filename)
+    plt.clf()
+
+
 def generateTikzPlot(name, path, comm, num_procs: int, procs_per_node: list):
     # plt. ...
     # path including trailing /
@@ -259,34 +291,22 @@ def generateTikzPlot(name, path, comm, num_procs: int, procs_per_node: list):
 
     # np.savetxt(path + name + "_" + str(num_procs) + ".txt", np.array(comm, dtype=int), fmt="%s")
 
-    npcomm = np.array(comm)
-    heatmap = np.ma.masked_where(npcomm < 1, npcomm)
-    cmap = mpl.cm.get_cmap("hot")
-    cmap.set_bad("white")
-    plt.imshow(heatmap, cmap=cmap, interpolation="nearest")
-    # plt.imsave(path + name + "_heatmap" + str(num_procs) + "qap.png", heatmap, cmap=cmap)
-    tpl.save(path + name + "_heatmap" + str(num_procs) + "qap.tex")
-    plt.clf()
+    plotHeatmap(comm, path + name + "_heatmap" + str(num_procs) + "qap")
 
     nrvolumes = []
     rovolumes = []
 
     for groupsz in procs_per_node:
         topo = generateHostMatrix(num_procs, groupsz)
-        nrvolumes.append(measureOffNodeCommunication(list(comm), num_procs, groupsz))
-        reordering = optimize("tauQAP", list(comm), HostGraph(igraph.Graph(), list(topo), [], []), range(num_procs))
+        nrvolumes.append(measureOffNodeCommunication(comm, num_procs, groupsz))
+        reordering = optimize("tauQAP", comm, HostGraph(igraph.Graph(), topo, [], []), range(num_procs))
         # print(reordering)
         rocomm = reorderMatrix(comm, reordering)
-        heatmap = np.ma.masked_where(rocomm < 1, rocomm)
-        cmap = mpl.cm.get_cmap("hot")
-        cmap.set_bad("white")
-        plt.imshow(heatmap, cmap=cmap, interpolation="nearest")
-        tpl.save(path + name + "_heatmap" + str(num_procs) + "ro" + str(groupsz) + "qap.tex")
-        plt.clf()
+        plotHeatmap(rocomm, path + name + "_heatmap" + str(num_procs) + "ro" + str(groupsz) + "qap")
         # np.savetxt(
         # path + name + "_" + str(num_procs) + "ro" + str(groupsz) + ".txt", np.array(rocomm, dtype=int), fmt="%10s"
         # )
-        rovolumes.append(measureOffNodeCommunication(list(rocomm), num_procs, groupsz))
+        rovolumes.append(measureOffNodeCommunication(rocomm, num_procs, groupsz))
 
     print(nrvolumes)
     print(rovolumes)
@@ -307,17 +327,92 @@ def generateTikzPlot(name, path, comm, num_procs: int, procs_per_node: list):
     return
 
 
+# example with generated communication matrix, run without input
+def example(args) -> None:
+    gc = generateGroupedComms(64, 4)
+    topo = generateHostMatrix(64, 4)
+
+    if args.starts is not None:
+        qap = optimize(
+            "multiStart",
+            gc[0],
+            HostGraph(igraph.Graph(), topo, [], []),
+            range(64),
+            starts=defaultStarts(args.starts, args.seed, tree=False),
+            workers=args.jobs,
+            time_limit=args.time_limit,
+        )
+    else:
+        qap = optimize(
+            "tauQAP",
+            gc[0],
+            HostGraph(igraph.Graph(), list(topo), [], []),
+            range(64),
+            method=args.qap_method,
+            time_limit=args.time_limit,
+            max_iter=args.max_iter,
+            seed=args.seed,
+            construction=args.qap_construction,
+        )
+    print(generate_LAIK_REORDERING(qap))
+
+    print("Best reordering:", gc[1])
+    print("Nodes match? ", matchedReorderGroups(gc[1], qap, 64, 4))
+
+
 def parserSetup() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog="LAIK topology optimizer",
         description="Parse communication metadata, create structured representations, optimize communication paths and generate reordering parameters.",
     )
     parser.add_argument("-i", "--ilog", nargs="+", help="Input LAIK_LOG_FILEs")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of processes parsing LAIK_LOG_FILEs")
+    parser.add_argument("--sparse", action="store_true", help="Keep the parsed communication matrix sparse (CSR)")
+    parser.add_argument("--phase-weights", type=float, nargs="+", help="Weight of every logged phase (logctr)")
+    parser.add_argument("--phases", action="store_true", help="Suggest a reordering per phase segment (with -r)")
+    parser.add_argument(
+        "--phase-threshold", type=float, default=PHASE_THRESHOLD, help="Pattern distance that starts a new segment"
+    )
+    parser.add_argument("-m", "--matrix", help="Input matrix file (binary or text)")
     parser.add_argument("-o", "--out", help="Output matrix file")
-    parser.add_argument("-r", help="Reorder using ansatz [treeMatch, qap, ...]")
+    parser.add_argument(
+        "--format", choices=["text", "binary", "sparse"], default="text", help="Output matrix format, sparse is CSR"
+    )
+    parser.add_argument("-r", choices=OPTIMIZERS, help="Reorder the input with this optimizer")
     parser.add_argument("-g", "--generate", help="generate tikz")
+    parser.add_argument("-t", "--topology", help="Topology description (json), default: SuperMUC-NG naming scheme")
+    parser.add_argument(
+        "--topology-cache", metavar="DIR", help="Cache built host graphs in this directory, off by default"
+    )
+    parser.add_argument(
+        "--node-topology", help="Socket/NUMA/core levels below each host from a sysfs directory or lstopo XML file"
+    )
     parser.add_argument("--treematch", help="Use treeMatch optimizer")
     parser.add_argument("--qap", help="Use QAP optimizer")
+    parser.add_argument("--qap-method", choices=TauQAP.methods, default="twoOpt", help="QAP improvement strategy")
+    parser.add_argument("--time-limit", type=float, help="Time budget of the improvement strategy in seconds")
+    parser.add_argument("--max-iter", type=int, help="Iteration budget of the improvement strategy")
+    parser.add_argument("--seed", type=int, help="Seed for randomized strategies")
+    parser.add_argument(
+        "--qap-construction", choices=TauQAP.constructions, default="greedy", help="Initial reordering of TauQAP"
+    )
+    parser.add_argument("--starts", type=int, help="Run this many optimizer starts in a process pool (-j workers)")
+    parser.add_argument("--serve", metavar="SOCKET", help="Run as optimizer service on this unix socket")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="Reorderings cached by the service")
+    parser.add_argument("--connect", metavar="SOCKET", help="Reorder the input with the service on this unix socket")
+    parser.add_argument(
+        "--reorder-format",
+        choices=["auto", "string", "binary"],
+        default="auto",
+        help="Pass reorderings as LAIK_REORDERING string or binary LAIK_REORDER_FILE, auto for large jobs",
+    )
+    parser.add_argument("--reorder-file", default="laik_reordering.bin", help="Path of a written LAIK_REORDER_FILE")
+    parser.add_argument("--previous", help="Reordering of a previous run to repair (LAIK_REORDER_FILE or string file)")
+    parser.add_argument("--previous-matrix", help="Matrix file the previous reordering was optimized for")
+    parser.add_argument("--state-bytes", type=float, default=0, help="Bytes every process moves when it is migrated")
+    parser.add_argument(
+        "--horizon", type=float, default=1, help="Repetitions of the input traffic until the next re-optimization"
+    )
     return parser
 
 
@@ -325,12 +420,80 @@ if __name__ == "__main__":
     parser = parserSetup()
     args = parser.parse_args()
 
-    # we have an input logfile, let's convert it to a usable Graph
-    if args.ilog is not None:
-        comm_stats = parseCommStats(args.ilog)
-        if args.out is not None:
-            np.savetxt(args.out, np.array(comm_stats.commMatrix, dtype=int), "%10d")
+    if args.serve is not None:
+        serve(args)
+        parser.exit()
+
+    # we have an input logfile or matrix, let's convert it to a usable Graph
+    if args.ilog is not None or args.matrix is not None:
+        if args.ilog is not None:
+            comm_stats = parseCommStats(args.ilog, args.jobs, args.sparse, args.phase_weights)
         else:
+            comm_stats = loadCommStats(args.matrix)
+        if args.out is not None and args.format == "text":
+            matrix = comm_stats.commMatrix
+            np.savetxt(args.out, matrix.toDense() if isinstance(matrix, CSRMatrix) else np.array(matrix, dtype=int), "%10d")
+        elif args.out is not None:
+            writeMatrix(args.out, comm_stats.commMatrix, comm_stats.hostnames, sparse=args.format == "sparse")
+
+        hostnames = list(map(lambda s: s.strip("'"), comm_stats.hostnames))
+        if args.connect is None and (args.r is not None or args.previous is not None or args.out is None):
+            hostgraph = generateHostTopology(hostnames, topologySpec(args), args.topology_cache)
+
+        if args.connect is not None:
+            if args.matrix is not None:
+                request = dict(matrix_file=os.path.abspath(args.matrix))
+            else:
+                matrix = comm_stats.commMatrix
+                request = dict(matrix=(matrix.toDense() if isinstance(matrix, CSRMatrix) else matrix).tolist())
+            request["hostnames"] = hostnames
+            if args.r is not None:
+                request["optimizer"] = args.r
+            response = requestReordering(args.connect, request)
+            print("{} in {:.3f}s".format("cached" if response["cached"] else "solved", response["seconds"]))
+            print(reorderingSetting(response["reordering"], args.reorder_file, args.reorder_format))
+        elif args.previous is not None:
+            previous = loadReordering(args.previous)
+            previous_mat = None if args.previous_matrix is None else loadMatrix(args.previous_matrix)[0]
+            report = warmStart(
+                comm_stats.commMatrix,
+                hostgraph,
+                previous,
+                previous_mat,
+                state=args.state_bytes,
+                horizon=args.horizon,
+                time_limit=args.time_limit,
+            )
+            summary = "drift {:.3f}, {} processes re-placed, cost {:.0f} -> {:.0f}, {} processes move"
+            print(summary.format(report.drift, len(report.changed), report.previous_cost, report.cost, report.moved))
+            decision = "migrate" if report.migrate else "keep the previous reordering"
+            print("gain {:.0f}, migration cost {:.0f}: {}".format(report.gain, report.migration_cost, decision))
+            chosen = report.reordering if report.migrate else previous
+            print(reorderingSetting(chosen, args.reorder_file, args.reorder_format))
+        elif args.r is not None:
+            optimizer = "tauQAP" if args.r == "qap" else args.r
+            options = optimizerOptions(args, optimizer)
+            plans = []
+            if args.phases and comm_stats.commSeries is None:
+                parser.error("--phases needs LAIK_LOG_FILEs (-i)")
+            elif args.phases:
+                solve = lambda matrix: optimize(optimizer, matrix, hostgraph, hostnames, **options)
+                series = comm_stats.commSeries
+                reordering, plans = phaseReorderings(series, hostgraph, solve, args.phase_weights, args.phase_threshold)
+            else:
+                reordering = optimize(optimizer, comm_stats.commMatrix, hostgraph, hostnames, **options)
+            for name, order in (("before", range(len(hostnames))), ("after", reordering)):
+                quality = placementMetrics(comm_stats.commMatrix, order, hostgraph)
+                summary = "{}: cost {:.0f}, hops {:.0f}, max link load {:.0f}"
+                print(summary.format(name, quality.cost, quality.hops, quality.max_link_load))
+                print("  " + ", ".join("{} {:.0f}".format(level, volume) for level, volume in quality.volumes.items()))
+            print(reorderingSetting(reordering, args.reorder_file, args.reorder_format))
+            for plan in plans:
+                summary = "logctr {}-{}: cost {:.0f}, {:.0f} on the reordering above ({:.1%} gain)"
+                print(summary.format(plan.first, plan.last, plan.cost, plan.shared_cost, plan.gain))
+                path = "{}.{}-{}".format(args.reorder_file, plan.first, plan.last)
+                print(reorderingSetting(plan.reordering, path, args.reorder_format))
+        elif args.out is None:
             igraph.plot(
                 comm_stats.commGraph,
                 target="graph.svg",
@@ -338,8 +501,7 @@ if __name__ == "__main__":
                 vertex_label=[x for x in range(len(comm_stats.commGraph.vs))],
             )
 
-            hostgraph = generateHostTopology(list(map(lambda s: s.strip("'"), comm_stats.hostnames)))
-            hostgraphlayout = hostgraph.graph.layout_reingold_tilford(mode="in", root=hostgraph.layers[0])
+            hostgraphlayout = hostgraph.graph.layout_reingold_tilford(mode="in", root=list(hostgraph.layerVertices(0)))
 
             igraph.plot(
                 hostgraph.graph,
@@ -354,13 +516,5 @@ if __name__ == "__main__":
             )
 
         np.set_printoptions(linewidth=168, edgeitems=4)
-
-        # example with generated communication matrix
-    gc = generateGroupedComms(64, 4)
-    topo = generateHostMatrix(64, 4)
-
-    qap = optimize("tauQAP", gc[0], HostGraph(igraph.Graph(), list(topo), [], []), range(64))
-    print(generate_LAIK_REORDERING(qap))
-
-    print("Best reordering:", gc[1])
-    print("Nodes match? ", matchedReorderGroups(gc[1], qap, 64, 4))
+    else:
+        example(args)
@@ -1,22 +1,336 @@
 import igraph
-from dataclasses import dataclass
+import numpy as np
+from dataclasses import dataclass, field
 
 UINT64_MAX = 0xFFFFFFFFFFFFFFFF
 
 
+# compressed sparse row matrix, row i holds indices[indptr[i]:indptr[i+1]] with values in data
+# memory and the operations below scale with the number of communicating pairs instead of n^2
+@dataclass
+class CSRMatrix:
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    shape: tuple
+
+    @classmethod
+    def fromDense(cls, matrix) -> "CSRMatrix":
+        matrix = np.asarray(matrix)
+        rows, cols = np.nonzero(matrix)
+        return cls.fromEdges(rows, cols, matrix[rows, cols], matrix.shape)
+
+    # duplicate (row, col) pairs are summed
+    @classmethod
+    def fromEdges(cls, rows, cols, data, shape: tuple) -> "CSRMatrix":
+        rows, cols, data = np.asarray(rows), np.asarray(cols), np.asarray(data)
+        keys, inverse = np.unique(rows.astype(np.int64) * shape[1] + cols, return_inverse=True)
+        summed = np.zeros(len(keys), dtype=data.dtype)
+        np.add.at(summed, inverse, data)
+        rows, cols = np.divmod(keys, shape[1])
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        index_type = np.int32 if shape[1] < 2**31 else np.int64
+        return cls(indptr, cols.astype(index_type), summed, tuple(shape))
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def toDense(self) -> np.ndarray:
+        matrix = np.zeros(self.shape, dtype=self.data.dtype)
+        matrix[self.rowIndices(), self.indices] = self.data
+        return matrix
+
+    # row index of every stored element
+    def rowIndices(self) -> np.ndarray:
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def row(self, i: int) -> tuple:
+        return self.indices[self.indptr[i] : self.indptr[i + 1]], self.data[self.indptr[i] : self.indptr[i + 1]]
+
+    # row i as a dense vector
+    def denseRow(self, i: int) -> np.ndarray:
+        vec = np.zeros(self.shape[1], dtype=self.data.dtype)
+        cols, vals = self.row(i)
+        vec[cols] = vals
+        return vec
+
+    def diagonal(self) -> np.ndarray:
+        rows = self.rowIndices()
+        diag = np.zeros(min(self.shape), dtype=self.data.dtype)
+        mask = rows == self.indices
+        diag[rows[mask]] = self.data[mask]
+        return diag
+
+    def transpose(self) -> "CSRMatrix":
+        return CSRMatrix.fromEdges(self.indices, self.rowIndices(), self.data, self.shape[::-1])
+
+    # C + C^T
+    def symmetric(self) -> "CSRMatrix":
+        rows = self.rowIndices()
+        return CSRMatrix.fromEdges(
+            np.concatenate((rows, self.indices)),
+            np.concatenate((self.indices, rows)),
+            np.concatenate((self.data, self.data)),
+            self.shape,
+        )
+
+    def rowSums(self) -> np.ndarray:
+        return np.bincount(self.rowIndices(), weights=self.data, minlength=self.shape[0]).astype(self.data.dtype)
+
+    # matrix-vector product
+    def dot(self, vec) -> np.ndarray:
+        products = self.data * np.asarray(vec)[self.indices]
+        return np.bincount(self.rowIndices(), weights=products, minlength=self.shape[0])
+
+    # the rows and columns of vertices, renumbered in that order
+    def induced(self, vertices) -> "CSRMatrix":
+        index = np.full(self.shape[0], -1, dtype=np.int64)
+        index[np.asarray(vertices)] = np.arange(len(vertices))
+        rows, cols = index[self.rowIndices()], index[self.indices]
+        keep = (rows >= 0) & (cols >= 0)
+        return CSRMatrix.fromEdges(rows[keep], cols[keep], self.data[keep], (len(vertices), len(vertices)))
+
+    # M[order][:, order]
+    def permuted(self, order) -> "CSRMatrix":
+        inverse = np.empty(len(order), dtype=np.int64)
+        inverse[np.asarray(order)] = np.arange(len(order))
+        return CSRMatrix.fromEdges(inverse[self.rowIndices()], inverse[self.indices], self.data, self.shape)
+
+    # sum of all elements between groups, labels[i] is the group of row/column i
+    def groupSum(self, labels, groups: int) -> np.ndarray:
+        labels = np.asarray(labels)
+        keys = labels[self.rowIndices()] * groups + labels[self.indices]
+        return np.bincount(keys, weights=self.data, minlength=groups * groups).reshape(groups, groups)
+
+
+ROW_CHUNK = 1024  # rows per step when a permuted view is reduced without materializing it
+
+
+# rows and columns of base permuted without copying it: view[i, j] = base[order[i], order[j]]
+# with order[core] = process (the optimizers' reorderings) the view is the communication between cores
+# indexes like a read-only 2D ndarray (V[i, j], V[r], V[rows, :]), only the requested elements are gathered
+# views of views compose their orders, np.asarray(V) materializes the permuted matrix
+class PermutedMatrix:
+    def __init__(self, base, order) -> None:
+        if isinstance(base, PermutedMatrix):
+            base, order = base.base, base.order[np.asarray(order, dtype=np.intp)]
+        self.base = base if isinstance(base, CSRMatrix) else np.asarray(base)
+        self.order = np.asarray(order, dtype=np.intp)
+        self.keys = None  # sorted element keys of a sparse base, built on the first lookup
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    @property
+    def shape(self) -> tuple:
+        return len(self), len(self)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.base.data.dtype if isinstance(self.base, CSRMatrix) else self.base.dtype
+
+    def permuted(self, order) -> "PermutedMatrix":
+        return PermutedMatrix(self, order)
+
+    # elements base[rows, cols] for broadcast index arrays
+    def lookup(self, rows, cols) -> np.ndarray:
+        if not isinstance(self.base, CSRMatrix):
+            return self.base[rows, cols]
+        if self.keys is None:
+            self.keys = self.base.rowIndices() * self.base.shape[1] + self.base.indices
+        wanted = np.asarray(rows, dtype=np.int64) * self.base.shape[1] + cols
+        found = np.minimum(np.searchsorted(self.keys, wanted), max(len(self.keys) - 1, 0))
+        values = np.zeros(wanted.shape, dtype=self.dtype)
+        hit = self.keys[found] == wanted if len(self.keys) > 0 else np.zeros(wanted.shape, dtype=bool)
+        values[hit] = self.base.data[found[hit]]
+        return values
+
+    def __getitem__(self, key) -> np.ndarray:
+        i, j = key if isinstance(key, tuple) else (key, slice(None))
+        sliced = isinstance(i, slice) or isinstance(j, slice)
+        i, j = self.order[i], self.order[j]
+        if sliced and i.ndim > 0 and j.ndim > 0:  # slices select whole rows or columns
+            i, j = i[:, None], j[None, :]
+        return self.lookup(i, j)
+
+    # the sub-block between the cores rows and cols
+    def block(self, rows, cols) -> np.ndarray:
+        return self.lookup(*np.ix_(self.order[np.asarray(rows)], self.order[np.asarray(cols)]))
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        if isinstance(self.base, CSRMatrix):
+            dense = self.base.permuted(self.order).toDense()
+        else:
+            dense = self.base[np.ix_(self.order, self.order)]
+        return dense if dtype is None else dense.astype(dtype)
+
+    # QAP objective sum_ij V[i, j] * D[i, j], dense bases are reduced ROW_CHUNK rows at a time
+    def cost(self, dist_mat):
+        dist = asDistances(dist_mat)
+        if isinstance(self.base, CSRMatrix):
+            position = np.empty(len(self), dtype=np.intp)
+            position[self.order] = np.arange(len(self))
+            total = np.dot(self.base.data, dist[position[self.base.rowIndices()], position[self.base.indices]])
+        else:
+            total = 0
+            for start in range(0, len(self), ROW_CHUNK):
+                rows = self.order[start : start + ROW_CHUNK]
+                total += np.sum(self.base[np.ix_(rows, self.order)] * dist[start : start + ROW_CHUNK])
+        return np.asarray(total).item()
+
+
+# communication over time: matrices[k] is the traffic between the previous matrix dump and the dump logged at logctr
+# phases[k] (LAIK dumps at every laik_set_phase and in laik_finalize), dense or CSRMatrix
+# logs of runs without phase changes, or of LAIK versions that only dump in laik_finalize, have a single phase
+@dataclass
+class CommSeries:
+    phases: list
+    matrices: list
+
+    def __len__(self) -> int:
+        return len(self.phases)
+
+    # weighted sum of the phase matrices, all weights 1 by default
+    def total(self, weights: list | None = None):
+        if weights is not None and len(weights) != len(self):
+            raise ValueError("{} phase weights for {} phases".format(len(weights), len(self)))
+        if weights is None and len(self) == 1:
+            return self.matrices[0]
+        weights = [1] * len(self) if weights is None else weights
+        if isinstance(self.matrices[0], CSRMatrix):
+            return CSRMatrix.fromEdges(
+                np.concatenate([m.rowIndices() for m in self.matrices]),
+                np.concatenate([m.indices for m in self.matrices]),
+                np.concatenate([w * m.data for w, m in zip(weights, self.matrices)]),
+                self.matrices[0].shape,
+            )
+        return sum(w * np.asarray(m) for w, m in zip(weights, self.matrices))
+
+    def sparse(self) -> "CommSeries":
+        matrices = [m if isinstance(m, CSRMatrix) else CSRMatrix.fromDense(m) for m in self.matrices]
+        return CommSeries(self.phases, matrices)
+
+
+# commSeries: the per-phase matrices commMatrix was summed from, if the input had them
 @dataclass
 class CommStats:
     commGraph: igraph.Graph
-    commMatrix: list
+    commMatrix: np.ndarray | CSRMatrix
     hostnames: list
+    commSeries: CommSeries | None = None
+
+
+# directed, weighted communication graph with an edge per communicating pair
+def buildCommGraph(matrix) -> igraph.Graph:
+    if not isinstance(matrix, CSRMatrix):
+        return igraph.Graph.Weighted_Adjacency(np.asarray(matrix).tolist())
+    edges = np.column_stack((matrix.rowIndices(), matrix.indices))
+    graph = igraph.Graph(n=matrix.shape[0], edges=edges.tolist(), directed=True)
+    graph.es["weight"] = matrix.data.tolist()
+    return graph
+
+
+DENSE_DISTANCES = 4096  # hosts up to which topology distances are materialized as a dense matrix
+
+
+# implicit distances between the leaves of a tree, computed from the ids of their ancestors (ids[:, 0] is the top level)
+# weights[k] is the link k levels above the leaves, weights[levels] links the top level nodes
+# leaves meeting k levels up are 2 * sum(weights[:k]) apart
+# indexes like a read-only 2D ndarray (D[i, j], D[r], D[:, cols], D[rows, :]) for vectorized batches of queries,
+# memory is O(n * levels), np.asarray(D) materializes the dense matrix
+class TreeDistances:
+    def __init__(self, ids, weights: list, dtype=np.int64) -> None:
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.weights = weights
+        levels = self.ids.shape[1]
+        climb = 2 * np.cumsum(weights[:levels])
+        # distance by the number of common levels from the top: none, ..., all
+        self.lut = np.concatenate(([climb[-1] + weights[levels]], climb[::-1])).astype(dtype)
+
+    def __len__(self) -> int:
+        return len(self.ids)
 
+    @property
+    def shape(self) -> tuple:
+        return len(self), len(self)
 
+    @property
+    def dtype(self) -> np.dtype:
+        return self.lut.dtype
+
+    def __getitem__(self, key) -> np.ndarray:
+        i, j = key if isinstance(key, tuple) else (key, slice(None))
+        sliced = isinstance(i, slice) or isinstance(j, slice)
+        i = np.arange(len(self))[i] if isinstance(i, slice) else np.asarray(i)
+        j = np.arange(len(self))[j] if isinstance(j, slice) else np.asarray(j)
+        if sliced and i.ndim > 0 and j.ndim > 0:  # slices select whole rows or columns
+            i, j = i[:, None], j[None, :]
+        common = np.cumprod(self.ids[i] == self.ids[j], axis=-1).sum(axis=-1)
+        return np.where(i == j, 0, self.lut[common])
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        dense = self[:, :]
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __abs__(self) -> "TreeDistances":
+        return self  # link weights are non-negative
+
+    def astype(self, dtype, copy: bool = True) -> "TreeDistances":
+        return TreeDistances(self.ids, self.weights, dtype)
+
+    def max(self, initial=None):
+        # the most distant leaves share all top levels that only have a single node
+        shared = int(np.cumprod((self.ids == self.ids[0]).all(axis=0)).sum()) if len(self) > 0 else 0
+        value = self.lut[shared] if len(self) > 1 else self.dtype.type(0)
+        return value if initial is None else max(value, initial)
+
+    # row sums (equal to column sums) from the number of leaves below every ancestor, O(n * levels)
+    def sum(self, axis=None):
+        n, levels = self.ids.shape
+        below = [np.full(n, n)] + [np.bincount(self.ids[:, l])[self.ids[:, l]] for l in range(levels)]
+        sums = sum(self.lut[m] * (below[m] - (below[m + 1] if m < levels else 0)) for m in range(levels + 1))
+        sums = sums - self.lut[levels]  # the leaf itself
+        return sums.sum() if axis is None else sums
+
+
+# dense ndarray or implicit distances, both indexed like an ndarray
+def asDistances(dist_mat):
+    return dist_mat if isinstance(dist_mat, TreeDistances) else np.asarray(dist_mat)
+
+
+# tree distances between hosts, implicit for large host sets
+def hostDistances(ids, weights: list):
+    distances = TreeDistances(ids, weights)
+    return np.asarray(distances) if len(distances) <= DENSE_DISTANCES else distances
+
+
+# layers: node names per tree layer top-down, the last layer are the hosts (leaves)
+# levels: names of the layers above the leaves, e.g. rack, srv (may be empty)
 @dataclass
 class HostGraph:
     graph: igraph.Graph
-    topMatrix: list
+    topMatrix: np.ndarray | list | TreeDistances
     layers: list
     weights: list
+    levels: list = field(default_factory=list)
+
+    # distance provider for the optimizers: topMatrix as ndarray or an implicit backend
+    def distances(self):
+        return asDistances(self.topMatrix)
+
+    # vertex ids of layer d in graph: the hosts (last layer) come first, then the upper layers top-down
+    # names repeat across layers (a host named like its server) and among hosts, ids are unique
+    def layerVertices(self, d: int) -> range:
+        d = d % len(self.layers)
+        if d == len(self.layers) - 1:
+            return range(len(self.layers[d]))
+        start = len(self.layers[-1]) + sum(len(layer) for layer in self.layers[:d])
+        return range(start, start + len(self.layers[d]))
 
 
 def getNodeChildren(graph: HostGraph, node: str, nodelayer: int) -> list:
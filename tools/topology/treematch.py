@@ -1,6 +1,54 @@
 import itertools
 import igraph
-from toptypes import HostGraph, getNodeChildren, UINT64_MAX
+import numpy as np
+from dataclasses import dataclass
+from grouping import groupVerticesByDemand
+from toptypes import CSRMatrix, HostGraph, UINT64_MAX
+
+EXACT_LIMIT = 8  # layers with at most this many vertices are grouped by exhaustive search
+
+
+# nodes of one topology layer, nodes of the same type have subtrees of the same shape and are interchangeable
+#  children: indices into the layer below, sorted by type
+#  slots: positions in hostnames of the leaves below each node, in the order of its children
+@dataclass
+class TreeLayer:
+    types: np.ndarray
+    children: list
+    slots: list
+
+
+# per-node arities and leaf positions of the (possibly unbalanced) topology tree, from the root layer down
+# the graph is walked by vertex id, see HostGraph.layerVertices
+def buildTree(top_graph: HostGraph) -> list:
+    graph = top_graph.graph
+    layers = top_graph.layers
+    leaves = len(layers[-1])
+    tree = [TreeLayer(np.zeros(leaves, dtype=np.int64), [[] for _ in range(leaves)], [[i] for i in range(leaves)])]
+    for d in range(len(layers) - 2, -1, -1):
+        below = tree[0]
+        lower = top_graph.layerVertices(d + 1)
+        shapes, types, children, slots = {}, [], [], []
+        for node, vertex in zip(layers[d], top_graph.layerVertices(d)):
+            kids = [v - lower.start for v in graph.neighbors(vertex) if v in lower]
+            if len(kids) == 0:
+                raise ValueError("topology node {} has no children".format(node))
+            kids.sort(key=lambda c: (below.types[c], min(below.slots[c])))
+            types.append(shapes.setdefault(tuple(below.types[kids].tolist()), len(shapes)))
+            children.append(kids)
+            slots.append([x for c in kids for x in below.slots[c]])
+        tree.insert(0, TreeLayer(np.array(types, dtype=np.int64), children, slots))
+    return tree
+
+
+# order (leaf slot -> process) of a mapper that fills the slots of the tree, unfilled slots are -1
+# raises instead of handing out an order that is not a permutation of the processes
+def checkedOrder(order: np.ndarray, mapper: str) -> list:
+    if (order < 0).any():
+        raise RuntimeError("{} left {} topology leaves without a process".format(mapper, int((order < 0).sum())))
+    if len(np.unique(order)) != len(order):
+        raise RuntimeError("{} placed a process on more than one topology leaf".format(mapper))
+    return order.tolist()
 
 
 class TreeMatch:
@@ -9,7 +57,10 @@ class TreeMatch:
         self.mod_mat = comm_mat
         self.top_graph = top_graph
         self.hostnames = hostnames
-        print("TreeMatch set up")
+        # vertices of mod_mat as arrays of the rank indices below them in slot order
+        # after grouping a layer, vertex i takes the place of node i of the layer above
+        self.vertices = [np.array([i]) for i in range(len(comm_mat))]
+        self.tree = buildTree(top_graph)
 
     def __str__(self) -> str:
         return (
@@ -19,42 +70,46 @@ class TreeMatch:
             + "hosts   {}".format(self.hostnames)
         )
 
-    def arity(self, depth):
-        # TODO: support different arities of unbalanced trees by adding node parameter
-        node = 0
-        return len(getNodeChildren(self.top_graph, self.top_graph.layers[depth][node], depth))
-
     def solve(self):
-        # return self.extendCommMatrix(1)
-        # return self.aggregateCommMatrix((list(range(8)), list(range(8,16))))
-        # return self.groupProcesses(2)
-        return [self.hostnames.index(x) for x in self.doTreeMatch()]
+        return self.doTreeMatch().tolist()
 
     def doTreeMatch(self):
+        p = len(self.mod_mat)
+        if p != len(self.tree[-1].types):
+            raise ValueError("{} processes for {} topology leaves".format(p, len(self.tree[-1].types)))
         groups = [[] for _ in range(len(self.top_graph.layers))]
         # print("Starting TreeMatch for {} groups.".format(len(groups)))
 
         # process the tree bottom-up
         for d in range(len(self.top_graph.layers) - 1, 0, -1):
-            p = len(self.mod_mat)
-            # extend communication matrix if needed
-            if p % self.arity(d - 1) != 0:
-                self.mod_mat = self.extendCommMatrix(d)
             # find suitable grouping of processes at current tree level
             groups[d] = self.groupProcesses(d, 0.5)
             # aggregate matrix by groups for next round of optimization
             self.mod_mat = self.aggregateCommMatrix(groups[d])
-        return [x for xs in groups[-1] for x in xs]
-
+            # order the vertices of each group like the children of its node
+            types = self.tree[d].types
+            groups[d] = [sorted(group, key=lambda v: types[v]) for group in groups[d]]
+            self.vertices = [np.concatenate([self.vertices[v] for v in group]) for group in groups[d]]
+
+        order = np.empty(p, dtype=np.int64)
+        for slots, vertex in zip(self.tree[0].slots, self.vertices):
+            order[slots] = vertex
+        return order
+
+    # group the current vertices into one group per node of the layer above, sized by the node's children
+    # small balanced layers are solved exactly, others with the polynomial engine in grouping
     def groupProcesses(self, cur_depth: int, percentile: float):
-        # TODO: this only works for balanced trees for now
-        # print("processes         ", len(self.hostnames))
-        # print("groupsize         ", self.arity(cur_depth - 1))
-        # TODO: this should only work with connected nodes instead of the entire layer
-
-        # all possible combinations of elements at the current layer
-        l = list(itertools.combinations(self.top_graph.layers[cur_depth], self.arity(cur_depth - 1)))
-        # print("grouping process combinations with arity {} at depth {}.".format(self.arity(cur_depth - 1), cur_depth))
+        types = self.tree[cur_depth].types
+        kinds = int(types.max()) + 1
+        demands = np.array([np.bincount(types[c], minlength=kinds) for c in self.tree[cur_depth - 1].children])
+        if len(self.vertices) <= EXACT_LIMIT and kinds == 1 and (demands == demands[0]).all():
+            return self.exactGroups(int(demands[0, 0]), percentile)
+        return groupVerticesByDemand(self.mod_mat, types, demands)
+
+    # exhaustive search over all groupings, exponential in the number of vertices
+    def exactGroups(self, k: int, percentile: float):
+        # all possible combinations of vertex indices at the current layer
+        l = list(itertools.combinations(range(len(self.vertices)), k))
 
         # print("combinations      ", l)
         # print("num_combinations  ", len(l))
@@ -69,25 +124,9 @@ class TreeMatch:
                     if node in group2:
                         G.add_edge(str(hash(group1) & UINT64_MAX), str(hash(group2) & UINT64_MAX))
 
-        # print("graph_groups      ", len(G.vs))
-        # print("groups to find    ", len(self.comm_mat) // self.arity(cur_depth - 1))
-        # TODO: improve independent set algorithm
-
         # find independent sets of groups for possible solutions
-        independent_set = G.independent_vertex_sets(
-            len(self.comm_mat) // self.arity(cur_depth - 1), len(self.comm_mat) // self.arity(cur_depth - 1)
-        )
+        independent_set = G.independent_vertex_sets(len(self.vertices) // k, len(self.vertices) // k)
 
-        # print(
-        #     "found {} possible combinations out of {} groups at depth {}.".format(
-        #         len(independent_set), len(G.vs), cur_depth
-        #     )
-        # )
-
-        # print("node children of {}: {}".format(self.top_graph.layers[cur_depth][0],
-        # getNodeChildren(self.top_graph, self.top_graph.layers[cur_depth][0], cur_depth),))
-
-        # print("independentset[0] ", independent_set[0], l[independent_set[0][0]], l[independent_set[0][1]])
         # TODO: filter the sets greedy
         return self.optimizeGroups(l, independent_set, percentile)
 
@@ -122,7 +161,6 @@ class TreeMatch:
     # return the number of cross-node groups
     # TODO factor in the actual transfer cost in this
     # weight should just be the total communication cost of this group
-    # TODO this only works on leaf level like this
     def groupWeight(self, group):
         weight = 0
         if len(group) == 0:
@@ -136,36 +174,26 @@ class TreeMatch:
         # print("calculated weight {} for group {}".format(weight, group))
         return weight
 
-    # aggregate submatrices according to groups
+    # aggregate submatrices according to groups of vertex indices, intra-group communication is dropped
+    # one reduction per level: rows and columns are sorted by group and summed with np.add.reduceat
     def aggregateCommMatrix(self, groups):
         n = len(groups)
-        r = [[0 for _ in range(n)] for _ in range(n)]
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    r[i][j] = self.elementSum(groups, i, j)
+        if isinstance(self.mod_mat, CSRMatrix):
+            labels = np.empty(self.mod_mat.shape[0], dtype=np.int64)
+            for g, group in enumerate(groups):
+                labels[list(group)] = g
+            r = self.mod_mat.groupSum(labels, n).astype(self.mod_mat.data.dtype)
+        else:
+            order = np.concatenate(groups)
+            starts = np.cumsum([0] + [len(group) for group in groups[:-1]])
+            r = np.asarray(self.mod_mat)[np.ix_(order, order)]
+            r = np.add.reduceat(np.add.reduceat(r, starts, axis=0), starts, axis=1)
+        np.fill_diagonal(r, 0)
         return r
 
-    # element wise sum across group submatrices
+    # communication from the vertices of groups[i] to the vertices of groups[j]
     def elementSum(self, groups, i, j):
-        acc = 0
-        for a in groups[i]:
-            for b in groups[j]:
-                acc += self.comm_mat[self.hostnames.index(a)][self.hostnames.index(b)]
-
-        # print("element wise sum for group {}: {}".format(groups, acc))
-
-        return acc
-
-    # extend matrix by arity of lower depth lines and columns
-    # if cur_depth points to single root, ariry = degree
-    # else vertex degree-1 due to minimal graph
-    # treematch as described wants balanced nodes, does this change anything? ..
-    def extendCommMatrix(self, cur_depth) -> list:
-        p = len(self.mod_mat)
-        k = self.arity(cur_depth)
-        for l in self.mod_mat:
-            l.extend([0] * k)
-        for _ in range(k):
-            self.mod_mat.append([0 for _ in range(p)])
-        return self.mod_mat
+        rows, cols = list(groups[i]), list(groups[j])
+        if isinstance(self.mod_mat, CSRMatrix):
+            return sum(vals[np.isin(idx, cols)].sum() for idx, vals in map(self.mod_mat.row, rows))
+        return np.asarray(self.mod_mat)[np.ix_(rows, cols)].sum()
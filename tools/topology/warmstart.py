@@ -0,0 +1,122 @@
+import math
+import numpy as np
+import time
+from dataclasses import dataclass
+from phases import patternDistance
+from qap import costEngine
+from toptypes import CSRMatrix, HostGraph, PermutedMatrix
+
+# re-optimization of a job whose communication changed only slightly (the next run, a new phase):
+# start from the previous reordering and re-place only the processes whose traffic drifted, then weigh the
+# expected gain against the cost of migrating the moved processes
+DRIFT_THRESHOLD = 0.25  # share of a process' traffic that has to change before it is re-placed
+REPAIR_SWEEPS = 4  # max sweeps over the drifted processes
+
+
+# share of every process' traffic (sent and received) that changed between two matrices of the same job,
+# 0 (same pattern) to 1 (all new); both are normalized to their total first, so a longer run has not drifted
+def processDrift(old, new) -> np.ndarray:
+    old = old if isinstance(old, CSRMatrix) else CSRMatrix.fromDense(old)
+    new = new if isinstance(new, CSRMatrix) else CSRMatrix.fromDense(new)
+    n = new.shape[0]
+    old_share = old.data / (float(old.data.sum()) or 1.0)
+    new_share = new.data / (float(new.data.sum()) or 1.0)
+    rows = np.concatenate((old.rowIndices(), new.rowIndices()))
+    cols = np.concatenate((old.indices, new.indices))
+    diff = CSRMatrix.fromEdges(rows, cols, np.concatenate((-old_share, new_share)), new.shape)
+    changed = np.abs(diff.data)
+    sent = np.bincount(diff.rowIndices(), weights=changed, minlength=n)
+    changed = sent + np.bincount(diff.indices, weights=changed, minlength=n)
+    shares = np.concatenate((old_share, new_share))
+    traffic = np.bincount(rows, weights=shares, minlength=n) + np.bincount(cols, weights=shares, minlength=n)
+    return np.divide(changed, traffic, out=np.zeros(n), where=traffic > 0)
+
+
+# best-improvement swaps restricted to the positions of the moving processes, all others only move when swapped
+# with a moving one, O(len(moving)) cost rows per sweep instead of n for a full 2-opt sweep
+# returns the repaired reordering and its cost
+def repairOrder(comm_mat, dist_mat, order, moving, max_sweeps: int = REPAIR_SWEEPS, deadline: float = math.inf):
+    engine = costEngine(comm_mat, dist_mat, order)
+    positions = np.empty(len(engine), dtype=np.intp)
+    positions[engine.order] = np.arange(len(engine))
+    for _ in range(max_sweeps):
+        improved = False
+        for process in moving:
+            if time.perf_counter() > deadline:
+                return engine.order.tolist(), engine.cost
+            r = int(positions[process])
+            deltas = engine.deltaRow(r)
+            deltas[r] = 0
+            s = int(np.argmin(deltas))
+            if deltas[s] < 0:
+                engine.swap(r, s, deltas[s].item())
+                positions[engine.order[[r, s]]] = [r, s]
+                improved = True
+        if not improved:
+            break
+    return engine.order.tolist(), engine.cost
+
+
+# outcome of a warm start
+#  drift: pattern distance of the previous and the new matrix (see phases), changed: the re-placed processes
+#  previous_cost, cost: QAP cost of the new matrix on the previous and on the repaired reordering
+#  moved: processes on a different core, migration_cost: their state volume times the distance they move
+#  horizon: how often the new matrix' traffic repeats until the next re-optimization
+@dataclass
+class WarmStart:
+    reordering: list
+    drift: float
+    changed: list
+    previous_cost: float
+    cost: float
+    moved: int
+    migration_cost: float
+    horizon: float = 1.0
+
+    # traffic cost saved over the horizon, in the unit of the migration cost (volume times distance)
+    @property
+    def gain(self) -> float:
+        return (self.previous_cost - self.cost) * self.horizon
+
+    @property
+    def migrate(self) -> bool:
+        return self.gain > self.migration_cost
+
+
+# repair previous (order[core] = process) for comm_mat, previous_mat is the matrix it was optimized for
+# without previous_mat every process may be re-placed
+# state: bytes every process has to move when it changes cores, a scalar or one per process
+def warmStart(
+    comm_mat,
+    top_graph: HostGraph,
+    previous: list,
+    previous_mat=None,
+    threshold: float = DRIFT_THRESHOLD,
+    state=0.0,
+    horizon: float = 1.0,
+    max_sweeps: int = REPAIR_SWEEPS,
+    time_limit: float | None = None,
+) -> WarmStart:
+    if len(previous) != len(comm_mat):
+        raise ValueError("previous reordering of {} processes for {} processes".format(len(previous), len(comm_mat)))
+    if previous_mat is None:
+        drift, changed = 1.0, np.arange(len(previous))
+    else:
+        drift = patternDistance(previous_mat, comm_mat)
+        changed = np.flatnonzero(processDrift(previous_mat, comm_mat) > threshold)
+
+    dist = top_graph.distances()
+    deadline = math.inf if time_limit is None else time.perf_counter() + time_limit
+    previous_cost = PermutedMatrix(comm_mat, previous).cost(dist)
+    if len(changed) > 0:
+        reordering, cost = repairOrder(comm_mat, dist, previous, changed, max_sweeps, deadline)
+    else:
+        reordering, cost = list(previous), previous_cost
+
+    before, after = np.empty(len(previous), dtype=np.intp), np.empty(len(previous), dtype=np.intp)
+    before[np.asarray(previous)] = np.arange(len(previous))
+    after[np.asarray(reordering)] = np.arange(len(previous))
+    moved = np.flatnonzero(before != after)
+    volume = np.broadcast_to(np.asarray(state, dtype=np.float64), (len(previous),))[moved]
+    migration_cost = float(np.dot(volume, dist[before[moved], after[moved]])) if len(moved) > 0 else 0.0
+    return WarmStart(reordering, drift, changed.tolist(), previous_cost, cost, len(moved), migration_cost, horizon)
@@ -0,0 +1,246 @@
+import itertools
+import numpy as np
+from dataclasses import dataclass, replace
+from toptypes import CSRMatrix
+
+# synthetic communication matrices for stress tests, built from edge arrays without python loops over rank pairs
+# matrix[i, j] is the volume rank i sends to rank j, dense ndarray or CSRMatrix (sparse=True)
+# ideal is a reference reordering (order[core] = process): optimal for fill-up placement of the grouped, ring and
+# tree patterns onto nodes whose size divides their block structure, the natural layout order for halo exchanges,
+# None where none is known
+
+# default spaces of examples/jac1d.c, jac2d.c and jac3d.c
+JACOBI_SPACES = {1: (10_000_000,), 2: (2500, 2500), 3: (200, 200, 200)}
+HALO_CHUNK = 1 << 20  # candidate neighbour pairs checked at once
+
+
+@dataclass
+class Workload:
+    name: str
+    matrix: np.ndarray | CSRMatrix
+    ideal: list | None = None
+
+
+# dense or sparse matrix from (src, dst, volume) edges, duplicate edges are summed
+def assemble(src, dst, volumes, ranks: int, sparse: bool):
+    src, dst = np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)
+    volumes = np.broadcast_to(np.asarray(volumes, dtype=np.int64), src.shape)
+    if sparse:
+        return CSRMatrix.fromEdges(src, dst, volumes, (ranks, ranks))
+    matrix = np.zeros((ranks, ranks), dtype=np.int64)
+    np.add.at(matrix, (src, dst), volumes)
+    return matrix
+
+
+# ranges [lo, hi) of every task like LAIK's bisection partitioner: split the widest dimension, tasks in halves
+# tasks left over when a range is one element wide get nothing (lo == hi)
+def bisectionBlocks(space: tuple, ranks: int) -> tuple:
+    lo, hi = np.zeros((ranks, len(space)), dtype=np.int64), np.zeros((ranks, len(space)), dtype=np.int64)
+    pending = [([0] * len(space), list(space), 0, ranks)]
+    while pending:
+        start, end, first, last = pending.pop()
+        widths = [b - a for a, b in zip(start, end)]
+        dim = widths.index(max(widths))
+        if last - first == 1 or widths[dim] == 1:
+            lo[first], hi[first] = start, end
+            continue
+        mid = (first + last) // 2
+        split = start[dim] + widths[dim] * (mid - first) // (last - first)
+        left_end, right_start = list(end), list(start)
+        left_end[dim] = right_start[dim] = split
+        pending += [(right_start, end, mid, last), (start, left_end, first, mid)]
+    return lo, hi
+
+
+# ranges of LAIK's grid partitioner: blocks[0] fastest, tasks beyond the grid get nothing
+def gridBlocks(space: tuple, ranks: int, blocks: tuple) -> tuple:
+    cells = np.array(list(itertools.product(*[range(b) for b in reversed(blocks)])))[:, ::-1][:ranks]
+    steps = np.array(space) / np.array(blocks)
+    lo = np.zeros((ranks, len(space)), dtype=np.int64)
+    hi = np.zeros((ranks, len(space)), dtype=np.int64)
+    lo[: len(cells)] = (cells * steps).astype(np.int64)
+    hi[: len(cells)] = np.minimum(((cells + 1) * steps).astype(np.int64), space)
+    return lo, hi
+
+
+# block counts chosen by examples/jac3d.c -g: few idle tasks, close to a cube
+def jacobiGrid(ranks: int) -> tuple:
+    best, blocks = 3 * ranks, (ranks, 1, 1)
+    for x in range(1, ranks + 1):
+        y = np.arange(1, ranks // x + 1)  # z is 0 beyond
+        z = ranks // x // y
+        d = np.abs(y - x) + np.abs(z - x) + np.abs(z - y) + 2 * (ranks - x * y * z)
+        if len(d) > 0 and d.min() < best:
+            best, blocks = int(d.min()), (x, int(y[np.argmin(d)]), int(z[np.argmin(d)]))
+    return blocks
+
+
+# pairs (a, b) with low[a] <= keys[b] < high[a], yielded in chunks of at most HALO_CHUNK pairs
+# (unless a single a has more)
+def rangePairs(keys: np.ndarray, low: np.ndarray, high: np.ndarray):
+    order = np.argsort(keys, kind="stable")
+    first = np.searchsorted(keys[order], low, "left")
+    counts = np.maximum(np.searchsorted(keys[order], high, "left") - first, 0)
+    cumulative = np.cumsum(counts)
+    start = 0
+    while start < len(low):
+        end = max(int(np.searchsorted(cumulative, cumulative[start] - counts[start] + HALO_CHUNK, "right")), start + 1)
+        rows = np.arange(start, end)
+        a = np.repeat(rows, counts[rows])
+        offsets = np.arange(len(a)) - np.repeat(np.cumsum(counts[rows]) - counts[rows], counts[rows])
+        yield a, order[np.repeat(first[rows], counts[rows]) + offsets]
+        start = end
+
+
+def overlap(lo_a, hi_a, lo_b, hi_b) -> np.ndarray:
+    return np.maximum(np.minimum(hi_a, hi_b) - np.maximum(lo_a, lo_b), 0)
+
+
+# halo exchange of width between the task ranges lo/hi like LAIK's (corner)halo partitioner:
+# rank i sends the elements of its range that lie in the halo of rank j
+# neighbours are found among touching ranges, so width must not exceed the thinnest range
+def haloEdges(lo: np.ndarray, hi: np.ndarray, width: int, corners: bool) -> tuple:
+    used = np.flatnonzero((hi > lo).all(axis=1))
+    lo, hi = lo[used], hi[used]
+    keys = [np.zeros(0, dtype=np.int64)]
+    dims, stride = lo.shape[1], int(hi.max()) + width + 1
+    for d in range(dims):
+        # candidates b start where a ends in d, in a bucket of the third dimension g that reaches a's halo and
+        # in the second dimension e late enough to reach a's halo but before it ends; kept if they touch a's halo
+        e, g = ([x for x in range(dims) if x != d] + [None, None])[:2]
+        zero = np.zeros(len(lo), dtype=np.int64)
+        size = int((hi[:, g] - lo[:, g]).max()) if g is not None else 1
+        bucket = lo[:, g] // size if g is not None else zero
+        first = (lo[:, g] - width - size + 1) // size if g is not None else zero
+        last = (hi[:, g] + width - 1) // size if g is not None else zero
+        reach = int((hi[:, e] - lo[:, e]).max()) + width if e is not None else 0
+        window_low = np.maximum(lo[:, e] - reach + 1, 0) if e is not None else zero
+        window_high = np.minimum(hi[:, e] + width, stride) if e is not None else zero + 1
+        buckets = int(bucket.max()) + 1
+        candidates = (lo[:, d] * buckets + bucket) * stride + (lo[:, e] if e is not None else zero)
+        for k in range(int((last - first).max()) + 1):
+            rows = np.flatnonzero((first + k <= last) & (first + k >= 0) & (first + k < buckets))
+            base = (hi[rows, d] * buckets + first[rows] + k) * stride
+            for a, b in rangePairs(candidates, base + window_low[rows], base + window_high[rows]):
+                a = rows[a]
+                touch = (overlap(lo[a], hi[a], lo[b] - width, hi[b] + width) > 0).all(axis=1)
+                a, b = a[touch], b[touch]
+                keys += [a * len(used) + b, b * len(used) + a]
+    keys = np.unique(np.concatenate(keys))
+    src, dst = np.divmod(keys, len(used))
+    if corners:
+        volumes = np.prod(overlap(lo[src], hi[src], lo[dst] - width, hi[dst] + width), axis=1)
+    else:
+        inner = overlap(lo[src], hi[src], lo[dst], hi[dst])
+        volumes = 0
+        for d in range(lo.shape[1]):
+            others = np.prod(np.delete(inner, d, axis=1), axis=1)
+            below = overlap(lo[src, d], hi[src, d], lo[dst, d] - width, lo[dst, d])
+            above = overlap(lo[src, d], hi[src, d], hi[dst, d], hi[dst, d] + width)
+            volumes = volumes + others * (below + above)
+    keep = volumes > 0
+    return used[src[keep]], used[dst[keep]], volumes[keep]
+
+
+# halo exchange of examples/jac1d.c, jac2d.c, jac3d.c on their default spaces (or space)
+# layout: "bisection" (jac2d, jac3d), "grid" (jac3d -g, blocks from jacobiGrid unless given); 1D bisection is the
+# block partitioner of jac1d
+# ideal: the layout's own order for bisection, consecutive tasks own neighbouring ranges
+def haloComms(
+    dims: int,
+    ranks: int,
+    space: tuple | None = None,
+    width: int = 1,
+    corners: bool = True,
+    layout: str = "bisection",
+    blocks: tuple | None = None,
+    sparse: bool = True,
+) -> Workload:
+    space = JACOBI_SPACES[dims] if space is None else tuple(space)
+    if layout == "bisection":
+        lo, hi = bisectionBlocks(space, ranks)
+    elif layout == "grid":
+        lo, hi = gridBlocks(space, ranks, jacobiGrid(ranks) if blocks is None else blocks)
+    else:
+        raise ValueError("unknown layout {}".format(layout))
+    src, dst, volumes = haloEdges(lo, hi, width, corners)
+    ideal = list(range(ranks)) if layout == "bisection" else None
+    return Workload("halo{}d".format(dims), assemble(src, dst, volumes, ranks, sparse), ideal)
+
+
+# ring allreduce/allgather: every rank sends to its successor
+def ringComms(ranks: int, volume: int = 1024, periodic: bool = True, sparse: bool = True) -> Workload:
+    src = np.arange(ranks if periodic else ranks - 1)
+    return Workload("ring", assemble(src, (src + 1) % ranks, volume, ranks, sparse), list(range(ranks)))
+
+
+# binomial tree reduce and broadcast: rank i exchanges with i with its lowest set bit cleared
+# every subtree is a contiguous range of ranks
+def treeComms(ranks: int, volume: int = 1024, sparse: bool = True) -> Workload:
+    child = np.arange(1, ranks)
+    parent = child & (child - 1)
+    src, dst = np.concatenate((child, parent)), np.concatenate((parent, child))
+    return Workload("tree", assemble(src, dst, volume, ranks, sparse), list(range(ranks)))
+
+
+# every rank sends to every other, volumes drawn from [volume - jitter, volume]
+def allToAllComms(ranks: int, rng: np.random.Generator, volume: int = 1000, jitter: int = 0) -> Workload:
+    matrix = rng.integers(volume - jitter, volume + 1, size=(ranks, ranks))
+    matrix = np.tril(matrix) + np.tril(matrix, -1).T
+    np.fill_diagonal(matrix, 0)
+    return Workload("alltoall", matrix, None)
+
+
+# clusters of cluster_size processes talk all-to-all with a random volume per cluster, the processes of
+# a cluster are scattered randomly; ideal places every cluster consecutively
+def groupedComms(ranks: int, cluster_size: int, rng: np.random.Generator, sparse: bool = False) -> Workload:
+    ideal = rng.permutation(ranks)
+    clusters = ranks // cluster_size
+    label = np.repeat(np.arange(clusters), np.diff(np.linspace(0, ranks, clusters + 1).astype(np.int64)))
+    weights = rng.integers(0, 2**14, clusters)
+    src, dst, volumes = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for shift in range(1, -(-ranks // clusters)):  # pairs of positions shift apart in the same cluster
+        pos = np.flatnonzero(label[:-shift] == label[shift:])
+        src += [ideal[pos], ideal[pos + shift]]
+        dst += [ideal[pos + shift], ideal[pos]]
+        volumes += [weights[label[pos]]] * 2
+    src, dst, volumes = np.concatenate(src), np.concatenate(dst), np.concatenate(volumes)
+    return Workload("grouped", assemble(src, dst, volumes, ranks, sparse), ideal.tolist())
+
+
+# every rank sends to degree random partners with volumes in [1, max_volume)
+def randomSparseComms(
+    ranks: int, degree: int, rng: np.random.Generator, max_volume: int = 2**14, sparse: bool = True
+) -> Workload:
+    src = np.repeat(np.arange(ranks), degree)
+    dst = (src + rng.integers(1, ranks, len(src))) % ranks
+    return Workload("sparse", assemble(src, dst, rng.integers(1, max_volume, len(src)), ranks, sparse), None)
+
+
+# weighted sum of workloads on the same ranks, the ideal order survives only if all known ones agree
+def mixComms(workloads: list, weights: list | None = None) -> Workload:
+    weights = [1] * len(workloads) if weights is None else weights
+    parts = [(w, workload.matrix) for w, workload in zip(weights, workloads)]
+    if all(isinstance(matrix, CSRMatrix) for _, matrix in parts):
+        rows = np.concatenate([matrix.rowIndices() for _, matrix in parts])
+        cols = np.concatenate([matrix.indices for _, matrix in parts])
+        data = np.concatenate([w * matrix.data for w, matrix in parts])
+        matrix = CSRMatrix.fromEdges(rows, cols, data, parts[0][1].shape)
+    else:
+        matrix = sum(w * (m.toDense() if isinstance(m, CSRMatrix) else np.asarray(m)) for w, m in parts)
+    ideals = {tuple(workload.ideal) for workload in workloads if workload.ideal is not None}
+    ideal = list(ideals.pop()) if len(ideals) == 1 else None
+    return Workload("+".join(workload.name for workload in workloads), matrix, ideal)
+
+
+# relabel the processes randomly, so that optimizers cannot profit from the generator's numbering
+def shuffled(workload: Workload, rng: np.random.Generator) -> Workload:
+    order = rng.permutation(len(workload.matrix))
+    if isinstance(workload.matrix, CSRMatrix):
+        matrix = workload.matrix.permuted(order)
+    else:
+        matrix = np.asarray(workload.matrix)[np.ix_(order, order)]
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.arange(len(order))
+    ideal = None if workload.ideal is None else inverse[workload.ideal].tolist()
+    return replace(workload, matrix=matrix, ideal=ideal)